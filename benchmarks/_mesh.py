@@ -0,0 +1,33 @@
+#Structured meshes of the unit cube shared by the benchmarks (no gmsh needed)
+
+from numpy import arange, stack, meshgrid, concatenate, double, int64
+
+
+#Split of a hex (gmsh node ordering) into 6 tets around its 0-6 diagonal
+hex_to_tets = [(0,1,2,6), (0,2,3,6), (0,3,7,6), (0,7,4,6), (0,4,5,6), (0,5,1,6)]
+
+
+def box_nodes(n):
+	#Tags and coordinates of the nodes of an n x n x n grid
+	i, j, k = meshgrid(arange(n), arange(n), arange(n), indexing="ij")
+	coords = stack((i.ravel(), j.ravel(), k.ravel()), axis=1).astype(double) / n
+	return 1 + arange(n**3, dtype=int64), coords
+
+
+def box_hexes(n):
+	#Hexes of an n x n x n grid of nodes, (Nelements, 8)
+	tag = lambda i, j, k: 1 + (i*n + j)*n + k
+	c = meshgrid(arange(n-1), arange(n-1), arange(n-1), indexing="ij")
+	i, j, k = [x.ravel() for x in c]
+	return stack([tag(i+a, j+b, k+d) for a, b, d in [(0,0,0), (1,0,0), (1,1,0), (0,1,0), (0,0,1), (1,0,1), (1,1,1), (0,1,1)]], axis=1)
+
+
+def box_tets(n):
+	#6 tets per cell of an n x n x n grid of nodes, (Nelements, 4)
+	hexes = box_hexes(n)
+	return concatenate([hexes[:,list(tet)] for tet in hex_to_tets])
+
+
+def element_blocks(connectivity, elementType):
+	#Element blocks {elementType: (elementTags, connectivity)}, tags from 1
+	return {elementType: (1 + arange(len(connectivity), dtype=int64), connectivity)}
@@ -0,0 +1,73 @@
+#Timing benchmark for element creation: the loop used in the examples vs. add_elements_to_ops
+#(and writing + sourcing a python script with write_elements_to_script)
+#
+#Usage:
+#
+#	python bench_add_elements.py [mesh_size]
+#
+#Smaller mesh_size means more elements.
+
+import os
+import sys
+import time
+import tempfile
+
+import gmsh
+import opensees as ops
+import gmsh2opensees as g2o
+
+
+mesh_size = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+
+gmsh.initialize()
+gmsh.option.setNumber("General.Terminal", 0)
+gmsh.model.add("bench")
+gmsh.model.occ.addBox(0, 0, 0, 1, 1, 1)
+gmsh.model.occ.synchronize()
+gmsh.model.addPhysicalGroup(3, [1], name="Solid")
+gmsh.option.setNumber("Mesh.MeshSizeMax", mesh_size)
+gmsh.model.mesh.generate(3)
+
+solidMaterialTag = 1
+rho, g = 7300., 9.81
+
+script = os.path.join(tempfile.mkdtemp(), "elements.py")
+
+
+def example_loop():
+	elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", gmsh.model)
+	for eleTag, eleNodes in zip(elementTags, nodeTags):
+		ops.element('FourNodeTetrahedron', eleTag, *eleNodes, solidMaterialTag, 0., 0., -rho*g)
+
+
+def batched():
+	g2o.add_elements_to_ops("Solid", gmsh.model, {4: "FourNodeTetrahedron"}, solidMaterialTag, 0., 0., -rho*g)
+
+
+def script_chunk():
+	g2o.write_elements_to_script(script, "Solid", gmsh.model, {4: "FourNodeTetrahedron"}, solidMaterialTag, 0., 0., -rho*g)
+	g2o.source_python_script(script)
+
+
+blocks = g2o.get_element_blocks_in_physical_group("Solid", gmsh.model)
+Nelements = sum(len(elementTags) for elementTags, nodeTags in blocks.values())
+print(f"{Nelements=}")
+
+for name, add_elements in [
+		("example loop", example_loop),
+		("add_elements_to_ops", batched),
+		("script chunk", script_chunk),
+	]:
+	ops.wipe()
+	g2o.reset_node_registry()
+	ops.model("basicBuilder","-ndm",3,"-ndf",3)
+	ops.nDMaterial('ElasticIsotropic', solidMaterialTag, 200e9, 0.3, rho)
+	elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", gmsh.model)
+	g2o.add_nodes_to_ops(nodeTags, gmsh.model)
+
+	t0 = time.perf_counter()
+	add_elements()
+	t1 = time.perf_counter()
+	print(f"{name:>20s}: {t1-t0:8.3f} s")
+
+gmsh.finalize()
@@ -0,0 +1,53 @@
+#Timing benchmark for add_nodes_to_ops: bulk getNodes path vs. the old per-node get_node loop
+#
+#Usage:
+#
+#	python bench_add_nodes.py [mesh_size]
+#
+#Smaller mesh_size means more nodes.
+
+import sys
+import time
+
+import gmsh
+import opensees as ops
+import gmsh2opensees as g2o
+
+from numpy import array, int32, unique
+
+
+def add_nodes_to_ops_per_node(nodeTags, gmshmodel, scale_factor=1.0):
+	#The way add_nodes_to_ops used to do it, one get_node call per node
+	nodeTags = unique(array(nodeTags, dtype=int).reshape(-1))
+	for nodeTag in nodeTags:
+		coord, parametricCoord, dim, tag = gmshmodel.mesh.get_node(nodeTag)
+		ops.node(int(nodeTag), *(scale_factor*coord))
+
+
+mesh_size = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+
+gmsh.initialize()
+gmsh.option.setNumber("General.Terminal", 0)
+gmsh.model.add("bench")
+gmsh.model.occ.addBox(0, 0, 0, 1, 1, 1)
+gmsh.model.occ.synchronize()
+gmsh.model.addPhysicalGroup(3, [1], name="Solid")
+gmsh.option.setNumber("Mesh.MeshSizeMax", mesh_size)
+gmsh.model.mesh.generate(3)
+
+elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", gmsh.model)
+Nnodes = len(unique(array(nodeTags, dtype=int32)))
+print(f"{Nnodes=}")
+
+for name, add_nodes in [
+		("per-node get_node", lambda: add_nodes_to_ops_per_node(nodeTags, gmsh.model)),
+		("bulk getNodes", lambda: g2o.add_nodes_to_ops(nodeTags, gmsh.model, remove_duplicates=False)),
+	]:
+	ops.wipe()
+	ops.model("basicBuilder","-ndm",3,"-ndf",3)
+	t0 = time.perf_counter()
+	add_nodes()
+	t1 = time.perf_counter()
+	print(f"{name:>20s}: {t1-t0:8.3f} s")
+
+gmsh.finalize()
@@ -0,0 +1,41 @@
+#Timing benchmark for "import gmsh2opensees": lazy package import vs. loading everything up front
+#
+#Usage:
+#
+#	python bench_import.py [repetitions]
+#
+#Each case runs in a fresh python process, best time of all repetitions is shown.
+#"eager" imports every submodule and the opensees backend, which is what the package
+#did at import time before submodules were loaded lazily.
+
+import sys
+import subprocess
+
+
+cases = [
+	("python only", "pass"),
+	("import gmsh2opensees", "import gmsh2opensees"),
+	("+ read_msh", "import gmsh2opensees as g2o; g2o.read_msh"),
+	("+ add_nodes_to_ops", "import gmsh2opensees as g2o; g2o.add_nodes_to_ops"),
+	("eager", "import gmsh2opensees as g2o; [getattr(g2o, name) for name in g2o.__all__]; g2o.get_backend()"),
+]
+
+timer = """
+import time
+t0 = time.perf_counter()
+{code}
+print(time.perf_counter() - t0)
+"""
+
+repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+for name, code in cases:
+	times = []
+	for i in range(repetitions):
+		result = subprocess.run([sys.executable, "-c", timer.format(code=code)], capture_output=True, text=True)
+		if result.returncode != 0:
+			print(f"{name:>22s}: failed ({result.stderr.strip().splitlines()[-1]})")
+			break
+		times.append(float(result.stdout))
+	else:
+		print(f"{name:>22s}: {1000*min(times):8.2f} ms")
@@ -0,0 +1,39 @@
+#Timing benchmark for nodal averaging of element responses (NodalAverager) against the
+#size of the ElementNodeData that visualize_eleNodeResponse_in_gmsh sends to gmsh
+#
+#Usage:
+#
+#	python bench_nodal_average.py [Nnodes] [Nsteps]
+#
+#Averages a random 6-component element field (stresses) on a structured tet mesh with about
+#Nnodes nodes (no gmsh or opensees needed). Weights are element counts here, the
+#volume weights only change the setup.
+
+import sys
+import time
+
+import gmsh2opensees as g2o
+
+from numpy.random import default_rng
+
+from _mesh import box_tets, element_blocks
+
+
+Nnodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+Nsteps = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+blocks = element_blocks(box_tets(round(Nnodes**(1/3))), 4)
+Nelements = len(blocks[4][0])
+rng = default_rng(0)
+data = rng.random((Nelements, 6))
+
+t0 = time.perf_counter()
+averager = g2o.NodalAverager(blocks, None, weights="count")
+t1 = time.perf_counter()
+for step in range(Nsteps):
+	nodal = averager.average(data)
+t2 = time.perf_counter()
+
+print(f"Nnodes={len(averager.nodeTags)} {Nelements=} {Nsteps=}")
+print(f"setup {t1-t0:.3f} s, {(t2-t1)/Nsteps:.3f} s per step")
+print(f"ElementNodeData values per step {Nelements*4*6:,}, NodeData values per step {nodal.size:,}")
@@ -0,0 +1,26 @@
+#Timing benchmark for boundary skin extraction (extract_skin) on structured hex and tet meshes
+#
+#Usage:
+#
+#	python bench_skin.py [Nnodes]
+#
+#No gmsh or opensees needed. Prints the time and how many of the nodes are on the skin.
+
+import sys
+import time
+
+import gmsh2opensees as g2o
+
+from _mesh import box_hexes, box_tets, element_blocks
+
+
+Nnodes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+n = round(Nnodes**(1/3))
+
+for elementType, connectivity in [(5, box_hexes(n)), (4, box_tets(n))]:
+	t0 = time.perf_counter()
+	nodeTags, faces = g2o.extract_skin(element_blocks(connectivity, elementType))
+	t1 = time.perf_counter()
+	Nfaces = sum(len(parents) for parents, face_connectivity in faces.values())
+	print(f"{elementType=} Nelements={len(connectivity)}: {t1-t0:.3f} s, {Nfaces} faces, "
+		f"{len(nodeTags)} of {n**3} nodes on the skin ({len(nodeTags)/n**3:.1%})")
@@ -0,0 +1,54 @@
+#Timing benchmark for the result writers: ASCII MSH vs binary MSH vs VTU (appended raw binary)
+#
+#Usage:
+#
+#	python bench_writers.py [Nnodes] [Nsteps]
+#
+#Writes Nsteps steps of a random 3-component nodal field on a structured tet mesh with
+#about Nnodes nodes (no gmsh or opensees needed), files go to a temporary folder.
+
+import os
+import sys
+import time
+import tempfile
+
+import gmsh2opensees as g2o
+
+from numpy.random import default_rng
+
+from _mesh import box_nodes, box_tets, element_blocks
+
+
+Nnodes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+Nsteps = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+n = round(Nnodes**(1/3))
+nodeTags, coords = box_nodes(n)
+blocks = element_blocks(box_tets(n), 4)
+rng = default_rng(0)
+data = [rng.random((len(nodeTags), 3)) for step in range(Nsteps)]
+print(f"Nnodes={len(nodeTags)} Nelements={len(blocks[4][0])} {Nsteps=}")
+
+with tempfile.TemporaryDirectory() as folder:
+	def msh(binary):
+		with open(os.path.join(folder, f"results_{binary}.msh"), "wb" if binary else "w") as f:
+			g2o.write_msh_header(f, binary)
+			for step in range(Nsteps):
+				g2o.write_msh_node_data(f, "Displacements", nodeTags, data[step], step=step, time=step, binary=binary)
+		return os.path.getsize(f.name)
+
+	def vtu():
+		writer = g2o.VtuSeriesWriter(os.path.join(folder, "results"), nodeTags, coords, blocks)
+		for step in range(Nsteps):
+			writer.write(step, point_data={"Displacements": data[step]})
+		return sum(os.path.getsize(file) for file in writer.files)
+
+	for name, write in [
+			("MSH ascii", lambda: msh(False)),
+			("MSH binary", lambda: msh(True)),
+			("VTU + PVD", vtu),
+		]:
+		t0 = time.perf_counter()
+		size = write()
+		t1 = time.perf_counter()
+		print(f"{name:>12s}: {t1-t0:8.3f} s  {size/2**20:8.1f} MB  {size/2**20/(t1-t0):8.1f} MB/s")
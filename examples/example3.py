@@ -45,7 +45,7 @@ ops.pattern('Plain', patternTag, ts_tag)
 
 ops.eleLoad("-ele", *tetElementTags, "-type", "-selfWeight", 0, 0, 2.)
 
-# loaded_node = 209
+# loaded_node = g2o.get_node_index(gmsh.model).nearest([0., 0., 2.5])[0]  #node closest to the crown
 # Fx = 0.
 # Fy = 0.
 # Fz = -10000  #N
@@ -45,7 +45,7 @@ g2o.fix_nodes(nodeTags, "XYZ")
 
 # ops.eleLoad("-ele", *tetElementTags, "-type", "-selfWeight", 0, 0, 2.)
 
-# loaded_node = 209
+# loaded_node = g2o.get_node_index(gmsh.model).nearest([0., 0., 2.5])[0]  #node closest to the crown
 # Fx = 0.
 # Fy = 0.
 # Fz = -10000  #N
@@ -78,26 +78,19 @@ for i, λ in enumerate(Λ):
 	print(f"{mode=} {ω=} (rad/s) {f=} (Hz) {T=} (s)")
 
 
-mode = 1
-g2o.visualize_eigenmode_in_gmsh(gmsh.model, 
-	mode=mode, 
-	f=sqrt(Λ[mode-1])/(2*pi), 
-	animate=True)
+#First three modes in one view, one time step per mode (the time is the frequency).
+#Pick the mode with the time step slider. The first one is also set up to oscillate in a
+#view of its own, press play in the gmsh window
+modes = [1, 2, 3]
+viewnum = g2o.visualize_eigenmodes_in_gmsh(gmsh.model, 
+	modes=modes, 
+	frequencies=[sqrt(Λ[mode-1])/(2*pi) for mode in modes])
 
-mode = 2
-g2o.visualize_eigenmode_in_gmsh(gmsh.model, 
-	mode=mode, 
-	f=sqrt(Λ[mode-1])/(2*pi), 
-	animate=True)
+g2o.animate_eigenmodes_in_gmsh(viewnum)
 
-mode = 3
-g2o.visualize_eigenmode_in_gmsh(gmsh.model, 
-	mode=mode, 
-	f=sqrt(Λ[mode-1])/(2*pi), 
-	animate=True)
+gmsh.fltk.run()
 
 
 
-gmsh.fltk.run()
 
 gmsh.finalize()
@@ -0,0 +1,88 @@
+#Same model as example2, built in parallel with OpenSeesMP. Each process only
+#creates the nodes and elements of its own part of the mesh. Run with, say, 4
+#processes on one machine:
+#
+#	mpiexec -np 4 python example6.py
+#
+#Every process reads the mesh (no gmsh session needed). Results of each process
+#go to example6_disp_<rank>.msh, merge them on top of example2.msh in gmsh to see
+#the whole deformed shape.
+
+import opensees as ops
+import gmsh2opensees as g2o
+
+model = g2o.read_msh_cached("example2.msh")
+
+rank, nprocs = g2o.get_process_rank_and_count()
+
+#Split the solid among the processes, build only our part from here on
+partition = g2o.partition_mesh(model, groupnames=["Solid"])
+partition.activate()
+
+elements, nodes, interface_nodes = partition.counts()
+if rank == 0:
+	print(f"{nprocs} partitions, elements: {elements}, nodes: {nodes}, interface nodes: {interface_nodes}")
+
+
+
+#We'll add 3-DOF nodes
+ops.model("basicBuilder","-ndm",3,"-ndf",3)
+
+#Add solid material model
+solidMaterialTag =  1
+E = 200e9
+nu = 0.3
+rho = 7300.
+ops.nDMaterial('ElasticIsotropic', solidMaterialTag, E, nu, rho)
+
+#Nodes and elements of the Solid physical group (only the ones of this process are added)
+elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", model)
+g2o.add_nodes_to_ops(nodeTags, model)
+g2o.add_elements_to_ops("Solid", model, {4: "FourNodeTetrahedron"}, solidMaterialTag)
+
+#Apply fixities (only to nodes of this process)
+elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Fixed", model)
+g2o.fix_nodes(nodeTags, "XYZ")
+
+
+
+#Lets add the load at the tip of the beam, in the process that owns the node
+elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Load", model)
+loaded_node = nodeTags[0][0]
+
+linear_ts_tag = 1
+ops.timeSeries('Linear', linear_ts_tag)
+
+patternTag = 1
+ops.pattern('Plain', patternTag, linear_ts_tag)
+
+Fx, Fy, Fz = 0., 0, -1000.
+
+if partition.owns([loaded_node]).all():
+	ops.load(loaded_node, Fx, Fy, Fz)
+
+
+
+#Parallel numberer and solver, interface nodes are tied together by their tag
+Nsteps = 1
+ops.system("Mumps")
+ops.numberer("ParallelRCM")
+ops.constraints('Plain')
+ops.integrator("LoadControl", 1.0/Nsteps)
+ops.algorithm("Newton")
+ops.test('NormDispIncr',1e-8, 10, 1)
+
+ops.analysis("Static")
+
+ops.analyze(Nsteps)
+
+
+
+#Each process writes the displacements of the nodes it owns
+owned_nodes = partition.nodes()
+owned_nodes = owned_nodes[partition.owns(owned_nodes)]
+with open(f"example6_disp_{rank}.msh", "w") as f:
+	g2o.write_msh_header(f)
+	g2o.write_msh_node_data(f, "Displacements", owned_nodes, g2o.get_displacements_at_nodes(owned_nodes))
+
+ops.barrier()
@@ -0,0 +1,53 @@
+#Parametric study on the model of example2: tip displacement for several Young's
+#moduli, each run in its own process. The mesh is read once and shared with the
+#processes, every run builds its own opensees model from it.
+
+import opensees as ops
+import gmsh2opensees as g2o
+
+from numpy import linspace
+
+
+
+def tip_displacement(model, E):
+	#Builds and solves one model, runs in a worker process
+	ops.model("basicBuilder","-ndm",3,"-ndf",3)
+
+	solidMaterialTag =  1
+	nu = 0.3
+	rho = 7300.
+	ops.nDMaterial('ElasticIsotropic', solidMaterialTag, E, nu, rho)
+
+	elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", model)
+	g2o.add_nodes_to_ops(nodeTags, model)
+	g2o.add_elements_to_ops("Solid", model, {4: "FourNodeTetrahedron"}, solidMaterialTag)
+
+	elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Fixed", model)
+	g2o.fix_nodes(nodeTags, "XYZ")
+
+	elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Load", model)
+	loaded_node = nodeTags[0][0]
+
+	ops.timeSeries('Linear', 1)
+	ops.pattern('Plain', 1, 1)
+	ops.load(loaded_node, 0., 0., -1000.)
+
+	ops.system("UmfPack")
+	ops.numberer("Plain")
+	ops.constraints('Plain')
+	ops.integrator("LoadControl", 1.0)
+	ops.algorithm("Linear")
+	ops.analysis("Static")
+	ops.analyze(1)
+
+	return g2o.get_displacements_at_nodes([loaded_node])[0]
+
+
+
+if __name__ == "__main__":
+	Es = linspace(100e9, 300e9, 9)
+
+	results, status = g2o.run_parametric(tip_displacement, Es, "example2.msh", nprocs=4)
+
+	for E, disp, ok, time in zip(Es, results, status["ok"], status["time"]):
+		print(f"E = {E:.3e}  tip displacement = {disp}  ({'ok' if ok else 'failed'}, {time:.3f} s)")
@@ -0,0 +1,98 @@
+#Ground motion response of the model of example3 by modal superposition, compared with
+#the same analysis stepped through opensees (Newmark). The mass is lumped at the nodes
+#(ops.mass) so the modal model sees it through ops.nodeMass.
+
+import time
+import opensees as ops
+import gmsh2opensees as g2o
+import gmsh
+
+from numpy import arange, sin, exp, pi, zeros, abs
+
+gmsh.initialize()
+gmsh.open("example3.msh")
+
+
+ops.model("basicBuilder","-ndm",3,"-ndf",3)
+
+solidMaterialTag =  1
+E = 210e9  # Pa
+nu = 0.3   # -
+rho = 7300. # kg / m³
+ops.nDMaterial('ElasticIsotropic', solidMaterialTag, E, nu, 0.)
+
+elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", gmsh.model)
+g2o.add_nodes_to_ops(nodeTags, gmsh.model)
+blocks = g2o.add_elements_to_ops("Solid", gmsh.model, {4: "FourNodeTetrahedron"}, solidMaterialTag)
+
+#Lump a quarter of the mass of each tet on its nodes
+tets = blocks[4][1]
+x = g2o.get_node_coordinates(tets, gmsh.model).reshape((-1, 4, 3))
+a, b, c = x[:,1] - x[:,0], x[:,2] - x[:,0], x[:,3] - x[:,0]
+volumes = abs((a[:,0]*(b[:,1]*c[:,2] - b[:,2]*c[:,1]) - a[:,1]*(b[:,0]*c[:,2] - b[:,2]*c[:,0])
+	+ a[:,2]*(b[:,0]*c[:,1] - b[:,1]*c[:,0]))) / 6
+nodal_mass = {}
+for connectivity, volume in zip(tets.tolist(), volumes):
+	for node in connectivity:
+		nodal_mass[node] = nodal_mass.get(node, 0.) + rho*volume/4
+for node, m in nodal_mass.items():
+	ops.mass(node, m, m, m)
+
+elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Fixed", gmsh.model)
+g2o.fix_nodes(nodeTags, "XYZ")
+
+
+#Ground motion, a decaying sine
+dt = 0.001
+t = arange(2000)*dt
+ag = 9.81*sin(2*pi*5*t)*exp(-t)
+
+
+#Modal superposition
+Nmodes = 10
+Λ = ops.eigen(Nmodes)
+
+t0 = time.perf_counter()
+modal = g2o.ModalModel(gmsh.model, Λ, damping=0.02)
+q, qdot, qddot = modal.ground_motion_response(ag, dt, direction="x")
+U_modal = modal.nodal_response(q)
+t1 = time.perf_counter()
+
+for mode, T, m in zip(modal.modes, modal.periods, modal.effective_masses[:,0]):
+	print(f"{mode=} {T=:.4f} (s) effective mass in x {m/modal.total_masses[0]:.1%}")
+print(f"Modal superposition: {t1-t0:.3f} s for {len(t)} steps")
+
+
+#Same analysis in opensees, with Rayleigh damping matching 2% at the first two modes
+ω1, ω2 = modal.omega[:2]
+ζ = 0.02
+ops.rayleigh(2*ζ*ω1*ω2/(ω1 + ω2), 0., 0., 2*ζ/(ω1 + ω2))
+ops.timeSeries("Path", 1, "-dt", dt, "-values", *ag)
+ops.pattern("UniformExcitation", 1, 1, "-accel", 1)
+
+ops.system("UmfPack")
+ops.numberer("Plain")
+ops.constraints('Plain')
+ops.integrator("Newmark", 0.5, 0.25)
+ops.algorithm("Linear")
+ops.analysis("Transient")
+
+U_ops = zeros(U_modal.shape)
+t0 = time.perf_counter()
+for step in range(1, len(t)):
+	ops.analyze(1, dt)
+	U_ops[step] = g2o.get_displacements_at_nodes(modal.nodeTags)
+t1 = time.perf_counter()
+print(f"opensees Transient: {t1-t0:.3f} s for {len(t)} steps")
+print(f"Largest difference {abs(U_modal - U_ops).max():.3e}, largest displacement {abs(U_ops).max():.3e}")
+
+
+#Show every 20th step of the modal response
+viewnum = -1
+for step in range(0, len(t), 20):
+	viewnum = g2o.visualize_displacements_in_gmsh(gmsh.model, modal.nodeTags, viewnum, step, t[step],
+		new_view_name="Modal displacements", data=U_modal[step])
+
+gmsh.fltk.run()
+
+gmsh.finalize()
@@ -15,10 +15,68 @@
 
 # from gmsh2opensees import *
 # from g2o_utils import *
-from gmsh2opensees.g2o_utils import *
-from gmsh2opensees.g2o_nodes_functions import *
-from gmsh2opensees.g2o_elements_functions import *
-from gmsh2opensees.g2o_viz import *
+__version__ = "0.1"
+
+#Submodules are only imported when one of their names is first used (PEP 562), so
+#"import gmsh2opensees" is quick and opensees is not loaded by pure mesh work.
+#Public names of each submodule:
+_submodule_names = {
+	"g2o_backend" : ["ops", "set_backend", "get_backend", "get_backend_name", "default_backend_name",
+		"backend_modules", "RecordingBackend", "add_ops_hook"],
+	"g2o_utils" : ["get_physical_groups_index", "invalidate_physical_groups_cache", "get_physical_groups_map",
+		"get_entities_for_physical_group", "get_entity_elements", "remap_tags", "TagMap", "set_node_numbering",
+		"get_node_numbering", "gmsh_to_ops_node_tags", "ops_to_gmsh_node_tags", "TagAllocator", "tag_allocator",
+		"allocate_tags", "reserve_tags", "TagRegistry", "set_local_partition", "get_local_partition",
+		"local_node_mask", "local_element_mask", "local_pair_mask"],
+	"g2o_nodes_functions" : ["reset_node_registry", "get_defined_nodes_registry", "get_defined_gmsh_nodes", "get_fixed_nodes_registry",
+		"get_all_nodes", "get_node_coordinates", "add_nodes_to_ops", "fix_nodes", "apply_fixities", "parse_dofstring",
+		"get_displacements_at_nodes", "get_eigenvector_at_nodes", "get_modal_matrix", "get_modal_data", "invalidate_modal_cache",
+		"get_nodal_responses", "unique_node_tags",
+		"nodal_response_functions"],
+	"g2o_elements_functions" : ["duplicate_equaldof_and_beam_link", "couple_beams_to_solid",
+		"get_element_blocks_in_physical_group", "get_elements_and_nodes_in_physical_group", "add_elements_to_ops",
+		"write_elements_to_script", "source_python_script", "get_element_info_from_elementType"],
+	"g2o_viz" : ["visualize_displacements_in_gmsh", "visualize_nodal_responses_in_gmsh", "DisplacementsRecorder",
+		"visualize_eigenmode_in_gmsh", "visualize_eleResponse_in_gmsh", "visualize_eleNodeResponse_in_gmsh",
+		"get_eleResponse_shape", "get_eleResponse_at_elements", "read_element_recorder", "nodal_response_view_names",
+		"visualize_eigenmodes_in_gmsh", "animate_eigenmodes_in_gmsh", "visualize_nodal_average_in_gmsh"],
+	"g2o_writers" : ["write_msh_header", "write_msh_node_data", "write_msh_element_data", "vtk_cell_types", "write_vtu",
+		"write_pvd", "VtuSeriesWriter"],
+	"g2o_spatial" : ["model_scale", "find_close_pairs", "merge_coincident_nodes", "apply_node_merge", "SpatialIndex",
+		"get_node_index", "get_element_index", "invalidate_spatial_indexes"],
+	"g2o_renumbering" : ["renumber_nodes", "compute_node_renumbering", "node_adjacency", "connectivity_bandwidth"],
+	"g2o_msh" : ["read_msh", "copy_gmsh_model", "MshModel"],
+	"g2o_cache" : ["read_msh_cached", "mesh_cache_key", "save_mesh_cache", "load_mesh_cache", "mesh_to_arrays",
+		"mesh_from_arrays", "cache_format", "mesh_version", "mesh_counts", "mesh_count_options", "mesh_changed", "model_cached"],
+	"g2o_parallel" : ["get_process_rank_and_count", "partition_mesh", "recursive_coordinate_bisection", "MeshPartition"],
+	"g2o_runner" : ["run_parametric"],
+	"g2o_fields" : ["element_measures", "element_simplices", "NodalAverager", "get_nodal_averager", "invalidate_nodal_averagers"],
+	"g2o_skin" : ["extract_skin", "get_skin", "skin_node_tags", "invalidate_skin_cache", "solid_element_faces"],
+	"g2o_modal" : ["ModalModel", "get_nodal_masses", "cqc_correlation", "directions"],
+}
+
+_name_to_submodule = {name : submodule for submodule, names in _submodule_names.items() for name in names}
+
+__all__ = list(_name_to_submodule)
+
+
+def __getattr__(name):
+	import importlib
+
+	if name in _submodule_names:
+		return importlib.import_module(f"gmsh2opensees.{name}")
+	if name not in _name_to_submodule:
+		raise AttributeError(f"module 'gmsh2opensees' has no attribute {name!r}")
+
+	value = getattr(importlib.import_module(f"gmsh2opensees.{_name_to_submodule[name]}"), name)
+	globals()[name] = value
+	return value
+
+
+def __dir__():
+	return sorted(list(globals()) + __all__)
+
+
 # import gmsh2opensees.g2o_utils
 # print("hithere")
 # print(dir(g2o_utils))
\ No newline at end of file
@@ -0,0 +1,190 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Selection of the opensees module, which is only imported the first time it is used
+
+import os
+import importlib
+
+
+_backend = None
+_backend_name = None
+
+#Callbacks run after some opensees functions are called through ops, see add_ops_hook
+_ops_hooks = {}
+
+#Where each backend comes from
+backend_modules = {
+	"opensees" : "opensees",
+	"openseespy" : "openseespy.opensees",
+}
+
+
+
+
+def default_backend_name():
+	"""
+	Backend used if set_backend is not called: the G2O_OPENSEES_BACKEND environment
+	variable if set, otherwise openseespy on windows and opensees elsewhere.
+	"""
+	name = os.environ.get("G2O_OPENSEES_BACKEND", "")
+	if name != "":
+		return name
+	if os.name == 'nt':
+		return "openseespy"
+	else:   #not checked in mac
+		return "opensees"
+
+
+
+
+def set_backend(backend="opensees"):
+	"""
+	Choose what the ops object used by this library talks to:
+
+		"opensees"     the opensees python module (default on linux)
+		"openseespy"   openseespy.opensees (default on windows)
+		"recording"    a RecordingBackend, which does not run anything and only keeps the
+		               calls, handy to build models in processes with no opensees around
+		a module or any object with the opensees functions
+
+	The module is imported right away, so a missing one shows up here. Returns the backend.
+	"""
+	global _backend, _backend_name
+
+	if isinstance(backend, str):
+		name = backend
+		if name == "recording":
+			backend = RecordingBackend()
+		elif name in backend_modules:
+			backend = importlib.import_module(backend_modules[name])
+		else:
+			raise ValueError(f"set_backend: unknown backend {name!r}, use one of {list(backend_modules) + ['recording']} or a module")
+	else:
+		name = getattr(backend, "__name__", type(backend).__name__)
+
+	_backend = backend
+	_backend_name = name
+
+	#Drop the functions cached by the ops proxy
+	ops.__dict__.clear()
+
+	return backend
+
+
+
+
+def get_backend():
+	"""
+	The opensees module (or object) in use. Imports the default one on the first call.
+	"""
+	if _backend is None:
+		set_backend(default_backend_name())
+	return _backend
+
+
+
+
+def get_backend_name():
+	"""
+	Name of the backend in use, None if opensees has not been needed yet.
+	"""
+	return _backend_name
+
+
+
+
+def add_ops_hook(name, callback):
+	"""
+	Call callback() after every ops.name(...) made through the ops object of this library,
+	for instance to forget cached state when the model is wiped (ops.wipe). Calls made on
+	the opensees module directly are not seen.
+	"""
+	_ops_hooks.setdefault(name, []).append(callback)
+	ops.__dict__.pop(name, None)
+
+
+
+
+class _OpsProxy:
+	#Stands for the opensees module. Nothing is imported until the first ops.something, and
+	#functions are then kept in the instance so later lookups are as fast as on the module
+
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		function = getattr(get_backend(), name)
+		if name in _ops_hooks:
+			function = _hooked(function, _ops_hooks[name])
+		self.__dict__[name] = function
+		return function
+
+	def __repr__(self):
+		return f"<gmsh2opensees ops proxy, backend {_backend_name}>"
+
+
+ops = _OpsProxy()
+
+
+def _hooked(function, callbacks):
+	def call(*args):
+		result = function(*args)
+		for callback in callbacks:
+			callback()
+		return result
+	return call
+
+
+
+
+class RecordingBackend:
+	"""
+	Fake opensees that keeps every call in self.calls, as (function name, args) tuples,
+	instead of running it. Queries return empty results (see return_values), except
+	getNodeTags, which gives the nodes defined since the last wipe, so the model building
+	functions of this library run without opensees.
+
+		backend = g2o.set_backend("recording")
+		g2o.add_nodes_to_ops(nodeTags, gmsh.model)
+		print(len(backend.calls))
+	"""
+
+	return_values = {
+		"getEleTags" : [],
+		"getFixedNodes" : [],
+		"nodeCoord" : [0., 0., 0.],
+		"getTime" : 0.,
+	}
+
+	def __init__(self):
+		self.calls = []
+		self.nodes = []
+
+	def __getattr__(self, name):
+		if name.startswith("__"):
+			raise AttributeError(name)
+		calls = self.calls
+		return_value = self.return_values.get(name, None)
+		def record(*args):
+			calls.append((name, args))
+			return return_value
+		return record
+
+	def node(self, *args):
+		self.calls.append(("node", args))
+		self.nodes.append(args[0])
+
+	def wipe(self, *args):
+		self.calls.append(("wipe", args))
+		self.nodes.clear()
+
+	def getNodeTags(self, *args):
+		self.calls.append(("getNodeTags", args))
+		return list(self.nodes)
+
+	def clear(self):
+		self.calls.clear()
+		self.nodes.clear()
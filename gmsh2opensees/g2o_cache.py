@@ -0,0 +1,267 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# On-disk cache of the mesh data extracted from MSH files
+
+import os
+import json
+import zlib
+import shutil
+import hashlib
+import weakref
+import tempfile
+
+from numpy import array, ascontiguousarray, int64, double, concatenate, save, load
+
+from gmsh2opensees.g2o_msh import MshModel, read_msh
+
+
+#Bump when the layout of the cache folders changes, so old caches are not used
+cache_format = 2
+
+
+
+
+def read_msh_cached(filename, cache_dir=None, verbose=False):
+	"""
+	Same as read_msh, but the extracted mesh (node tags and coordinates, element blocks of
+	every entity and the physical groups) is kept on disk as .npy files, keyed by the contents
+	of the MSH file and the library version. The first call reads the MSH file and fills
+	the cache, later calls (say, in a parameter sweep) load the arrays lazily with
+	mmap_mode='r' and skip the extraction.
+
+	cache_dir defaults to a .g2o_cache folder next to the MSH file.
+	"""
+	if cache_dir is None:
+		cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), ".g2o_cache")
+
+	name = os.path.splitext(os.path.basename(filename))[0]
+	path = os.path.join(cache_dir, f"{name}-{mesh_cache_key(filename)}")
+
+	if not os.path.isdir(path):
+		if verbose:
+			print(f"read_msh_cached: caching {filename} in {path}")
+		save_mesh_cache(read_msh(filename), path)
+	elif verbose:
+		print(f"read_msh_cached: using cache {path}")
+
+	return load_mesh_cache(path)
+
+
+
+
+def mesh_cache_key(filename):
+	"""
+	Cache key of an MSH file: hash of its contents, of the library version and of the cache format
+	"""
+	from gmsh2opensees import __version__
+
+	sha = hashlib.sha256()
+	sha.update(f"{__version__} {cache_format}".encode())
+	with open(filename, "rb") as f:
+		for chunk in iter(lambda: f.read(2**24), b""):
+			sha.update(chunk)
+	return sha.hexdigest()[:32]
+
+
+
+
+def save_mesh_cache(model, path):
+	"""
+	Write the mesh in model (an MshModel) to the cache folder path
+	"""
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	tmppath = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(path)))
+
+	arrays, index = mesh_to_arrays(model)
+	for name, values in arrays.items():
+		save(os.path.join(tmppath, f"{name}.npy"), values)
+	with open(os.path.join(tmppath, "index.json"), "w") as f:
+		json.dump(index, f)
+
+	#Another process may have filled the cache meanwhile, that one is just as good
+	try:
+		os.rename(tmppath, path)
+	except OSError:
+		shutil.rmtree(tmppath, ignore_errors=True)
+
+
+
+
+def load_mesh_cache(path):
+	"""
+	Load a cache folder written by save_mesh_cache as an MshModel. Arrays are memory-mapped
+	(read-only), so only the parts actually used are read from disk.
+	"""
+	with open(os.path.join(path, "index.json"), "r") as f:
+		index = json.load(f)
+
+	arrays = {name : load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in index["arrays"]}
+
+	return mesh_from_arrays(arrays, index)
+
+
+
+
+def mesh_to_arrays(model):
+	"""
+	Flatten the mesh in model (an MshModel) into a few big arrays: node tags and coordinates,
+	and element tags and nodes for each element type. Returns a dict name -> array and an
+	index (a json-able dict) telling which rows belong to each entity. See mesh_from_arrays.
+	"""
+	arrays = {}
+
+	#Nodes, all blocks one after the other
+	node_index = []
+	start = 0
+	for (dim, entity), (tags, coords) in model.node_blocks.items():
+		node_index.append([dim, entity, start, start + len(tags)])
+		start += len(tags)
+	arrays["node_tags"] = array(model.mesh.all_node_tags, dtype=int64)
+	arrays["node_coords"] = array(model.mesh.all_coords, dtype=double).reshape((-1,3))
+
+	#Elements, one pair of arrays per element type
+	element_index = []
+	element_tags = {}
+	element_nodes = {}
+	element_count = {}
+	for (dim, entity), blocks in model.element_blocks.items():
+		for elementType, tags, nodeTags in blocks:
+			start = element_count.get(elementType, 0)
+			element_count[elementType] = start + len(tags)
+			element_index.append([dim, entity, int(elementType), start, start + len(tags)])
+			element_tags.setdefault(elementType, []).append(array(tags, dtype=int64))
+			element_nodes.setdefault(elementType, []).append(array(nodeTags, dtype=int64).reshape((len(tags), -1)))
+	for elementType in element_tags:
+		arrays[f"element_tags_{elementType}"] = concatenate(element_tags[elementType])
+		arrays[f"element_nodes_{elementType}"] = concatenate(element_nodes[elementType])
+
+	index = {
+		"name" : model.name,
+		"arrays" : list(arrays),
+		"physical_names" : [[dim, tag, name] for (dim, tag), name in model.physical_names.items()],
+		"physical_entities" : [[dim, tag, [int(e) for e in entities]] for (dim, tag), entities in model.physical_entities.items()],
+		"node_blocks" : node_index,
+		"element_blocks" : element_index,
+	}
+
+	return arrays, index
+
+
+
+
+def mesh_from_arrays(arrays, index):
+	"""
+	Build an MshModel from the output of mesh_to_arrays. The arrays are used as they are
+	(memory maps, shared memory...), not copied.
+	"""
+	model = MshModel(name=index["name"], build_index=False)
+
+	for dim, tag, name in index["physical_names"]:
+		model.physical_names[(dim, tag)] = name
+	for dim, tag, entities in index["physical_entities"]:
+		model.physical_entities[(dim, tag)] = entities
+
+	node_tags = arrays["node_tags"]
+	node_coords = arrays["node_coords"]
+	for dim, entity, start, stop in index["node_blocks"]:
+		model.node_blocks[(dim, entity)] = (node_tags[start:stop], node_coords[start:stop])
+	model.mesh._build_node_index(node_tags, node_coords)
+
+	for dim, entity, elementType, start, stop in index["element_blocks"]:
+		element_tags = arrays[f"element_tags_{elementType}"]
+		element_nodes = arrays[f"element_nodes_{elementType}"]
+		model.element_blocks.setdefault((dim, entity), []).append(
+			(elementType, element_tags[start:stop], element_nodes[start:stop].reshape(-1)))
+
+	return model
+
+
+
+
+#Times mesh_changed was called for each model, part of mesh_version
+_mesh_changes = weakref.WeakKeyDictionary()
+
+#gmsh mesh statistics (read-only options of the current model) used as node and element counts
+mesh_count_options = ["Mesh.NbNodes", "Mesh.NbTriangles", "Mesh.NbQuadrangles", "Mesh.NbTetrahedra",
+	"Mesh.NbHexahedra", "Mesh.NbPrisms", "Mesh.NbPyramids", "Mesh.NbTrihedra"]
+
+
+def mesh_version(gmshmodel, coordinates=False):
+	"""
+	Something that changes whenever the mesh of gmshmodel does: its largest node and element
+	tags, its node and element counts (see mesh_counts) and the number of mesh_changed calls.
+	So re-meshing the same geometry (mesh.clear() and generate()) is seen even if the largest
+	tags stay the same. These are a few gmsh calls that don't touch the nodes or elements
+	themselves, so the caches can check them on every lookup. Moved nodes are not seen: call
+	mesh_changed after moving them.
+
+	With coordinates=True the number of nodes and a checksum (crc32) of all node tags and
+	coordinates are added too. That copies and hashes the whole mesh, O(Nnodes) per call.
+	"""
+	version = (gmshmodel.mesh.getMaxNodeTag(), gmshmodel.mesh.getMaxElementTag(), mesh_counts(gmshmodel),
+		_mesh_changes.get(gmshmodel, 0))
+	if coordinates:
+		tags, coords, parametric_coords = gmshmodel.mesh.getNodes(-1, -1, False, False)
+		checksum = zlib.crc32(ascontiguousarray(tags, dtype=int64))
+		checksum = zlib.crc32(ascontiguousarray(coords, dtype=double), checksum)
+		version += (len(tags), checksum)
+	return version
+
+
+
+
+def mesh_counts(gmshmodel):
+	"""
+	Number of nodes and of elements of each kind in the mesh of gmshmodel, as a tuple. For
+	gmsh.model these are the mesh statistics of gmsh (see mesh_count_options), which it keeps
+	per entity, so nothing is copied. For an MshModel, the lengths of its blocks.
+	"""
+	if isinstance(gmshmodel, MshModel):
+		return (len(gmshmodel.mesh.all_node_tags),) + tuple(len(elementTags)
+			for blocks in gmshmodel.element_blocks.values() for elementType, elementTags, nodeTags in blocks)
+
+	import gmsh
+	return tuple(gmsh.option.getNumber(name) for name in mesh_count_options)
+
+
+
+
+def mesh_changed(gmshmodel):
+	"""
+	Tell the in-memory caches (see model_cached) that the mesh of gmshmodel changed in a way
+	mesh_version can't see, say, moved nodes or elements replaced keeping the same largest tags
+	and counts
+	"""
+	_mesh_changes[gmshmodel] = _mesh_changes.get(gmshmodel, 0) + 1
+
+
+
+
+def model_cached(cache, gmshmodel, key, build, version=(), coordinates=False):
+	"""
+	In-memory cache of things worked out from the mesh of a model (spatial indexes, skins...).
+	Returns the entry key of gmshmodel (and its current gmsh model) in cache, calling build() to
+	make it the first time and again whenever mesh_version(gmshmodel, coordinates) or the
+	extra version change. Leave coordinates=False for caches looked up often (every step), and
+	call mesh_changed after moving nodes instead.
+
+	cache is a weakref.WeakKeyDictionary, so entries belong to the model object itself: two
+	models with the same name don't share them, and they go away with the model.
+	"""
+	entries = cache.get(gmshmodel)
+	if entries is None:
+		entries = {}
+		cache[gmshmodel] = entries
+
+	key = (gmshmodel.getCurrent(), key)
+	version = (mesh_version(gmshmodel, coordinates), version)
+
+	cached = entries.get(key)
+	if cached is None or cached[0] != version:
+		cached = (version, build())
+		entries[key] = cached
+	return cached[1]
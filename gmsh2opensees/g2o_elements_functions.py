@@ -4,20 +4,16 @@
 #
 # 2022 - Jose A. Abell M. - www.joseabell.com
 
-import os
+from gmsh2opensees.g2o_backend import ops
 
-if os.name == 'nt':
-	import openseespy.opensees as ops
-else:   #not checked in mac
-	import opensees as ops
 
 
+from numpy import array, int64, double, concatenate, unique, setdiff1d, zeros, column_stack, full, arange, searchsorted, isin, generic, ndarray
 
-from numpy import array, int32, double, concatenate, unique, setdiff1d, zeros
-from numpy.linalg import norm
-
-from gmsh2opensees.g2o_utils import get_physical_groups_map
-from gmsh2opensees.g2o_nodes_functions import get_all_nodes
+from gmsh2opensees.g2o_utils import get_entities_for_physical_group, get_entity_elements, gmsh_to_ops_node_tags, \
+	get_node_numbering, allocate_tags, reserve_tags, get_local_partition, local_element_mask, local_pair_mask
+from gmsh2opensees.g2o_nodes_functions import get_all_nodes, get_node_coordinates, get_defined_nodes_registry
+from gmsh2opensees.g2o_spatial import model_scale, find_close_pairs
 
 # def rigid_link_between_one_node_and_many(free_node, contrained_nodes, type_of_link):
 
@@ -29,37 +25,181 @@ from gmsh2opensees.g2o_nodes_functions import get_all_nodes
 # 		ops.rigidLink(type_of_link, free_node, int(tag))
 
 
-def duplicate_equaldof_and_beam_link(free_node, constrained_nodes, gmshmodel, start_duplicate_tag, start_beam_tag, transfTag, E_mod):
+def duplicate_equaldof_and_beam_link(free_node, constrained_nodes, gmshmodel, start_duplicate_tag, start_beam_tag, transfTag, E_mod, rtol=1e-6, tol=None, dofs=(1,2,3)):
 	"""
 	This is the magic function that is used to interface the continuum domai with a MoM-based domain in OpenSees
 	This is similar to STKO beam-to-solid coupling, but not as refined. 
 	This is a penalty approach to this problem. Very sensitive to your selection of E_mod
+
+	Solid nodes coincident with free_node (closer than tol, by default rtol times the size of
+	the nodes involved) are not linked. dofs are the DOFs tied by the equalDOFs. Returns the tags
+	of the duplicate nodes and of the penalty beams created. To couple many beams at once, use
+	couple_beams_to_solid.
 	"""
+	return couple_beams_to_solid([free_node], [constrained_nodes], gmshmodel, start_duplicate_tag, start_beam_tag, transfTag, E_mod, rtol=rtol, tol=tol, dofs=dofs)
 
-	parent_coord, _, _, _ = gmshmodel.mesh.get_node(free_node)
 
-	#Flatten the nodeTags array and remove duplicate nodes
-	constrained_nodes = unique(array(constrained_nodes).reshape(-1))
-	
+
+
+
+def couple_beams_to_solid(free_nodes, constrained_nodes, gmshmodel, start_duplicate_tag, start_beam_tag, transfTag, E_mod, rtol=1e-6, tol=None, dofs=(1,2,3)):
+	"""
+	Batched duplicate_equaldof_and_beam_link, for coupling many beams (piles, columns...) 
+	to a solid at once. free_nodes is a list of beam node tags, constrained_nodes a list (same
+	length) of the solid node tags each beam node gets linked to.
+
+	For each link the solid node is duplicated, tied to the duplicate with an equalDOF on dofs,
+	and a penalty elasticBeamColumn goes from the beam node to the duplicate. A solid node that 
+	coincides with its beam node (closer than tol, by default rtol times the size of the nodes
+	involved, see g2o_spatial.model_scale) is not linked to it; it is still linked to other beams.
+	Coincident nodes are found with a grid search (see g2o_spatial.find_close_pairs).
+
+	Pass None as start_duplicate_tag and start_beam_tag to get duplicate node and beam tags 
+	from the tag allocator (see g2o_utils.allocate_tags): they are dense, above every gmsh
+	tag, and never collide between calls. Otherwise duplicates get tag start_duplicate_tag + 
+	solid node tag and beams start_beam_tag, start_beam_tag + 1, ... In that case a solid node
+	can only be linked to one beam, since its duplicates would share a tag; a ValueError is
+	raised before anything is added to opensees.
+
+	With a local partition active (see g2o_parallel.MeshPartition.activate) only the links of
+	this process are built, each in the lowest partition holding both of its nodes (see
+	g2o_utils.local_pair_mask). Tags are worked out for all links first, so they are the same
+	in every process.
+
+	Coordinates are fetched in one go and the distances of all links checked at once. 
+	Returns the tags of the duplicate nodes and of the penalty beams (empty if there are no links).
+	"""
+	no_tags = zeros(0, dtype=int64)
+
+	#Flatten the nodeTags arrays, remove duplicate nodes and build the (beam node, solid node) links
+	parents = []
+	children = []
+	for free_node, group in zip(free_nodes, constrained_nodes):
+		group = unique(array(group, dtype=int64).reshape(-1))
+		parents.append(full(len(group), int(free_node), dtype=int64))
+		children.append(group)
+	if sum(len(group) for group in children) == 0:
+		return no_tags, no_tags.copy()
+	parents = concatenate(parents)
+	children = concatenate(children)
+
+	free_nodes = unique(array(free_nodes, dtype=int64))
+	solid_nodes, children_index = unique(children, return_inverse=True)
+	parents_index = searchsorted(free_nodes, parents)
+
+	coords = get_node_coordinates(concatenate((free_nodes, solid_nodes)), gmshmodel)
+	free_coords, solid_coords = coords[:len(free_nodes)], coords[len(free_nodes):]
+
+	#Do not link solid nodes sitting on top of their own beam node
+	if tol is None:
+		tol = rtol * model_scale(coords)
+	if tol > 0:
+		ia, ib = find_close_pairs(free_coords, solid_coords, tol)
+		keep = ~isin(parents_index*len(solid_nodes) + children_index, ia*len(solid_nodes) + ib)
+		parents, children, children_index = parents[keep], children[keep], children_index[keep]
+	if len(children) == 0:
+		return no_tags, no_tags.copy()
+
+	linked, counts = unique(children, return_counts=True)
+	if start_duplicate_tag is not None and (counts > 1).any():
+		shared = linked[counts > 1]
+		raise ValueError(f"couple_beams_to_solid: solid nodes {shared[:10].tolist()} are linked to more than one beam, "
+			"their duplicates would get the same tag. Pass start_duplicate_tag=None to get tags from the tag allocator")
+
 	#Penalty beam properties
 	Area = 1.0
 	G_mod = 1.0
 	Jxx = 1.0
 	Iy = 1.0
 	Iz = 1.0
-	#Identify DOFs to be fixed
-	for i, nodeTag in enumerate(constrained_nodes):
-		coord, _, _, _ = gmshmodel.mesh.get_node(nodeTag)
 
-		if norm(parent_coord - coord) < 1e-4:
-			continue
+	_reserve_gmsh_tags(gmshmodel)
+
+	if start_duplicate_tag is None:
+		duplicate_tags = allocate_tags("node", len(children))
+	else:
+		duplicate_tags = int64(start_duplicate_tag) + children
+		reserve_tags("node", duplicate_tags)
+
+	if start_beam_tag is None:
+		beam_tags = allocate_tags("element", len(children))
+	else:
+		beam_tags = int64(start_beam_tag) + arange(len(children), dtype=int64)
+		reserve_tags("element", beam_tags)
+
+	local = local_pair_mask(parents, children)
+	parents, children, children_index = parents[local], children[local], children_index[local]
+	duplicate_tags, beam_tags = duplicate_tags[local], beam_tags[local]
+
+	dofs = [int(dof) for dof in dofs]
+	node, equalDOF, element = ops.node, ops.equalDOF, ops.element
+	for duplicate_tag, coord in zip(duplicate_tags.tolist(), solid_coords[children_index].tolist()):
+		node(duplicate_tag, *coord)
+	for nodeTag, duplicate_tag in zip(gmsh_to_ops_node_tags(children).tolist(), duplicate_tags.tolist()):
+		equalDOF(nodeTag, duplicate_tag, *dofs)
+	for eleTag, free_node, duplicate_tag in zip(beam_tags.tolist(), gmsh_to_ops_node_tags(parents).tolist(), duplicate_tags.tolist()):
+		element('elasticBeamColumn', eleTag, free_node, duplicate_tag, Area, E_mod, G_mod, Jxx, Iy, Iz, transfTag)
+
+	get_defined_nodes_registry().add(duplicate_tags)
+
+	return duplicate_tags, beam_tags
+
+
+
+
+
+def _reserve_gmsh_tags(gmshmodel):
+	#Keep allocated tags clear of all gmsh nodes and elements, even the ones not yet in opensees
+	numbering = get_node_numbering()
+	if numbering is None:
+		reserve_tags("node", [gmshmodel.mesh.getMaxNodeTag()])
+	else:
+		reserve_tags("node", numbering.to_tags[-1:])
+	reserve_tags("element", [gmshmodel.mesh.getMaxElementTag()])
+	get_defined_nodes_registry()   #Also reserves tags already in opensees
+
+
+
+
+def get_element_blocks_in_physical_group(groupname, gmshmodel):
+	"""
+	Returns the elements of a physical group as one block per gmsh element type. The output
+	is a dict indexed by gmsh elementType, each entry is a tuple (elementTags, nodeTags) of
+	numpy arrays: elementTags has shape (Nelements,) and nodeTags (the connectivity) has shape
+	(Nelements, element_nnodes). Use get_element_info_from_elementType to get the element 
+	name and number of nodes. 
+
+	Groups with several element types (say, tets and hexes) are fine. 
+	Raises ValueError if the group has no elements. 
+	"""
+
+	dim, entities = get_entities_for_physical_group(groupname, gmshmodel)
+
+	#Collect the blocks for each type and concatenate once at the end
+	elementTags_per_type = {}
+	nodeTags_per_type = {}
+
+	for e in entities:
+		elementTypes, elementTags, nodeTags = get_entity_elements(dim, e, gmshmodel)
+
+		for elementType, blockElementTags, blockNodeTags in zip(elementTypes, elementTags, nodeTags):
+			elementTags_per_type.setdefault(elementType, []).append(blockElementTags)
+			nodeTags_per_type.setdefault(elementType, []).append(blockNodeTags)
+
+	if len(elementTags_per_type) == 0:
+		raise ValueError(f"get_element_blocks_in_physical_group: physical group {groupname!r} (dim={dim}, entities={list(entities)}) "
+			"has no elements. Mesh empty? Try meshing beforehand.")
+
+	blocks = {}
+	for elementType in elementTags_per_type:
+		element_name, element_nnodes = get_element_info_from_elementType(elementType)
+		blocks[elementType] = (
+			concatenate(elementTags_per_type[elementType]).astype(int64), 
+			concatenate(nodeTags_per_type[elementType]).astype(int64).reshape((-1,element_nnodes))
+		)
+
+	return blocks
 
-		duplicate_tag = int(start_duplicate_tag+nodeTag)
-		ops.node(duplicate_tag,*coord)
-		ops.equalDOF(int(nodeTag), duplicate_tag, 1,2,3)
-		# ops.rigidLink("beam", free_node, duplicate_tag)
-		eleTag = start_beam_tag + i
-		ops.element('elasticBeamColumn', eleTag, free_node, duplicate_tag, Area, E_mod, G_mod, Jxx, Iy, Iz, transfTag)
 
 
 
@@ -69,52 +209,161 @@ def get_elements_and_nodes_in_physical_group(groupname, gmshmodel):
 	Returns element tags, node tags (connectivity), element name (gmsh element type name), and
 	number of nodes for the element type, given the name of a physical group. Inputs are the physical
 	group string name and the gmsh model 
+
+	Tags are returned as python lists. For large groups, or groups with more than one element type, 
+	use get_element_blocks_in_physical_group which returns numpy arrays.
 	"""
 
+	blocks = get_element_blocks_in_physical_group(groupname, gmshmodel)
 
-	dim, tag  = get_physical_groups_map(gmshmodel)[groupname]  
-	entities = gmshmodel.getEntitiesForPhysicalGroup(dim, tag)
+	if len(blocks) != 1:
+		raise ValueError(f"get_elements_and_nodes_in_physical_group: physical group {groupname!r} has more than one "
+			f"element type ({list(blocks.keys())}). Use get_element_blocks_in_physical_group instead.")
 
+	(elementType, (allelementtags, allnodetags)), = blocks.items()
+	element_name, element_nnodes = get_element_info_from_elementType(elementType)
+		
+	return allelementtags.tolist(), allnodetags.tolist(), element_name, element_nnodes
 
-	allelementtags = array([], dtype=int32)
-	allnodetags = array([], dtype=int32)
 
-	base_element_type = -1
 
-	for e in entities:
-		elementTypes, elementTags, nodeags = gmshmodel.mesh.getElements(dim, e)
 
-		if len(elementTypes) == 0:
-			print(f"get_elements_and_nodes_in_physical_group({groupname=}, {gmshmodel=})  ")
-			print("Physical group has no elements! (Mesh empty, try meshing beforehand.) ")
-			print(f"{dim=} ")
-			print(f"{e=} ")
-			print(f"{tag=} ")
-			exit(-1)
 
-		if len(elementTypes) != 1:
-			print(f"get_elements_and_nodes_in_physical_group({groupname=}, {gmshmodel=})  ")
-			print("Cannot handle more than one element type at this moment. Contributions welcome. ")
-			print(f"{elementTypes=} ")
-			exit(-1)
+def add_elements_to_ops(groupname, gmshmodel, element_types, *args):
+	"""
+	Adds all elements of a physical group to opensees in one go. element_types maps each gmsh 
+	element type in the group (number or gmsh name, for example 4 or "4-node-tetrahedron") to 
+	the opensees element type, either just its name or a tuple with the name followed by 
+	arguments that go after the nodes. Any extra args are appended to every element. 
+	For example:
 
-		if base_element_type == -1:
-			base_element_type = elementTypes[0]
-		elif elementTypes[0] != base_element_type:
-			print(f"get_elements_and_nodes_in_physical_group({groupname=}, {gmshmodel=})  ")
-			print("All entities of physical group should have the same element type. Contributions welcome. ")
-			print(f"{elementTypes=} ")
-			exit(-1)
+		add_elements_to_ops("Solid", gmsh.model, {4: "FourNodeTetrahedron"}, solidMaterialTag, 0., 0., -rho*g)
 
+	will call ops.element('FourNodeTetrahedron', eleTag, *eleNodes, solidMaterialTag, 0., 0., -rho*g)
+	for each element. Tags are converted to python ints once for the whole block and argument
+	tuples are built beforehand, so there is little per-element overhead left. Node tags 
+	follow the active node numbering, if any (see set_node_numbering). If a local partition
+	is active (see g2o_parallel), only the elements of this process are added.
 
-		allelementtags = concatenate((allelementtags,elementTags[0]))
-		allnodetags = concatenate((allnodetags,nodeags[0]))
+	Returns the element blocks that were added (see get_element_blocks_in_physical_group)
+	"""
 
-	element_name, element_nnodes = get_element_info_from_elementType(base_element_type)
-	allnodetags = allnodetags.reshape((-1,element_nnodes))
+	blocks = _local_blocks(get_element_blocks_in_physical_group(groupname, gmshmodel))
 
-		
-	return int32(allelementtags).tolist(), int32(allnodetags).tolist(), element_name, element_nnodes
+	element = ops.element
+	for elementType, ops_type, trailing_args, rows in _element_rows(blocks, element_types, args):
+		for row in rows:
+			element(ops_type, *row, *trailing_args)
+
+	for elementTags, nodeTags in blocks.values():
+		reserve_tags("element", elementTags)
+
+	return blocks
+
+
+
+
+
+def write_elements_to_script(filename, groupname, gmshmodel, element_types, *args, language="python", mode="w"):
+	"""
+	Same as add_elements_to_ops, but instead of calling opensees writes the element commands
+	to a script. language can be "python" (ops.element(...) lines, load it with 
+	source_python_script) or "tcl" (element ... lines, source it from OpenSees tcl). 
+	Use mode="a" to append to an existing script. 
+
+	Returns the element blocks (see get_element_blocks_in_physical_group)
+	"""
+	from numpy import savetxt
+
+	blocks = _local_blocks(get_element_blocks_in_physical_group(groupname, gmshmodel))
+
+	with open(filename, mode) as f:
+		for elementType, ops_type, trailing_args, rows in _element_rows(blocks, element_types, args, tolist=False):
+			trailing_args = [_plain_arg(arg) for arg in trailing_args]
+			ncolumns = rows.shape[1]
+			if language == "python":
+				head = f"ops.element({ops_type!r}, ".replace("%", "%%")
+				tail = ("".join(f", {arg!r}" for arg in trailing_args) + ")").replace("%", "%%")
+				fmt = head + ", ".join(["%d"]*ncolumns) + tail
+			elif language == "tcl":
+				head = f"element {ops_type} ".replace("%", "%%")
+				tail = "".join(f" {arg}" for arg in trailing_args).replace("%", "%%")
+				fmt = head + " ".join(["%d"]*ncolumns) + tail
+			else:
+				raise ValueError(f"write_elements_to_script: unknown {language=}, use 'python' or 'tcl'")
+			savetxt(f, rows, fmt=fmt)
+
+	return blocks
+
+
+
+
+
+def _plain_arg(arg):
+	#Element argument as a plain python int, float or str, so the script does not depend on
+	#how it was computed (the repr of numpy.float64(1.) is "np.float64(1.0)")
+	if isinstance(arg, (generic, ndarray)):
+		arg = arg.item()
+	if isinstance(arg, bool):
+		return int(arg)
+	for kind in (int, float, str):
+		if isinstance(arg, kind):
+			return kind(arg)
+	raise TypeError(f"write_elements_to_script: can't write element argument {arg!r} of type {type(arg).__name__}")
+
+
+
+
+def source_python_script(filename):
+	"""
+	Run a python script written by write_elements_to_script (or similar) in one call. 
+	The script sees the opensees module as ops.
+	"""
+	with open(filename, "r") as f:
+		code = compile(f.read(), filename, "exec")
+	exec(code, {"ops": ops})
+
+
+
+
+
+def _local_blocks(blocks):
+	#Only the elements of this process, when building a partitioned model
+	if get_local_partition() is None:
+		return blocks
+	local_blocks = {}
+	for elementType, (elementTags, nodeTags) in blocks.items():
+		local = local_element_mask(elementTags)
+		if local.any():
+			local_blocks[elementType] = (elementTags[local], nodeTags[local])
+	return local_blocks
+
+
+
+
+def _element_rows(blocks, element_types, args, tolist=True):
+	#Yields, per block, the opensees element type, the arguments that go after the nodes
+	#and the (element tag, node tags...) rows
+	for elementType, (elementTags, nodeTags) in blocks.items():
+		element_name, element_nnodes = get_element_info_from_elementType(elementType)
+
+		if elementType in element_types:
+			ops_element = element_types[elementType]
+		elif element_name in element_types:
+			ops_element = element_types[element_name]
+		else:
+			raise ValueError(f"No opensees element type given for gmsh {elementType=} ({element_name})")
+
+		if isinstance(ops_element, str):
+			ops_type, type_args = ops_element, ()
+		else:
+			ops_type, type_args = ops_element[0], tuple(ops_element[1:])
+
+		rows = column_stack((elementTags, gmsh_to_ops_node_tags(nodeTags)))
+		if tolist:
+			rows = rows.tolist()
+
+		yield elementType, ops_type, type_args + tuple(args), rows
 
 
 
@@ -132,12 +381,18 @@ def get_element_info_from_elementType(elementType):
 		3         : ( "4-node-quadrangle"   , 4       )  ,
 		4         : ( "4-node-tetrahedron"  , 4       )  ,
 		5         : ( "8-node-hexahedron"   , 8       )  ,
+		6         : ( "6-node-prism"        , 6       )  ,
+		7         : ( "5-node-pyramid"      , 5       )  ,
+		8         : ( "3-node-line"         , 3       )  ,
 		9         : ( "6-node-triangle"     , 6       ) ,
+		10        : ( "9-node-quadrangle"   , 9       ) ,
 		11        : ( "10-node-tetrahedron" , 10      ) ,
+		12        : ( "27-node-hexahedron"  , 27      ) ,
 		15        : ( "1-node-point"        , 1       )  ,
+		16        : ( "8-node-quadrangle"   , 8       ) ,
+		17        : ( "20-node-hexahedron"  , 20      ) ,
 	}
 	if elementType in info:
 		return info[elementType]
 	else:
-		print(f"elementType={elementType} unavailable. Contributions welcome. See https://gmsh.info/doc/texinfo/gmsh.html#MSH-file-format")
-		exit(-1)
+		raise ValueError(f"elementType={elementType} unavailable. Contributions welcome. See https://gmsh.info/doc/texinfo/gmsh.html#MSH-file-format")
@@ -0,0 +1,181 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Element to node transfer of fields: weighted nodal averages of element and Gauss point responses
+
+import weakref
+
+from numpy import asarray, double, int64, zeros, ones, arange, repeat, concatenate, unique, bincount, cross, abs, sqrt
+
+from gmsh2opensees.g2o_nodes_functions import get_node_coordinates
+from gmsh2opensees.g2o_elements_functions import get_element_blocks_in_physical_group
+
+
+#Dimension of each gmsh element type and its split into
+#simplices of corner nodes, used to compute the element measure (length, area, volume)
+element_simplices = {
+#  elementType   dim  simplices
+	1  : (1, [(0,1)]),
+	8  : (1, [(0,1)]),
+	2  : (2, [(0,1,2)]),
+	9  : (2, [(0,1,2)]),
+	3  : (2, [(0,1,2), (0,2,3)]),
+	10 : (2, [(0,1,2), (0,2,3)]),
+	16 : (2, [(0,1,2), (0,2,3)]),
+	4  : (3, [(0,1,2,3)]),
+	11 : (3, [(0,1,2,3)]),
+	5  : (3, [(0,1,2,6), (0,2,3,6), (0,3,7,6), (0,7,4,6), (0,4,5,6), (0,5,1,6)]),
+	12 : (3, [(0,1,2,6), (0,2,3,6), (0,3,7,6), (0,7,4,6), (0,4,5,6), (0,5,1,6)]),
+	17 : (3, [(0,1,2,6), (0,2,3,6), (0,3,7,6), (0,7,4,6), (0,4,5,6), (0,5,1,6)]),
+	6  : (3, [(0,1,2,3), (1,2,3,4), (2,3,4,5)]),
+	7  : (3, [(0,1,2,4), (0,2,3,4)]),
+	15 : (0, []),
+}
+
+
+
+
+def element_measures(elementType, connectivity, gmshmodel):
+	"""
+	Length, area or volume (depending on the dimension of elementType) of the elements with
+	connectivity (Nelements, nnodes), computed from the corner nodes (straight sided
+	elements). Points get a measure of 1. Returns an (Nelements,) array.
+	"""
+	if elementType not in element_simplices:
+		raise ValueError(f"element_measures: gmsh element type {elementType} not supported")
+	dim, simplices = element_simplices[elementType]
+
+	connectivity = asarray(connectivity, dtype=int64)
+	connectivity = connectivity.reshape((len(connectivity), -1))
+	if dim == 0:
+		return ones(len(connectivity))
+
+	ncorners = max(max(simplex) for simplex in simplices) + 1
+	x = get_node_coordinates(connectivity[:,:ncorners], gmshmodel).reshape((len(connectivity), ncorners, 3))
+
+	measures = zeros(len(connectivity))
+	for simplex in simplices:
+		edges = [x[:,i] - x[:,simplex[0]] for i in simplex[1:]]
+		if dim == 1:
+			measures += sqrt((edges[0]**2).sum(axis=1))
+		elif dim == 2:
+			measures += sqrt((cross(edges[0], edges[1])**2).sum(axis=1)) / 2
+		else:
+			measures += abs((cross(edges[0], edges[1]) * edges[2]).sum(axis=1)) / 6
+	return measures
+
+
+
+
+class NodalAverager:
+	"""
+	Weighted nodal averages of element fields over the elements in blocks (a physical group
+	name, or blocks as returned by get_element_blocks_in_physical_group). The value at a node is
+
+		sum_e w_e v_e / sum_e w_e
+
+	over the elements e touching the node, where w_e is the element measure (weights="measure",
+	the default: volume for solids, area for shells), 1 (weights="count") or given per element.
+
+	The connectivity lookup and weights are worked out once, so averaging one step is a
+	single bincount over all elements and components. Attributes:
+
+		elementTags   the elements, in the order the element values go (the blocks one after
+		              the other, so the same order as get_elements_and_nodes_in_physical_group)
+		nodeTags      the nodes touched by the elements, sorted. Averages come in this order
+		weights       w_e of every element
+
+	Use get_nodal_averager to get a cached one for a physical group.
+	"""
+
+	def __init__(self, blocks, gmshmodel, weights="measure"):
+		if isinstance(blocks, str):
+			blocks = get_element_blocks_in_physical_group(blocks, gmshmodel)
+
+		self.elementTags = concatenate([asarray(elementTags, dtype=int64).reshape(-1) for elementTags, connectivity in blocks.values()])
+		self.nnodes = [asarray(connectivity).reshape((len(elementTags), -1)).shape[1] for elementTags, connectivity in blocks.values()]
+
+		if isinstance(weights, str):
+			if weights == "measure":
+				weights = concatenate([element_measures(elementType, connectivity, gmshmodel)
+					for elementType, (elementTags, connectivity) in blocks.items()])
+			elif weights == "count":
+				weights = ones(len(self.elementTags))
+			else:
+				raise ValueError(f"NodalAverager: unknown {weights=}, use 'measure', 'count' or an array")
+		self.weights = asarray(weights, dtype=double).reshape(len(self.elementTags))
+
+		#One entry per (element, node) pair, element by element
+		self.nodeTags, self._entry_node = unique(concatenate([asarray(connectivity, dtype=int64).reshape(-1)
+			for elementTags, connectivity in blocks.values()]), return_inverse=True)
+		self._entry_node = self._entry_node.reshape(-1)
+		self._entry_element = repeat(arange(len(self.elementTags)), repeat(self.nnodes, [len(elementTags) for elementTags, connectivity in blocks.values()]))
+		self._entry_weight = self.weights[self._entry_element]
+
+		denominator = bincount(self._entry_node, weights=self._entry_weight, minlength=len(self.nodeTags))
+		denominator[denominator == 0] = 1.
+		self._denominator = denominator
+		self._indices = {}
+
+	def average(self, values, npoints=1, at_nodes=False, out=None):
+		"""
+		Nodal averages of values, an (Nelements, ...) array, one row per element in the order of
+		elementTags. Each row has npoints*Ncomponents values, for instance the stresses at the
+		npoints Gauss points of the element (as given by ops.eleResponse), which are averaged over
+		the element first. With at_nodes=True the rows hold values at each element node
+		(nnodes*Ncomponents, node by node, like visualize_eleNodeResponse_in_gmsh), which go
+		to their own node; all elements need the same number of nodes then.
+
+		Returns an (Nnodes, Ncomponents) array, in the order of nodeTags.
+		"""
+		Nelements = len(self.elementTags)
+		values = asarray(values, dtype=double).reshape((Nelements, -1))
+
+		#Weighted values of every (element, node) entry
+		if at_nodes:
+			if len(set(self.nnodes)) != 1:
+				raise ValueError("NodalAverager.average: at_nodes=True needs all elements with the same number of nodes")
+			entries = values.reshape((Nelements*self.nnodes[0], -1)) * self._entry_weight[:,None]
+		else:
+			entries = (values.reshape((Nelements, npoints, -1)).mean(axis=1) * self.weights[:,None])[self._entry_element]
+
+		Ncomponents = entries.shape[1]
+		if Ncomponents not in self._indices:
+			self._indices[Ncomponents] = (self._entry_node[:,None]*Ncomponents + arange(Ncomponents)).reshape(-1)
+
+		sums = bincount(self._indices[Ncomponents], weights=entries.reshape(-1),
+			minlength=len(self.nodeTags)*Ncomponents).reshape((-1, Ncomponents))
+		if out is None:
+			out = zeros((len(self.nodeTags), Ncomponents))
+		out[:,:] = sums / self._denominator[:,None]
+		return out
+
+
+
+
+#Nodal averagers per model, physical group and weights. See get_nodal_averager
+_averager_cache = weakref.WeakKeyDictionary()
+
+
+def get_nodal_averager(groupname, gmshmodel, weights="measure"):
+	"""
+	NodalAverager for the elements of a physical group, built once and kept until the mesh
+	changes (see g2o_cache.model_cached: re-meshed, or g2o_cache.mesh_changed after moving
+	nodes). weights is "measure" or "count".
+	"""
+	from gmsh2opensees.g2o_cache import model_cached
+
+	return model_cached(_averager_cache, gmshmodel, (groupname, weights),
+		lambda: NodalAverager(groupname, gmshmodel, weights))
+
+
+
+
+def invalidate_nodal_averagers():
+	"""
+	Forget the cached nodal averagers (see get_nodal_averager)
+	"""
+	_averager_cache.clear()
@@ -0,0 +1,255 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Linear dynamic response by modal superposition, in numpy, from the eigenvectors of opensees
+
+from numpy import asarray, double, zeros, ones, stack, sqrt, exp, sin, cos, pi, broadcast_to, einsum, searchsorted
+
+from gmsh2opensees.g2o_backend import ops
+from gmsh2opensees.g2o_utils import gmsh_to_ops_node_tags
+from gmsh2opensees.g2o_nodes_functions import get_modal_data, unique_node_tags, get_defined_gmsh_nodes
+
+
+#Direction of ground motions and spectra
+directions = {"x": 0, "y": 1, "z": 2}
+
+
+
+
+class ModalModel:
+	"""
+	Modal model of a linear opensees model, to get its dynamic response without stepping
+	through a transient analysis in opensees. After
+
+		eigenvalues = ops.eigen(Nmodes)
+		modal = g2o.ModalModel(gmsh.model, eigenvalues, damping=0.05)
+
+	it has, for the modes 1...Nmodes:
+
+		nodeTags      the nodes of the model, sorted
+		matrix        (Nmodes, Nnodes, ndf) eigenvectors (see get_modal_data)
+		masses        (Nnodes, ndf) nodal masses, from ops.nodeMass unless given
+		omega         circular frequencies (rad/s), and frequencies (Hz), periods (s)
+		damping       modal damping ratios
+		generalized_masses     phi_n^T M phi_n
+		participation_factors  (Nmodes, ndf), Gamma_n = phi_n^T M r / phi_n^T M phi_n for
+		                       r the unit rigid body translation in each direction
+		effective_masses       (Nmodes, ndf), Gamma_n^2 phi_n^T M phi_n
+
+	Only nodal (lumped) masses are seen by ops.nodeMass. If the mass comes from the elements
+	(say, a density in the material), pass the lumped nodal masses as masses, an (Nnodes, ndf)
+	array in the order of nodeTags, or a function of nodeTags returning it.
+
+	nodeTags (gmsh tags) defaults to the nodes of gmshmodel that are defined in opensees, so
+	only some of the groups of the mesh may be in the model. Nodes that are not gmsh nodes
+	(say, the duplicates made by couple_beams_to_solid) are not part of it.
+	"""
+
+	def __init__(self, gmshmodel, eigenvalues, damping=0.05, ndf=3, masses=None, nodeTags=None):
+		eigenvalues = asarray(eigenvalues, dtype=double).reshape(-1)
+		if (eigenvalues <= 0).any():
+			raise ValueError("ModalModel: eigenvalues should be positive (rigid body modes can't be integrated)")
+
+		self.modes = list(range(1, len(eigenvalues) + 1))
+		self.ndf = ndf
+
+		if nodeTags is None:
+			nodeTags = get_defined_gmsh_nodes(gmshmodel)
+		modal_data = get_modal_data(gmshmodel, self.modes, ndf, nodeTags)
+		self.nodeTags = modal_data["nodeTags"]
+		self.matrix = modal_data["matrix"]
+
+		self.omega = sqrt(eigenvalues)
+		self.frequencies = self.omega / (2*pi)
+		self.periods = 1 / self.frequencies
+		self.damping = broadcast_to(asarray(damping, dtype=double), self.omega.shape).copy()
+		if (self.damping >= 1).any() or (self.damping < 0).any():
+			raise ValueError("ModalModel: damping ratios should be in [0, 1)")
+
+		if masses is None:
+			masses = get_nodal_masses(self.nodeTags, ndf)
+		elif callable(masses):
+			masses = masses(self.nodeTags)
+		self.masses = asarray(masses, dtype=double).reshape((len(self.nodeTags), ndf))
+		if not self.masses.any():
+			raise ValueError("ModalModel: all nodal masses are zero. Add nodal masses or pass masses= (see docstring)")
+
+		#phi^T M phi and phi^T M r, for r a unit translation in each direction
+		self.generalized_masses = einsum("mnd,nd,mnd->m", self.matrix, self.masses, self.matrix)
+		self.participation_factors = einsum("mnd,nd->md", self.matrix, self.masses) / self.generalized_masses[:,None]
+		self.effective_masses = self.participation_factors**2 * self.generalized_masses[:,None]
+		self.total_masses = self.masses.sum(axis=0)
+
+	def modal_loads(self, nodeTags, forces):
+		"""
+		Project nodal forces onto the modes: forces is an (Nt, Nloaded, ndf) history (or
+		(Nloaded, ndf) for a constant load) on nodeTags. Returns (Nt, Nmodes) modal forces
+		phi_n^T F / phi_n^T M phi_n, to use with modal_response.
+		"""
+		nodeTags = asarray(nodeTags).reshape(-1)
+		rows = searchsorted(self.nodeTags, nodeTags)
+		rows[rows == len(self.nodeTags)] = 0
+		if (self.nodeTags[rows] != nodeTags).any():
+			raise KeyError("ModalModel.modal_loads: loaded nodes not in the model")
+		forces = asarray(forces, dtype=double).reshape((-1, len(nodeTags), self.ndf))
+		return einsum("mnd,tnd->tm", self.matrix[:,rows], forces) / self.generalized_masses
+
+	def ground_motion_loads(self, ag, direction="x"):
+		"""
+		Modal forces -Gamma_n ag(t) of a ground acceleration history ag in direction
+		("x", "y", "z" or the dof number). Returns an (Nt, Nmodes) array.
+		"""
+		d = directions.get(direction, direction)
+		return -asarray(ag, dtype=double).reshape((-1,1)) * self.participation_factors[:,d]
+
+	def modal_response(self, loads, dt):
+		"""
+		Integrate the modal equations q'' + 2 zeta w q' + w^2 q = p(t) for (Nt, Nmodes) modal
+		loads p sampled every dt, starting at rest. The exact solution for loads varying
+		linearly within each step (Nigam and Jennings) is used, so the result does not depend
+		on dt beyond the sampling of the load.
+
+		The recurrence is a second order linear filter on the load of each mode, run over the
+		whole record at once with scipy.signal.lfilter. Without scipy it falls back to a time
+		step loop (vectorized over the modes), which is much slower for long records.
+
+		Returns q, q' and q'' (relative), each (Nt, Nmodes).
+		"""
+		p = asarray(loads, dtype=double).reshape((-1, len(self.omega)))
+		A, B, C, D, Ap, Bp, Cp, Dp = _nigam_jennings_coefficients(self.omega, self.damping, dt)
+
+		try:
+			from scipy.signal import lfilter
+		except ImportError:
+			lfilter = None
+
+		Nt = len(p)
+		q = zeros(p.shape)
+		qdot = zeros(p.shape)
+		if Nt == 0:
+			pass
+		elif lfilter is not None:
+			#The state recurrence x[i+1] = M x[i] + c p[i] + d p[i+1], with M = [[A, B], [Ap, Bp]],
+			#as transfer functions from p to q and to q'. The initial filter state makes
+			#q[0] = q'[0] = 0, as the recurrence starts at rest instead of at x[0] = d p[0]
+			a = stack((ones(len(A)), -(A + Bp), A*Bp - B*Ap), axis=1)
+			b = stack((D, C - Bp*D + B*Dp, B*Cp - Bp*C), axis=1)
+			bdot = stack((Dp, Ap*D + Cp - A*Dp, Ap*C - A*Cp), axis=1)
+			zi = stack((-D, Bp*D - B*Dp), axis=1) * p[0][:,None]
+			zidot = stack((-Dp, A*Dp - Ap*D), axis=1) * p[0][:,None]
+			for n in range(len(self.omega)):
+				q[:,n] = lfilter(b[n], a[n], p[:,n], zi=zi[n])[0]
+				qdot[:,n] = lfilter(bdot[n], a[n], p[:,n], zi=zidot[n])[0]
+		else:
+			for i in range(Nt - 1):
+				q[i+1] = A*q[i] + B*qdot[i] + C*p[i] + D*p[i+1]
+				qdot[i+1] = Ap*q[i] + Bp*qdot[i] + Cp*p[i] + Dp*p[i+1]
+		qddot = p - 2*self.damping*self.omega*qdot - self.omega**2*q
+
+		return q, qdot, qddot
+
+	def ground_motion_response(self, ag, dt, direction="x"):
+		"""
+		Response to a ground acceleration history ag (sampled every dt) in direction. Same as
+		modal_response(ground_motion_loads(ag, direction), dt). Nodal displacements are relative
+		to the ground.
+		"""
+		return self.modal_response(self.ground_motion_loads(ag, direction), dt)
+
+	def nodal_response(self, q, steps=None, nodeTags=None):
+		"""
+		Nodal values u = sum_n phi_n q_n(t) of a modal history q ((Nt, Nmodes), from
+		modal_response), at the time steps steps (default all; an index, slice or array) and
+		nodes nodeTags (default all). Returns an (Nsteps, Nnodes, ndf) array, nodes sorted
+		by tag; each step is laid out like get_displacements_at_nodes, so it can be passed as
+		data to visualize_displacements_in_gmsh.
+		"""
+		q = asarray(q, dtype=double).reshape((-1, len(self.omega)))
+		if steps is not None:
+			q = q[steps].reshape((-1, len(self.omega)))
+		matrix = self.matrix
+		if nodeTags is not None:
+			nodeTags = unique_node_tags(nodeTags)
+			rows = searchsorted(self.nodeTags, nodeTags)
+			rows[rows == len(self.nodeTags)] = 0
+			if (self.nodeTags[rows] != nodeTags).any():
+				raise KeyError("ModalModel.nodal_response: nodes not in the model")
+			matrix = matrix[:,rows]
+		Nmodes, Nnodes, ndf = matrix.shape
+		return (q @ matrix.reshape((Nmodes, -1))).reshape((len(q), Nnodes, ndf))
+
+	def response_spectrum(self, Sa, direction="x", combination="CQC"):
+		"""
+		Peak nodal displacements for a design spectrum in direction. Sa is either a function
+		of the period (s) and damping ratio, Sa(T, zeta), vectorized over T, or the spectral
+		accelerations of each mode. Modal peaks phi_n Gamma_n Sa_n / w_n^2 are combined with
+		"SRSS" or "CQC" (Der Kiureghian correlation, modal damping). Returns (Nnodes, ndf).
+		"""
+		d = directions.get(direction, direction)
+		if callable(Sa):
+			Sa = Sa(self.periods, self.damping)
+		Sa = broadcast_to(asarray(Sa, dtype=double), self.omega.shape)
+
+		peaks = (self.participation_factors[:,d] * Sa / self.omega**2)[:,None,None] * self.matrix
+
+		if combination == "SRSS":
+			return sqrt((peaks**2).sum(axis=0))
+		elif combination == "CQC":
+			rho = cqc_correlation(self.omega, self.damping)
+			return sqrt(abs(einsum("ij,ind,jnd->nd", rho, peaks, peaks)))
+		else:
+			raise ValueError(f"response_spectrum: unknown {combination=}, use 'SRSS' or 'CQC'")
+
+
+
+
+def get_nodal_masses(nodeTags, ndf=3):
+	"""
+	Nodal masses of nodeTags (gmsh tags) from ops.nodeMass, as an (Nnodes, ndf) array
+	"""
+	nodeTags = asarray(nodeTags).reshape(-1)
+	masses = zeros((len(nodeTags), ndf))
+	nodeMass = ops.nodeMass
+	if len(nodeTags) > 0:
+		masses[:,:] = [nodeMass(tag)[:ndf] for tag in gmsh_to_ops_node_tags(nodeTags).tolist()]
+	return masses
+
+
+
+
+def cqc_correlation(omega, damping):
+	"""
+	Der Kiureghian's CQC correlation coefficients between all pairs of modes, given their
+	circular frequencies and damping ratios. Returns an (Nmodes, Nmodes) array.
+	"""
+	omega = asarray(omega, dtype=double)
+	zeta = broadcast_to(asarray(damping, dtype=double), omega.shape)
+	r = omega[None,:] / omega[:,None]
+	zi, zj = zeta[:,None], zeta[None,:]
+	return (8*sqrt(zi*zj)*(zi + r*zj)*r**1.5) / ((1 - r**2)**2 + 4*zi*zj*r*(1 + r**2) + 4*(zi**2 + zj**2)*r**2)
+
+
+
+
+def _nigam_jennings_coefficients(omega, zeta, dt):
+	#Exact recurrence for a unit-mass SDOF under a piecewise linear load (see Chopra, Table 5.2.1)
+	wd = omega*sqrt(1 - zeta**2)
+	e = exp(-zeta*omega*dt)
+	s = sin(wd*dt)
+	c = cos(wd*dt)
+	k = omega**2
+	z = zeta / sqrt(1 - zeta**2)
+
+	A = e*(z*s + c)
+	B = e*s/wd
+	C = (2*zeta/(omega*dt) + e*(((1 - 2*zeta**2)/(wd*dt) - z)*s - (1 + 2*zeta/(omega*dt))*c)) / k
+	D = (1 - 2*zeta/(omega*dt) + e*((2*zeta**2 - 1)/(wd*dt)*s + 2*zeta/(omega*dt)*c)) / k
+	Ap = -e*omega/sqrt(1 - zeta**2)*s
+	Bp = e*(c - z*s)
+	Cp = (-1/dt + e*((omega/sqrt(1 - zeta**2) + z/dt)*s + c/dt)) / k
+	Dp = (1 - e*(z*s + c)) / (k*dt)
+
+	return A, B, C, D, Ap, Bp, Cp, Dp
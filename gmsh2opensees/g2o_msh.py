@@ -0,0 +1,373 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Reader for MSH 4.1 files (ASCII and binary), so models can be built without a gmsh session
+
+import os
+
+from numpy import array, int32, int64, uint64, double, zeros, concatenate, argsort, searchsorted, frombuffer, memmap
+
+from gmsh2opensees.g2o_elements_functions import get_element_info_from_elementType
+
+
+
+
+def read_msh(filename):
+	"""
+	Read an MSH 4.1 file (ASCII or binary) without gmsh. Returns an MshModel, which can be
+	passed to the functions of this library in place of gmsh.model:
+
+		model = g2o.read_msh("example2.msh")
+		elementTags, nodeTags, elementName, elementNnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", model)
+		g2o.add_nodes_to_ops(nodeTags, model)
+
+	Only the mesh is read (physical names, entities, nodes and elements). The visualization
+	functions still need gmsh, use the writers in g2o_writers instead.
+	"""
+	return MshModel(filename)
+
+
+
+
+def copy_gmsh_model(gmshmodel):
+	"""
+	Copy the mesh of gmshmodel (gmsh.model, or an MshModel) into a new MshModel: physical
+	groups, and nodes and elements of every entity. Useful to send a mesh made in a gmsh
+	session to other processes (see g2o_runner) or to keep it after gmsh.finalize().
+	"""
+	model = MshModel(name=gmshmodel.getCurrent(), build_index=False)
+
+	for dim, tag in gmshmodel.getPhysicalGroups():
+		model.physical_names[(dim, tag)] = gmshmodel.getPhysicalName(dim, tag)
+		model.physical_entities[(dim, tag)] = [int(e) for e in gmshmodel.getEntitiesForPhysicalGroup(dim, tag)]
+
+	for dim, entity in gmshmodel.getEntities():
+		nodeTags, coords, parametricCoords = gmshmodel.mesh.getNodes(dim, entity, False, False)
+		if len(nodeTags) > 0:
+			model.node_blocks[(dim, entity)] = (array(nodeTags, dtype=int64), array(coords, dtype=double).reshape((-1,3)))
+		elementTypes, elementTags, nodeTags = gmshmodel.mesh.getElements(dim, entity)
+		for elementType, blockElementTags, blockNodeTags in zip(elementTypes, elementTags, nodeTags):
+			model.element_blocks.setdefault((dim, entity), []).append(
+				(int(elementType), array(blockElementTags, dtype=int64), array(blockNodeTags, dtype=int64)))
+
+	model.mesh._build_node_index()
+
+	return model
+
+
+
+
+class MshModel:
+	"""
+	Mesh read from an MSH 4.1 file, with the subset of the gmsh.model API used by this
+	library (getPhysicalGroups, getPhysicalName, getEntitiesForPhysicalGroup, getCurrent,
+	and mesh.getNodes, mesh.getElements, mesh.getNode, mesh.getMaxNodeTag,
+	mesh.getMaxElementTag). See read_msh.
+
+	Binary $Nodes and $Elements sections are read straight from a memory map of the file.
+	"""
+
+	def __init__(self, filename=None, name=None, build_index=True):
+		self.name = name
+		self.physical_names = {}       # (dim, physical tag) -> name
+		self.physical_entities = {}    # (dim, physical tag) -> list of entity tags
+		self.node_blocks = {}          # (dim, entity) -> (nodeTags, coords (N,3))
+		self.element_blocks = {}       # (dim, entity) -> list of (elementType, elementTags, nodeTags flat)
+		self.mesh = _MshMesh(self)
+
+		if filename is not None:
+			if name is None:
+				self.name = os.path.splitext(os.path.basename(filename))[0]
+			_read_msh_file(self, filename)
+
+		if build_index:
+			self.mesh._build_node_index()
+
+	#gmsh.model-like API
+
+	def getCurrent(self):
+		return self.name
+
+	def getPhysicalGroups(self, dim=-1):
+		return [(d, t) for d, t in sorted(self.physical_entities) if dim == -1 or d == dim]
+
+	def getPhysicalName(self, dim, tag):
+		return self.physical_names.get((dim, tag), "")
+
+	def getEntitiesForPhysicalGroup(self, dim, tag):
+		return array(self.physical_entities[(dim, tag)], dtype=int32)
+
+	def getEntities(self, dim=-1):
+		entities = set(self.node_blocks) | set(self.element_blocks)
+		return [(d, t) for d, t in sorted(entities) if dim == -1 or d == dim]
+
+
+
+
+class _MshMesh:
+	#The gmsh.model.mesh part of MshModel
+
+	def __init__(self, model):
+		self.model = model
+
+	def _entities(self, blocks, dim, tag):
+		return [key for key in blocks if (dim == -1 or key[0] == dim) and (tag == -1 or key[1] == tag)]
+
+	def _build_node_index(self, all_node_tags=None, all_coords=None):
+		#All nodes, in block order. Can be given directly (see g2o_cache) to avoid copies
+		blocks = list(self.model.node_blocks.values())
+		if all_node_tags is not None:
+			self.all_node_tags, self.all_coords = all_node_tags, all_coords
+		elif len(blocks) > 0:
+			self.all_node_tags = concatenate([tags for tags, coords in blocks])
+			self.all_coords = concatenate([coords for tags, coords in blocks])
+		else:
+			self.all_node_tags = zeros(0, dtype=int64)
+			self.all_coords = zeros((0,3), dtype=double)
+		self.node_order = None
+
+	def getNodes(self, dim=-1, tag=-1, includeBoundary=False, returnParametricCoord=True):
+		if dim == -1 and tag == -1:
+			tags, coords = self.all_node_tags, self.all_coords
+		else:
+			keys = self._entities(self.model.node_blocks, dim, tag)
+			tags = concatenate([self.model.node_blocks[key][0] for key in keys] + [zeros(0, dtype=int64)])
+			coords = concatenate([self.model.node_blocks[key][1] for key in keys] + [zeros((0,3))])
+		return tags, coords.reshape(-1), zeros(0, dtype=double)
+
+	def getNode(self, nodeTag):
+		if self.node_order is None:
+			self.node_order = argsort(self.all_node_tags, kind="stable")
+			self.sorted_node_tags = self.all_node_tags[self.node_order]
+		sorted_tags = self.sorted_node_tags
+		i = searchsorted(sorted_tags, nodeTag)
+		if i == len(sorted_tags) or sorted_tags[i] != nodeTag:
+			raise KeyError(f"MshModel: node {nodeTag} not found")
+		return self.all_coords[self.node_order[i]], zeros(0, dtype=double), -1, -1
+
+	get_node = getNode
+
+	def getElements(self, dim=-1, tag=-1):
+		elementTypes = []
+		elementTags = {}
+		nodeTags = {}
+		for key in self._entities(self.model.element_blocks, dim, tag):
+			for elementType, blockElementTags, blockNodeTags in self.model.element_blocks[key]:
+				if elementType not in elementTags:
+					elementTypes.append(elementType)
+				elementTags.setdefault(elementType, []).append(blockElementTags)
+				nodeTags.setdefault(elementType, []).append(blockNodeTags)
+		return (elementTypes,
+			[concatenate(elementTags[t]) for t in elementTypes],
+			[concatenate(nodeTags[t]) for t in elementTypes])
+
+	def getMaxNodeTag(self):
+		return int(self.all_node_tags.max()) if len(self.all_node_tags) > 0 else 0
+
+	def getMaxElementTag(self):
+		maxtag = 0
+		for blocks in self.model.element_blocks.values():
+			for elementType, elementTags, nodeTags in blocks:
+				if len(elementTags) > 0:
+					maxtag = max(maxtag, int(elementTags.max()))
+		return maxtag
+
+
+
+
+def _read_msh_file(model, filename):
+	binary = False
+
+	with open(filename, "rb") as f:
+		while True:
+			line = f.readline()
+			if len(line) == 0:
+				break
+			#Only section headers are decoded, data can be binary
+			section = line.strip()
+			if not section.startswith(b"$") or section.startswith(b"$End"):
+				continue
+			section = section.decode()
+
+			if section == "$MeshFormat":
+				version, file_type, data_size = f.readline().split()
+				if version != b"4.1":
+					raise ValueError(f"read_msh: {filename} is MSH version {version.decode()}, only 4.1 is supported")
+				binary = file_type == b"1"
+				if binary:
+					if int(data_size) != 8:
+						raise ValueError(f"read_msh: {filename} has data size {data_size.decode()}, only 8 is supported")
+					if frombuffer(f.read(4), dtype=int32)[0] != 1:
+						raise ValueError(f"read_msh: {filename} has a different endianness than this machine")
+			elif section == "$PhysicalNames":
+				for i in range(int(f.readline())):
+					dim, tag, name = f.readline().decode().split(maxsplit=2)
+					model.physical_names[(int(dim), int(tag))] = name.strip().strip('"')
+			elif section == "$Entities":
+				if binary:
+					_read_entities_binary(model, f)
+				else:
+					_read_entities_ascii(model, f)
+			elif section == "$Nodes":
+				if binary:
+					_read_nodes_binary(model, f, filename)
+				else:
+					_read_nodes_ascii(model, _read_section_values(f, "$EndNodes"))
+			elif section == "$Elements":
+				if binary:
+					_read_elements_binary(model, f, filename)
+				else:
+					_read_elements_ascii(model, _read_section_values(f, "$EndElements"))
+			elif section in ("$PartitionedEntities", "$GhostElements"):
+				raise ValueError(f"read_msh: partitioned meshes are not supported ({filename})")
+			else:
+				_skip_section(f, section, filename)
+
+	#Physical groups with no name are still groups
+	for key in model.physical_entities:
+		model.physical_names.setdefault(key, "")
+
+
+
+
+def _skip_section(f, section, filename):
+	#Move f past the $End line of a section this reader does not use ($NodeData, $Periodic...).
+	#The end marker is looked for in the raw bytes, a chunk at a time, as the data can be binary
+	marker = b"\n$End" + section[1:].encode()
+	start = f.tell() - 1
+	data = b"\n"
+	while True:
+		i = data.find(marker)
+		if i >= 0:
+			f.seek(start + i + len(marker))
+			f.readline()
+			return
+		chunk = f.read(1 << 20)
+		if len(chunk) == 0:
+			raise ValueError(f"read_msh: {section} section with no {marker[1:].decode()} in {filename}")
+		if len(data) > len(marker):
+			start += len(data) - len(marker)
+			data = data[-len(marker):]
+		data += chunk
+
+
+
+
+def _read_section_values(f, end):
+	#All the numbers in an ASCII section, as a bytes array. The readers convert tag columns
+	#with astype(int64) and coordinates with astype(double), so large tags stay exact
+	lines = []
+	for line in f:
+		if line.startswith(end.encode()):
+			break
+		lines.append(line)
+	return array(b" ".join(lines).split())
+
+
+
+
+def _add_physical_tags(model, dim, entity, physical_tags):
+	for physical_tag in physical_tags:
+		model.physical_entities.setdefault((dim, int(physical_tag)), []).append(entity)
+
+
+
+
+def _read_entities_ascii(model, f):
+	numPoints, numCurves, numSurfaces, numVolumes = [int(n) for n in f.readline().split()]
+	for dim, n in enumerate((numPoints, numCurves, numSurfaces, numVolumes)):
+		for i in range(n):
+			values = f.readline().split()
+			entity = int(values[0])
+			#Points: tag x y z, others: tag and bounding box
+			first = 4 if dim == 0 else 7
+			numPhysicalTags = int(values[first])
+			_add_physical_tags(model, dim, entity, values[first+1:first+1+numPhysicalTags])
+
+
+
+
+def _read_entities_binary(model, f):
+	numbers = frombuffer(f.read(4*8), dtype=uint64)
+	for dim, n in enumerate(numbers):
+		for i in range(int(n)):
+			entity = int(frombuffer(f.read(4), dtype=int32)[0])
+			f.read(3*8 if dim == 0 else 6*8)
+			numPhysicalTags = int(frombuffer(f.read(8), dtype=uint64)[0])
+			_add_physical_tags(model, dim, entity, frombuffer(f.read(4*numPhysicalTags), dtype=int32))
+			if dim > 0:
+				numBounding = int(frombuffer(f.read(8), dtype=uint64)[0])
+				f.read(4*numBounding)
+
+
+
+
+def _read_nodes_ascii(model, values):
+	numEntityBlocks = int(values[0])
+	pos = 4
+	for block in range(numEntityBlocks):
+		dim, entity, parametric, n = [int(v) for v in values[pos:pos+4]]
+		pos += 4
+		tags = values[pos:pos+n].astype(int64)
+		pos += n
+		ncoords = 3 + (dim if parametric else 0)
+		coords = values[pos:pos+n*ncoords].reshape((n, ncoords))[:,:3].astype(double)
+		pos += n*ncoords
+		model.node_blocks[(dim, entity)] = (tags, coords)
+
+
+
+
+def _read_elements_ascii(model, values):
+	numEntityBlocks = int(values[0])
+	pos = 4
+	for block in range(numEntityBlocks):
+		dim, entity, elementType, n = [int(v) for v in values[pos:pos+4]]
+		pos += 4
+		element_name, element_nnodes = get_element_info_from_elementType(elementType)
+		rows = values[pos:pos+n*(1+element_nnodes)].astype(int64).reshape((n, 1+element_nnodes))
+		pos += n*(1+element_nnodes)
+		model.element_blocks.setdefault((dim, entity), []).append((elementType, rows[:,0].copy(), rows[:,1:].reshape(-1)))
+
+
+
+
+def _read_nodes_binary(model, f, filename):
+	mm = memmap(filename, dtype="u1", mode="r")
+	pos = f.tell()
+	numEntityBlocks = int(mm[pos:pos+8].view(uint64)[0])
+	pos += 4*8
+	for block in range(numEntityBlocks):
+		dim, entity, parametric = [int(v) for v in mm[pos:pos+12].view(int32)]
+		n = int(mm[pos+12:pos+20].view(uint64)[0])
+		pos += 20
+		tags = mm[pos:pos+8*n].view(uint64).astype(int64)
+		pos += 8*n
+		ncoords = 3 + (dim if parametric else 0)
+		coords = mm[pos:pos+8*n*ncoords].view(double).reshape((n, ncoords))[:,:3].copy()
+		pos += 8*n*ncoords
+		model.node_blocks[(dim, entity)] = (tags, coords)
+	f.seek(pos)
+	del mm
+
+
+
+
+def _read_elements_binary(model, f, filename):
+	mm = memmap(filename, dtype="u1", mode="r")
+	pos = f.tell()
+	numEntityBlocks = int(mm[pos:pos+8].view(uint64)[0])
+	pos += 4*8
+	for block in range(numEntityBlocks):
+		dim, entity, elementType = [int(v) for v in mm[pos:pos+12].view(int32)]
+		n = int(mm[pos+12:pos+20].view(uint64)[0])
+		pos += 20
+		element_name, element_nnodes = get_element_info_from_elementType(elementType)
+		rows = mm[pos:pos+8*n*(1+element_nnodes)].view(uint64).astype(int64).reshape((n, 1+element_nnodes))
+		pos += 8*n*(1+element_nnodes)
+		model.element_blocks.setdefault((dim, entity), []).append((elementType, rows[:,0].copy(), rows[:,1:].reshape(-1)))
+	f.seek(pos)
+	del mm
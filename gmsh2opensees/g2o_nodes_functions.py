@@ -4,18 +4,102 @@
 #
 # 2022 - Jose A. Abell M. - www.joseabell.com
 
-import os
+from gmsh2opensees.g2o_backend import ops, add_ops_hook
 
-if os.name == 'nt':
-	import openseespy.opensees as ops
-else:   #not checked in mac
-	import opensees as ops
 
 
+import zlib
+import weakref
+from re import findall
 
-from numpy import array, int32, double, concatenate, unique, setdiff1d, zeros
+from numpy import array, asarray, int32, double, concatenate, unique, zeros, argsort, searchsorted, diff, broadcast_to, maximum, \
+	unravel_index, ascontiguousarray, int64
 from numpy.linalg import norm
 
+from gmsh2opensees.g2o_utils import TagRegistry, gmsh_to_ops_node_tags, reserve_tags, tag_allocator, local_node_mask
+
+
+
+#Nodes already defined (and fixed) in opensees. Seeded from opensees on first use, kept up
+#to date by the functions in this library, and re-read when opensees has a different
+#number of nodes (see _sync_node_registry)
+_defined_nodes = TagRegistry()
+_fixed_nodes = TagRegistry()
+_registry_synced = False
+
+#Fixed DOF flags of the fixed nodes (opensees tag -> tuple of 0/1), filled by _apply_fixities
+#and, for nodes fixed outside this library, read from opensees when needed
+_fixed_dofs = {}
+
+#Fixities waiting for apply_fixities, see fix_nodes
+_pending_fixities = []
+
+
+def reset_node_registry():
+	"""
+	Forget which nodes were defined/fixed, which tags were allocated and the cached modal 
+	data. The registry will be re-read from opensees the next time it is needed. 
+
+	This happens by itself on ops.wipe() through the ops object of this library, and when
+	opensees has fewer nodes than the registry (a wipe made on the opensees module directly).
+	Nodes defined directly with ops.node are picked up by themselves, as long as that changes
+	the number of nodes in opensees. Call it after replacing nodes or fixities directly
+	through opensees (wiped and rebuilt with the same number of nodes).
+	"""
+	global _registry_synced
+	_defined_nodes.reset()
+	_fixed_nodes.reset()
+	_fixed_dofs.clear()
+	_pending_fixities.clear()
+	_modal_cache.clear()
+	tag_allocator.reset()
+	_registry_synced = False
+
+
+def get_defined_nodes_registry():
+	"""
+	Return the registry (a TagRegistry) of nodes already defined in opensees
+	"""
+	_sync_node_registry()
+	return _defined_nodes
+
+
+def get_defined_gmsh_nodes(gmshmodel):
+	"""
+	Nodes of gmshmodel (gmsh tags, sorted) that are defined in opensees
+	"""
+	nodeTags = unique_node_tags(get_all_nodes(gmshmodel)[0])
+	return nodeTags[get_defined_nodes_registry().contains(gmsh_to_ops_node_tags(nodeTags))]
+
+
+def get_fixed_nodes_registry():
+	"""
+	Return the registry (a TagRegistry) of nodes already fixed in opensees
+	"""
+	_sync_node_registry()
+	return _fixed_nodes
+
+
+def _sync_node_registry():
+	#One ops.getNodeTags per call: if opensees has fewer nodes than the registry, the model
+	#was wiped behind our back; if more, nodes were defined directly with ops.node
+	global _registry_synced
+	nodeTags = ops.getNodeTags()
+	if _registry_synced and len(nodeTags) == len(_defined_nodes):
+		return
+	if len(nodeTags) < len(_defined_nodes):
+		reset_node_registry()
+	_defined_nodes.add(nodeTags)
+	_fixed_nodes.add(ops.getFixedNodes())
+	reserve_tags("node", _defined_nodes.tags()[-1:])
+	reserve_tags("element", ops.getEleTags())
+	_registry_synced = True
+
+
+
+
+add_ops_hook("wipe", reset_node_registry)
+
 
 
 
@@ -26,7 +110,9 @@ def get_all_nodes(gmshmodel):
 	"""
 	dim = -1  
 	tag = -1
-	nodeTags, coords, parametricCoord = gmshmodel.mesh.getNodes(dim, tag)
+	includeBoundary = False
+	returnParametricCoord = False
+	nodeTags, coords, parametricCoord = gmshmodel.mesh.getNodes(dim, tag, includeBoundary, returnParametricCoord)
 
 	return array(nodeTags, dtype=int), array(coords, dtype=double).reshape((-1,3))
 
@@ -34,29 +120,79 @@ def get_all_nodes(gmshmodel):
 
 
 
+def get_node_coordinates(nodeTags, gmshmodel):
+	"""
+	Return the coordinates of the nodes in nodeTags as an (N,3) array, in the same
+	order as nodeTags. 
+
+	All coordinates are fetched from gmsh with a single getNodes call and looked up 
+	by tag with a sorted index, instead of calling get_node (one trip through the gmsh 
+	API) per node. 
+	"""
+	nodeTags = array(nodeTags, dtype=int).reshape(-1)
+	allNodeTags, allCoords = get_all_nodes(gmshmodel)
+
+	if len(nodeTags) == 0:
+		return zeros((0,3), dtype=double)
+
+	#Tag to row index. gmsh returns nodes sorted by entity, not by tag.
+	order = argsort(allNodeTags, kind="stable")
+	sortedNodeTags = allNodeTags[order]
+
+	rows = searchsorted(sortedNodeTags, nodeTags)
+	rows[rows == len(sortedNodeTags)] = 0
+	found = sortedNodeTags[rows] == nodeTags
+	if not found.all():
+		raise KeyError(f"get_node_coordinates: nodes not found in gmsh model: {nodeTags[~found][:10].tolist()}")
+
+	return allCoords[order[rows]]
+
+
+
+
+
 def add_nodes_to_ops(nodeTags, gmshmodel, remove_duplicates=True, scale_factor=1.0):
 	"""
 	Adds nodes in list nodeTags (coming from one of the other functions in this library)
 	to the opensees model. Possibly can avoid duplicates by setting the remove_duplicates flag. 
+
+	Already defined nodes are tracked by this library (see reset_node_registry), so 
+	the cost of removing duplicates does not grow with the size of the model.
+	If a local partition is active (see g2o_parallel), nodes of other processes are skipped.
 	"""
 
 	#Flatten the nodeTags array and remove duplicate nodes within the physical group
 	nodeTags = unique(array(nodeTags, dtype=int).reshape(-1))
 
+	#Only the nodes of this process when building a partitioned model
+	nodeTags = nodeTags[local_node_mask(nodeTags)]
+
+	#Tags used in opensees (differ from gmsh tags if nodes were renumbered)
+	opsNodeTags = gmsh_to_ops_node_tags(nodeTags)
+
 	#Remove global duplicates if need be
+	defined_nodes = get_defined_nodes_registry()
 	if remove_duplicates:
-		defined_nodes = ops.getNodeTags()
-		nodeTags = setdiff1d(nodeTags, defined_nodes)
+		notdefined = ~defined_nodes.contains(opsNodeTags)
+		nodeTags, opsNodeTags = nodeTags[notdefined], opsNodeTags[notdefined]
+
+	if len(nodeTags) == 0:
+		return
+
+	#Fetch all coordinates at once and scale them in one go
+	coords = scale_factor * get_node_coordinates(nodeTags, gmshmodel)
+
+	for nodeTag, coord in zip(opsNodeTags.tolist(), coords.tolist()):
+		ops.node(nodeTag, *coord)
 
-	for nodeTag in nodeTags:
-		coord, parametricCoord, dim, tag = gmshmodel.mesh.get_node(nodeTag)
-		ops.node(int(nodeTag), *(scale_factor*coord))
+	defined_nodes.add(opsNodeTags)
+	reserve_tags("node", opsNodeTags)
 
 
 
 
 
-def fix_nodes(nodeTags, dofstring, verbose=False):
+def fix_nodes(nodeTags, dofstring, verbose=False, ndf=3, predicate=None, gmshmodel=None, defer=False):
 	"""
 	Don't worry, the nodes are not broken. The nodes are fine. 
 	This fixes the nodes in the sense of adding mechanical fixities.
@@ -64,69 +200,347 @@ def fix_nodes(nodeTags, dofstring, verbose=False):
 	give a list of nodeTags (coming from one of the other functions herein)
 	and a dofstring (such as "XYZ" if you want to fix all dofs or just "x" if you want
 	to fix the singe x-direction DOF). The dofstring is case insensitive and
-	letters other than xyz and repetitions will be ignored.
+	letters other than xyz and repetitions will be ignored. For 6-DOF nodes (ndf=6) 
+	rotations are "rx", "ry" and "rz", so "xyz rx ry rz" fixes everything. A list of
+	ndf 0/1 flags works too. 
 
-	Only supports 3-DOF nodes
+	predicate selects nodes by location: it is called with the (N,3) array of node 
+	coordinates and must return a boolean array, for example
+
+		fix_nodes(nodeTags, "XYZ", predicate=lambda xyz: xyz[:,2] < 1e-6, gmshmodel=gmsh.model)
+
+	Coordinates come from gmshmodel. If nodeTags is None or empty, all the nodes of 
+	gmshmodel are considered. 
+
+	Fixities of nodes that were already fixed are merged: opensees does not allow fixing
+	a DOF twice, so only the DOFs not fixed yet are passed to ops.fix (fixing "x" on one 
+	face and then "y" on another fixes both on the shared edge). Calling this with 
+	defer=True for each group and then apply_fixities() does the same with one ops.fix 
+	per node.
 	"""
 
+	fixity = parse_dofstring(dofstring, ndf)
+
+	if predicate is not None and gmshmodel is None:
+		raise ValueError("fix_nodes: predicate requires gmshmodel")
+
+	if nodeTags is None or len(nodeTags) == 0:
+		if predicate is None:
+			return
+		nodeTags, _ = get_all_nodes(gmshmodel)
+
 	#Flatten the nodeTags array and remove duplicate nodes
-	nodeTags = unique(array(nodeTags).reshape(-1))
-	
-	#Identify DOFs to be fixed
-	fixX = 1 if dofstring.lower().find("x") >= 0 else 0
-	fixY = 1 if dofstring.lower().find("y") >= 0 else 0
-	fixZ = 1 if dofstring.lower().find("z") >= 0 else 0
-	for i, tag in enumerate(nodeTags):
+	nodeTags = unique_node_tags(nodeTags)
+
+	if predicate is not None:
+		coords = get_node_coordinates(nodeTags, gmshmodel)
+		nodeTags = nodeTags[asarray(predicate(coords), dtype=bool)]
+
+	if defer:
+		_pending_fixities.append((nodeTags, broadcast_to(fixity, (len(nodeTags), ndf))))
+		return
+
+	_apply_fixities(nodeTags, broadcast_to(fixity, (len(nodeTags), ndf)), verbose)
+
+
+def apply_fixities(verbose=False):
+	"""
+	Apply fixities collected with fix_nodes(..., defer=True). Fixities given to the 
+	same node by several calls are merged (OR-ed) before calling ops.fix. Fixities queued
+	with different ndf (say, 3-DOF solid and 6-DOF beam nodes) are applied per ndf.
+	"""
+	pending = {}
+	for tags, fixities in _pending_fixities:
+		pending.setdefault(fixities.shape[1], []).append((tags, fixities))
+	_pending_fixities.clear()
+
+	for ndf, group in pending.items():
+		nodeTags = concatenate([tags for tags, fixities in group])
+		fixities = concatenate([fixities for tags, fixities in group])
+
+		#Merge fixities of repeated nodes
+		order = argsort(nodeTags, kind="stable")
+		nodeTags, fixities = nodeTags[order], fixities[order]
+		nodeTags, first = unique(nodeTags, return_index=True)
+		fixities = maximum.reduceat(fixities, first, axis=0) if len(first) > 0 else fixities
+
+		_apply_fixities(nodeTags, fixities, verbose)
+
+
+def parse_dofstring(dofstring, ndf=3):
+	"""
+	Turn a dofstring (see fix_nodes) into an array of ndf 0/1 fixity flags
+	"""
+	if not isinstance(dofstring, str):
+		fixity = array(dofstring, dtype=int).reshape(-1)
+		if len(fixity) != ndf:
+			raise ValueError(f"parse_dofstring: got {len(fixity)} fixity flags for {ndf=}")
+		return fixity
+
+	dof_index = {"x": 0, "y": 1, "z": 2, "rx": 3, "ry": 4, "rz": 5}
+	fixity = zeros(ndf, dtype=int)
+	for dof in findall("r?[xyz]", dofstring.lower()):
+		if dof_index[dof] >= ndf:
+			raise ValueError(f"parse_dofstring: cannot fix {dof!r} on nodes with {ndf=}")
+		fixity[dof_index[dof]] = 1
+
+	return fixity
+
+
+def _apply_fixities(nodeTags, fixities, verbose):
+	#Nodes of other processes (partitioned model) are not there to fix
+	local = local_node_mask(nodeTags)
+	nodeTags, fixities = nodeTags[local], fixities[local]
+
+	nodeTags = gmsh_to_ops_node_tags(nodeTags)
+	fixities = asarray(fixities, dtype=int)
+
+	#Nodes that are already fixed only get the DOFs that are not fixed yet
+	fixed_nodes = get_fixed_nodes_registry()
+	already = fixed_nodes.contains(nodeTags)
+	if already.any():
+		ndf = fixities.shape[1]
+		previous = array([_get_fixed_dofs(tag, ndf) for tag in nodeTags[already].tolist()], dtype=int).reshape((-1, ndf))
+		fixities = fixities.copy()
+		fixities[already] = fixities[already] * (1 - previous)
+		if verbose:
+			print(f"{already.sum()} nodes are already fixed, {fixities[already].any(axis=1).sum()} of them get new DOFs fixed")
+
+	fix = ops.fix
+	for tag, fixity, was_fixed in zip(nodeTags.tolist(), fixities.tolist(), already.tolist()):
+		if was_fixed and not any(fixity):
+			continue
 		if verbose:
-			print(f"fixing {tag} {fixX}, {fixY}, {fixZ}")
-		ops.fix(int(tag), fixX, fixY, fixZ)
+			print(f"fixing {tag} {fixity}")
+		fix(tag, *fixity)
+		if was_fixed:
+			fixity = [max(a, b) for a, b in zip(fixity, _fixed_dofs[tag])]
+		_fixed_dofs[tag] = tuple(fixity)
+
+	fixed_nodes.add(nodeTags)
 
 
+def _get_fixed_dofs(tag, ndf):
+	#Fixed DOF flags of an already fixed node (opensees tag)
+	if tag not in _fixed_dofs:
+		try:
+			dofs = ops.getFixedDOFs(tag)
+		except Exception:
+			raise RuntimeError(f"fix_nodes: node {tag} was fixed outside gmsh2opensees and its fixed DOFs can't be read "
+				"from opensees (ops.getFixedDOFs), so new fixities can't be merged. Fix it with fix_nodes only, "
+				"or call reset_node_registry()")
+		flags = [0]*ndf
+		for dof in dofs:
+			flags[int(dof) - 1] = 1
+		_fixed_dofs[tag] = tuple(flags)
+	flags = _fixed_dofs[tag]
+	return tuple(flags[:ndf]) + (0,)*(ndf - len(flags))
 
 
-def get_displacements_at_nodes(nodeTags, component=-1):
+
+
+def get_displacements_at_nodes(nodeTags, component=-1, ndf=3, out=None):
 	"""
 	Helper function to return an array of noda displacements corresponding to 
 	a list of node tags
+
+	Returns an (Nnodes, ndf) array with all the DOFs, or an (Nnodes,) array 
+	if a single component is requested. Node tags are sorted and made unique.
+	Pass a preallocated array as out to have it filled instead of allocating a 
+	new one (useful when calling this every time-step).
+
+	nodeTags are gmsh tags, if nodes were renumbered (see set_node_numbering) the 
+	corresponding opensees nodes are queried.
 	"""
-	nodeTags = unique(array(nodeTags).reshape(-1))
+	nodeTags = unique_node_tags(nodeTags)
 
-	Nnodes = len(nodeTags)
+	if component == -1:  #Get ndf components with one nodeDisp call per node
+		return _fill_nodal_values(ops.nodeDisp, nodeTags, (), ndf, out)
+	else: 
+		disps = _output_buffer(out, (len(nodeTags),))
+		nodeDisp = ops.nodeDisp
+		disps[:] = [nodeDisp(tag, component) for tag in gmsh_to_ops_node_tags(nodeTags).tolist()]
+		return disps
 
-	if component == -1:  #Assume 3 components, get them all
 
-		disps = zeros((Nnodes,3),dtype=float)
-		for i, tag in enumerate(nodeTags):
-			tag = int(tag)
-			disps[i,:] = [ops.nodeDisp(tag,1),
-				ops.nodeDisp(tag,2),
-				ops.nodeDisp(tag,3)]
+def get_eigenvector_at_nodes(nodeTags, mode=1, ndf=3, out=None):
+	"""
+	Helper function to return an array of noda displacements corresponding to 
+	a list of node tags
 
-	else: 
-		disps = zeros((Nnodes),dtype=float)
-		for i, tag in enumerate(nodeTags):
-			tag = int(tag)
-			disps[i] = ops.nodeDisp(tag,component)
+	Same as get_displacements_at_nodes, but for eigenvector number mode. 
+	"""
+	nodeTags = unique_node_tags(nodeTags)
+
+	return _fill_nodal_values(ops.nodeEigenvector, nodeTags, (mode,), ndf, out)
+
+
+def get_modal_matrix(nodeTags, modes=(1,), ndf=3, out=None):
+	"""
+	Eigenvectors number modes (after ops.eigen) at nodeTags, all at once. Returns an
+	(Nmodes, Nnodes, ndf) array, out[i] is the eigenvector of modes[i]. Node tags are sorted
+	and made unique. See get_modal_data for a cached version over all nodes.
+	"""
+	nodeTags = unique_node_tags(nodeTags)
+	values = _output_buffer(out, (len(modes), len(nodeTags), ndf))
+
+	for i, mode in enumerate(modes):
+		_fill_nodal_values(ops.nodeEigenvector, nodeTags, (mode,), ndf, values[i])
 
+	return values
 
-	return disps
 
+#Modal matrix of all the nodes, one per model. See get_modal_data
+_modal_cache = weakref.WeakKeyDictionary()
 
-def get_eigenvector_at_nodes(nodeTags, mode=1):
+
+def get_modal_data(gmshmodel, modes=(1,), ndf=3, nodeTags=None):
 	"""
-	Helper function to return an array of noda displacements corresponding to 
-	a list of node tags
+	Cached modal data of the nodes nodeTags (gmsh tags, default all the nodes of gmshmodel).
+	Returns a dict with:
+
+		"nodeTags" : the node tags, sorted and unique
+		"coords"   : their coordinates, (Nnodes, 3)
+		"size"     : diagonal of the bounding box of the nodes
+		"modes"    : the modes in "matrix" (a list)
+		"matrix"   : (Nmodes, Nnodes, ndf) eigenvectors, see get_modal_matrix
+
+	Only the modes not seen before are read from opensees, so asking for the modes one after
+	the other costs the same as asking for all of them once. The cache belongs to the model
+	object and is rebuilt when its mesh changes (see g2o_cache.model_cached). The eigenvectors
+	are read again after every ops.eigen made through the ops object of this library, and if
+	the eigenvectors in opensees changed otherwise, which is checked with a single opensees call
+	at the node that moves the most. "matrix" has the modes in the requested order; it is the
+	cached array itself (don't modify it) when the modes match the cached ones.
 	"""
-	nodeTags = unique(array(nodeTags).reshape(-1))
+	from gmsh2opensees.g2o_cache import model_cached
+	from gmsh2opensees.g2o_spatial import model_scale
+
+	if nodeTags is not None:
+		nodeTags = unique_node_tags(nodeTags)
+
+	def build():
+		if nodeTags is None:
+			tags, coords = get_all_nodes(gmshmodel)
+			order = argsort(tags, kind="stable")
+			tags, coords = tags[order], coords[order]
+		else:
+			tags, coords = nodeTags, get_node_coordinates(nodeTags, gmshmodel)
+		return {
+			"nodeTags" : tags,
+			"coords" : coords,
+			"size" : model_scale(coords),
+			"modes" : [],
+			"matrix" : zeros((0, len(tags), ndf), dtype=double),
+		}
+
+	#Same node set as the cached one? By count and checksum, so it costs O(Nnodes) and no gmsh calls
+	nodes_version = None if nodeTags is None else (len(nodeTags), zlib.crc32(ascontiguousarray(nodeTags, dtype=int64)))
+
+	modes = [int(mode) for mode in modes]
+	cache = model_cached(_modal_cache, gmshmodel, "modal", build, version=(ndf, nodes_version))
+
+	if len(cache["modes"]) > 0 and cache["matrix"][0].size > 0:
+		#Same eigenvectors as when they were cached? Checked where the first mode is largest,
+		#not at a node that may be fixed
+		node, dof = unravel_index(abs(cache["matrix"][0]).argmax(), cache["matrix"][0].shape)
+		tag = int(gmsh_to_ops_node_tags(cache["nodeTags"][node:node+1])[0])
+		if (array(ops.nodeEigenvector(tag, cache["modes"][0])[:ndf]) != cache["matrix"][0,node]).any():
+			cache["modes"] = []
+			cache["matrix"] = cache["matrix"][:0]
+
+	missing = [int(mode) for mode in unique(modes) if mode not in cache["modes"]]
+	if len(missing) > 0:
+		cache["matrix"] = concatenate((cache["matrix"], get_modal_matrix(cache["nodeTags"], missing, ndf)))
+		cache["modes"] = cache["modes"] + missing
+
+	if modes == cache["modes"]:
+		matrix = cache["matrix"]
+	else:
+		matrix = cache["matrix"][[cache["modes"].index(mode) for mode in modes]]
+
+	return {
+		"nodeTags" : cache["nodeTags"],
+		"coords" : cache["coords"],
+		"size" : cache["size"],
+		"modes" : modes,
+		"matrix" : matrix,
+	}
+
+
+def invalidate_modal_cache():
+	"""
+	Forget the cached modal data (see get_modal_data). Done by itself on every ops.eigen
+	through the ops object of this library.
+	"""
+	_modal_cache.clear()
+
 
-	Nnodes = len(nodeTags)
+add_ops_hook("eigen", invalidate_modal_cache)
 
-	disps = zeros((Nnodes,3),dtype=float)
 
-	for i, tag in enumerate(nodeTags):
-		tag = int(tag)
-		disps[i,:] = [ops.nodeEigenvector(tag,mode,1),
-			ops.nodeEigenvector(tag,mode,2),
-			ops.nodeEigenvector(tag,mode,3)]
+#opensees function that returns all the DOFs of a node, for each nodal field
+nodal_response_functions = {
+	"disp"        : "nodeDisp",
+	"vel"         : "nodeVel",
+	"accel"       : "nodeAccel",
+	"reaction"    : "nodeReaction",
+	"eigenvector" : "nodeEigenvector",
+}
 
-	return disps
\ No newline at end of file
+
+def get_nodal_responses(nodeTags, fields=("disp", "vel", "accel"), ndf=3, mode=1, out=None):
+	"""
+	Get several nodal fields at once (any of "disp", "vel", "accel", "reaction" and 
+	"eigenvector", the latter for eigenvector number mode) with a single pass over the nodes. 
+	Returns an array of shape (Nnodes, Nfields, ndf), so that out[:,i,:] is fields[i]. 
+	Node tags are sorted and made unique. Pass a preallocated array as out to have it filled
+	instead of allocating a new one. 
+
+	Reactions are computed (ops.reactions()) before reading them. 
+	"""
+	nodeTags = unique_node_tags(nodeTags)
+	values = _output_buffer(out, (len(nodeTags), len(fields), ndf))
+
+	functions = []
+	for field in fields:
+		if field not in nodal_response_functions:
+			raise ValueError(f"get_nodal_responses: unknown {field=}, use one of {list(nodal_response_functions)}")
+		args = (mode,) if field == "eigenvector" else ()
+		functions.append((getattr(ops, nodal_response_functions[field]), args))
+
+	if "reaction" in fields:
+		ops.reactions()
+
+	if len(nodeTags) > 0:
+		values[:,:,:] = [[function(tag, *args)[:ndf] for function, args in functions] for tag in gmsh_to_ops_node_tags(nodeTags).tolist()]
+
+	return values
+
+
+def unique_node_tags(nodeTags):
+	"""
+	Flatten, sort and remove repeated node tags. Cheap if nodeTags is already
+	a sorted array of unique tags (like the ones returned by this function)
+	"""
+	nodeTags = asarray(nodeTags).reshape(-1)
+	if len(nodeTags) > 0 and nodeTags.dtype.kind in "iu" and (diff(nodeTags) > 0).all():
+		return nodeTags
+	return unique(nodeTags.astype(int))
+
+
+def _output_buffer(out, shape):
+	if out is None:
+		return zeros(shape, dtype=double)
+	if out.shape != shape:
+		raise ValueError(f"Output array has shape {out.shape}, expected {shape}")
+	return out
+
+
+def _fill_nodal_values(ops_function, nodeTags, args, ndf, out):
+	#Calls ops_function(tag, *args) once per node, each call returns all the DOFs of the node. 
+	#Fill the (Nnodes, ndf) output array with one assignment
+	values = _output_buffer(out, (len(nodeTags), ndf))
+	if len(nodeTags) > 0:
+		values[:,:] = [ops_function(tag, *args)[:ndf] for tag in gmsh_to_ops_node_tags(nodeTags).tolist()]
+	return values
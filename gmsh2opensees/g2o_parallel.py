@@ -0,0 +1,291 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Parallel model building for OpenSeesMP: each process builds only its part of the mesh
+
+from numpy import asarray, int64, double, zeros, full, arange, argsort, argpartition, concatenate, unique, repeat, bincount, \
+	searchsorted, cumsum, intersect1d, flatnonzero
+
+from gmsh2opensees.g2o_backend import ops
+from gmsh2opensees.g2o_utils import get_physical_groups_map, invalidate_physical_groups_cache, set_local_partition, _sorted_lookup
+from gmsh2opensees.g2o_nodes_functions import get_node_coordinates
+from gmsh2opensees.g2o_elements_functions import get_element_blocks_in_physical_group
+
+
+
+
+def get_process_rank_and_count():
+	"""
+	Rank of this process and number of processes, from ops.getPID() and ops.getNP().
+	Returns 0, 1 when running sequential opensees.
+	"""
+	try:
+		rank, nprocs = ops.getPID(), ops.getNP()
+	except AttributeError:
+		return 0, 1
+	if rank is None or nprocs is None:   #Recording backend
+		return 0, 1
+	return int(rank), int(nprocs)
+
+
+
+
+def partition_mesh(gmshmodel, nparts=None, groupnames=None, method="rcb"):
+	"""
+	Split the elements of the physical groups groupnames (default: the groups of the highest
+	dimension) into nparts partitions (default: number of opensees processes). method is
+
+		"rcb"    recursive coordinate bisection of the element centroids, done here. Same
+		         number of elements per partition and fairly compact partitions.
+		"gmsh"   gmsh's own partitioner (METIS), through gmshmodel.mesh.partition. Needs a
+		         live gmsh model, and re-partitions it if it doesn't have nparts partitions.
+
+	List in groupnames every group whose elements go to opensees (solid, beams, ...), so they
+	are all partitioned together. Every process should call this with the same mesh, it gives
+	the same partition everywhere (read the mesh with read_msh_cached to make that cheap).
+	Returns a MeshPartition, call its activate method before building the model:
+
+		partition = g2o.partition_mesh(gmsh.model)
+		partition.activate()
+		g2o.add_nodes_to_ops(nodeTags, gmsh.model)         # only nodes of this process
+		g2o.add_elements_to_ops("Solid", gmsh.model, ...)  # only elements of this process
+		g2o.fix_nodes(fixedNodeTags, "XYZ")                # only nodes of this process
+	"""
+	if nparts is None:
+		rank, nparts = get_process_rank_and_count()
+	if groupnames is None:
+		groups = get_physical_groups_map(gmshmodel)
+		maxdim = max(dim for dim, tag in groups.values())
+		groupnames = [name for name, (dim, tag) in groups.items() if dim == maxdim]
+
+	#Elements first, gmsh partitioning moves them to new entities (keeping their tags)
+	blocks = []
+	for groupname in groupnames:
+		blocks += list(get_element_blocks_in_physical_group(groupname, gmshmodel).values())
+
+	if method == "rcb":
+		centroids = []
+		nodeTags = unique(concatenate([connectivity.reshape(-1) for elementTags, connectivity in blocks]))
+		coords = get_node_coordinates(nodeTags, gmshmodel)
+		for elementTags, connectivity in blocks:
+			found, rows = _sorted_lookup(nodeTags, connectivity)
+			centroids.append(coords[rows].mean(axis=1))
+		element_parts = recursive_coordinate_bisection(concatenate(centroids), nparts)
+	elif method == "gmsh":
+		partitioned_tags, partitioned_parts = _gmsh_element_parts(gmshmodel, nparts)
+		order = argsort(partitioned_tags, kind="stable")
+		elementTags = concatenate([elementTags for elementTags, connectivity in blocks])
+		found, rows = _sorted_lookup(partitioned_tags[order], elementTags)
+		if not found.all():
+			raise ValueError(f"partition_mesh: gmsh did not partition elements {elementTags[~found][:10].tolist()}")
+		element_parts = partitioned_parts[order][rows]
+	else:
+		raise ValueError(f"partition_mesh: unknown {method=}, use 'rcb' or 'gmsh'")
+
+	return MeshPartition(blocks, element_parts, nparts, groupnames)
+
+
+
+
+def recursive_coordinate_bisection(points, nparts):
+	"""
+	Split points (an (N,3) array) into nparts groups of (almost) the same size, cutting
+	the bounding box of each group across its longest side until there are nparts groups.
+	Returns the group (0 to nparts - 1) of each point.
+	"""
+	points = asarray(points, dtype=double).reshape((-1,3))
+	parts = zeros(len(points), dtype=int64)
+
+	#(indices of points, first part, number of parts) still to split
+	pending = [(arange(len(points)), 0, nparts)]
+	while len(pending) > 0:
+		index, first_part, n = pending.pop()
+		if n == 1 or len(index) == 0:
+			parts[index] = first_part
+			continue
+		nleft = n // 2
+		split = len(index) * nleft // n
+		p = points[index]
+		axis = (p.max(axis=0) - p.min(axis=0)).argmax()
+		order = argpartition(p[:,axis], split) if split < len(index) else arange(len(index))
+		pending.append((index[order[:split]], first_part, nleft))
+		pending.append((index[order[split:]], first_part + nleft, n - nleft))
+
+	return parts
+
+
+
+
+def _gmsh_element_parts(gmshmodel, nparts):
+	#Element tags and (0-based) partition of all the elements of a partitioned gmsh model
+	if gmshmodel.mesh.getNumberOfPartitions() != nparts:
+		gmshmodel.mesh.partition(nparts)
+		invalidate_physical_groups_cache(gmshmodel)
+
+	tags = [zeros(0, dtype=int64)]
+	parts = [zeros(0, dtype=int64)]
+	for dim, entity in gmshmodel.getEntities():
+		partitions = gmshmodel.getPartitions(dim, entity)
+		if len(partitions) != 1:   #Not partitioned, or interface between partitions
+			continue
+		elementTypes, elementTags, nodeTags = gmshmodel.mesh.getElements(dim, entity)
+		for blockElementTags in elementTags:
+			tags.append(asarray(blockElementTags, dtype=int64))
+			parts.append(full(len(blockElementTags), partitions[0] - 1, dtype=int64))
+
+	return concatenate(tags), concatenate(parts)
+
+
+
+
+class MeshPartition:
+	"""
+	Elements of some physical groups split among nparts processes (see partition_mesh).
+	Nodes go to every process that has one of their elements; nodes in more than one
+	partition are interface nodes. OpenSeesMP ties together nodes with the same tag
+	in different processes (use a parallel numberer and solver, say ParallelRCM and
+	Mumps), so interface nodes only need to be defined, with the same tag, on each
+	process that shares them. activate takes care of that.
+
+	What is and isn't partition-safe once activate is called:
+
+		add_nodes_to_ops, add_elements_to_ops   build only this partition
+		fix_nodes                               fixes the nodes this process has, interface
+		                                        nodes in every process sharing them, as needed
+		couple_beams_to_solid                   builds each link once, in the lowest partition
+		                                        holding both of its nodes (see local_pair_mask)
+		ops.load on interface nodes             not safe, counted once per process: apply
+		                                        loads only where owns() is True
+		ops.equalDOF, ops.rigidLink, elements   not safe: filter the node pairs with
+		made directly                           local_pair_mask (or pair_partition) first
+
+	A constraint or link whose two nodes are in no common partition can't be built; put the
+	groups it connects in the same partition_mesh call so their elements are split together.
+
+	Attributes (all tags sorted, gmsh tags):
+		nparts, groupnames
+		element_tags, element_parts: partitioned elements and their partition
+		node_tags: nodes of those elements
+		node_owner: lowest partition that has each node
+		node_nparts: number of partitions sharing each node
+	"""
+
+	def __init__(self, blocks, element_parts, nparts, groupnames=None):
+		#blocks is a list of (elementTags, connectivity) and element_parts goes with them, in order
+		self.nparts = nparts
+		self.groupnames = groupnames
+
+		element_parts = asarray(element_parts, dtype=int64)
+		elementTags = concatenate([asarray(elementTags, dtype=int64) for elementTags, connectivity in blocks])
+		order = argsort(elementTags, kind="stable")
+		self.element_tags, self.element_parts = elementTags[order], element_parts[order]
+
+		#Unique (node, partition) pairs, sorted by node and partition
+		pair_nodes = []
+		pair_parts = []
+		start = 0
+		for elementTags, connectivity in blocks:
+			connectivity = asarray(connectivity, dtype=int64)
+			pair_nodes.append(connectivity.reshape(-1))
+			pair_parts.append(repeat(element_parts[start:start+len(connectivity)], connectivity.shape[1]))
+			start += len(connectivity)
+		pairs = unique(concatenate(pair_nodes) * nparts + concatenate(pair_parts))
+		self.pair_nodes, self.pair_parts = pairs // nparts, pairs % nparts
+
+		self.node_tags, first, self.node_nparts = unique(self.pair_nodes, return_index=True, return_counts=True)
+		self.node_owner = self.pair_parts[first]
+
+	def _rank(self, rank):
+		if rank is None:
+			rank, nprocs = get_process_rank_and_count()
+			if nprocs != self.nparts:
+				raise ValueError(f"MeshPartition: running {nprocs} processes for {self.nparts} partitions")
+		return rank
+
+	def elements(self, rank=None):
+		"""
+		Elements of partition rank (default, this process)
+		"""
+		return self.element_tags[self.element_parts == self._rank(rank)]
+
+	def nodes(self, rank=None):
+		"""
+		Nodes of partition rank (default, this process), interface nodes included
+		"""
+		return self.pair_nodes[self.pair_parts == self._rank(rank)]
+
+	def interface_nodes(self, rank=None):
+		"""
+		Nodes shared by more than one partition. Only those of partition rank, if given.
+		"""
+		nodeTags = self.node_tags[self.node_nparts > 1]
+		if rank is not None:
+			nodeTags = nodeTags[_sorted_lookup(self.nodes(rank), nodeTags)[0]]
+		return nodeTags
+
+	def owns(self, nodeTags, rank=None):
+		"""
+		Whether partition rank (default, this process) owns each of nodeTags: interface nodes
+		are owned by the lowest partition sharing them, and nodes outside the partitioned
+		elements by partition 0. Use it to apply nodal loads only once.
+		"""
+		nodeTags = asarray(nodeTags, dtype=int64)
+		found, rows = _sorted_lookup(self.node_tags, nodeTags)
+		owner = self.node_owner[rows] if len(self.node_tags) > 0 else zeros(nodeTags.shape, dtype=int64)
+		owner[~found] = 0
+		return owner == self._rank(rank)
+
+	def pair_partition(self, nodeTags_a, nodeTags_b):
+		"""
+		Partition that builds each pair of nodes (nodeTags_a[i], nodeTags_b[i]) tied by a
+		constraint or a two-node link: the lowest partition holding both nodes, -1 if there
+		is none. Nodes outside the partitioned elements are held by partition 0.
+		"""
+		nodeTags_a = asarray(nodeTags_a, dtype=int64).reshape(-1)
+		nodeTags_b = asarray(nodeTags_b, dtype=int64).reshape(-1)
+		common = intersect1d(self._node_part_keys(nodeTags_a), self._node_part_keys(nodeTags_b))
+		rows, parts = common // self.nparts, common % self.nparts
+
+		#common is sorted, so the first key of each row has its lowest partition
+		pair_parts = full(len(nodeTags_a), -1, dtype=int64)
+		pair_parts[rows[::-1]] = parts[::-1]
+		return pair_parts
+
+	def _node_part_keys(self, nodeTags):
+		#row*nparts + partition for every partition holding nodeTags[row]
+		first = searchsorted(self.pair_nodes, nodeTags, side="left")
+		counts = searchsorted(self.pair_nodes, nodeTags, side="right") - first
+		rows = repeat(arange(len(nodeTags)), counts)
+		index = repeat(first - (cumsum(counts) - counts), counts) + arange(counts.sum())
+		keys = rows*self.nparts + self.pair_parts[index]
+		return concatenate((keys, flatnonzero(counts == 0)*self.nparts))
+
+	def counts(self):
+		"""
+		Number of elements, nodes and interface nodes of each partition, to check the balance
+		"""
+		interface = self.node_nparts > 1
+		interface_pairs = _sorted_lookup(self.node_tags[interface], self.pair_nodes)[0]
+		return (bincount(self.element_parts, minlength=self.nparts),
+			bincount(self.pair_parts, minlength=self.nparts),
+			bincount(self.pair_parts[interface_pairs], minlength=self.nparts))
+
+	def activate(self, rank=None):
+		"""
+		From now on build only partition rank (default, this process) with add_nodes_to_ops,
+		add_elements_to_ops, fix_nodes and couple_beams_to_solid. Nodes and elements outside
+		the partition (not in groupnames) are built by rank 0 only. Returns self.
+		"""
+		rank = self._rank(rank)
+		set_local_partition(self.nodes(rank), self.elements(rank), self.node_tags, self.element_tags, keep_others=(rank == 0),
+			partition=self, rank=rank)
+		return self
+
+	def deactivate(self):
+		"""
+		Build everything again
+		"""
+		set_local_partition(None, None)
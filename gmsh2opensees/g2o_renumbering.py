@@ -0,0 +1,134 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Bandwidth-reducing renumbering of gmsh nodes (not elements) before they go to opensees
+
+from numpy import array, asarray, int64, ones, arange, repeat, tile, concatenate, unique, searchsorted
+
+from gmsh2opensees.g2o_utils import TagMap, set_node_numbering, get_physical_groups_map
+from gmsh2opensees.g2o_nodes_functions import get_all_nodes
+from gmsh2opensees.g2o_elements_functions import get_element_blocks_in_physical_group
+
+
+
+
+def renumber_nodes(gmshmodel, groupnames=None, start_tag=1, activate=True, verbose=False):
+	"""
+	Renumber the nodes of gmshmodel with a reverse Cuthill-McKee ordering of the node graph
+	given by the elements in groupnames (default all physical groups), so that the
+	stiffness matrix has a small bandwidth (less fill-in for UmfPack and other direct solvers).
+	All nodes of gmshmodel get a tag, start_tag, start_tag + 1, ...
+
+	Call this before add_nodes_to_ops. With activate=True the numbering is made active
+	(see set_node_numbering): add_nodes_to_ops, add_elements_to_ops, fix_nodes and the result
+	and visualization functions keep taking gmsh tags and translate them for opensees,
+	so results still go to the right gmsh nodes. Node tags you pass to opensees yourself
+	(say for ops.load) must be translated with gmsh_to_ops_node_tags.
+
+	Only nodes are renumbered: elements keep their gmsh tags. Fill-in depends on the order of
+	the equations, that is of the nodes, and not on the element tags. Opensees keeps elements
+	sorted by tag, so the order they are added in changes nothing either. Element tags
+	passed to opensees (ops.eleResponse, recorders...) are always the gmsh ones.
+
+	Returns the TagMap (gmsh -> opensees tags), and the bandwidth before and after (also
+	printed with verbose=True).
+	"""
+	if groupnames is None:
+		groupnames = list(get_physical_groups_map(gmshmodel).keys())
+
+	connectivities = []
+	for groupname in groupnames:
+		blocks = get_element_blocks_in_physical_group(groupname, gmshmodel)
+		connectivities += [connectivity for elementTags, connectivity in blocks.values()]
+
+	nodeTags, _ = get_all_nodes(gmshmodel)
+
+	tagmap = compute_node_renumbering(connectivities, nodeTags, start_tag=start_tag)
+
+	bandwidth_before = connectivity_bandwidth(connectivities)
+	bandwidth_after = connectivity_bandwidth(connectivities, tagmap)
+	if verbose:
+		print(f"renumber_nodes: bandwidth {bandwidth_before} -> {bandwidth_after} (in nodes)")
+
+	if activate:
+		set_node_numbering(tagmap)
+
+	return tagmap, bandwidth_before, bandwidth_after
+
+
+
+
+def compute_node_renumbering(connectivities, nodeTags=None, start_tag=1, method="rcm"):
+	"""
+	Compute a new numbering for the nodes in connectivities (a list of (Nelements, nnodes)
+	arrays of gmsh node tags). nodeTags are all the nodes to number (defaults to the ones
+	in connectivities). Returns a TagMap from gmsh tags to new tags start_tag, start_tag + 1...
+
+	Only method="rcm" (reverse Cuthill-McKee, from scipy) is available.
+	"""
+	if method != "rcm":
+		raise ValueError(f"compute_node_renumbering: unknown {method=}, only 'rcm' is available")
+
+	try:
+		from scipy.sparse.csgraph import reverse_cuthill_mckee
+	except ImportError:
+		raise ImportError("compute_node_renumbering needs scipy. Try: pip install scipy")
+
+	if nodeTags is None:
+		nodeTags = concatenate([asarray(c, dtype=int64).reshape(-1) for c in connectivities])
+	nodeTags = unique(asarray(nodeTags, dtype=int64))
+
+	graph = node_adjacency(connectivities, nodeTags)
+	permutation = reverse_cuthill_mckee(graph, symmetric_mode=True)
+
+	return TagMap(nodeTags[permutation], start_tag + arange(len(nodeTags), dtype=int64))
+
+
+
+
+def node_adjacency(connectivities, nodeTags):
+	"""
+	Sparse (scipy CSR) node adjacency matrix: entry (i, j) is nonzero if nodes nodeTags[i]
+	and nodeTags[j] (nodeTags sorted) share an element in connectivities.
+	"""
+	from scipy.sparse import coo_matrix
+
+	rows = []
+	cols = []
+	for connectivity in connectivities:
+		connectivity = asarray(connectivity, dtype=int64)
+		nnodes = connectivity.shape[1]
+		index = searchsorted(nodeTags, connectivity)
+		if (index >= len(nodeTags)).any() or (nodeTags[index.clip(max=len(nodeTags)-1)] != connectivity).any():
+			raise KeyError("node_adjacency: connectivity has nodes not in nodeTags")
+		rows.append(repeat(index, nnodes, axis=1).reshape(-1))
+		cols.append(tile(index, (1, nnodes)).reshape(-1))
+
+	rows = concatenate(rows) if len(rows) > 0 else array([], dtype=int64)
+	cols = concatenate(cols) if len(cols) > 0 else array([], dtype=int64)
+
+	N = len(nodeTags)
+	return coo_matrix((ones(len(rows), dtype=bool), (rows, cols)), shape=(N, N)).tocsr()
+
+
+
+
+def connectivity_bandwidth(connectivities, tagmap=None):
+	"""
+	Largest difference between node numbers within an element, over all elements of
+	connectivities (list of (Nelements, nnodes) arrays of gmsh node tags). Node numbers
+	are the gmsh tags, or the ones given by tagmap. Multiply by ndf for the bandwidth of
+	the system of equations.
+	"""
+	bandwidth = 0
+	for connectivity in connectivities:
+		connectivity = asarray(connectivity, dtype=int64)
+		if len(connectivity) == 0:
+			continue
+		if tagmap is not None:
+			connectivity = tagmap.forward(connectivity)
+		bandwidth = max(bandwidth, int((connectivity.max(axis=1) - connectivity.min(axis=1)).max()))
+	return bandwidth
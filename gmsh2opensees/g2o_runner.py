@@ -0,0 +1,229 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Parametric runs in a pool of processes, each one with its own opensees domain
+
+import time
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from numpy import asarray, ndarray, double, uint8, zeros, ones, full, nan
+
+from gmsh2opensees.g2o_msh import MshModel, read_msh, copy_gmsh_model
+from gmsh2opensees.g2o_cache import mesh_to_arrays, mesh_from_arrays
+
+
+#Mesh of a worker process, rebuilt once from shared memory by _init_worker
+_worker_model = None
+_worker_shared_memory = []
+_worker_started = None
+
+
+
+
+def run_parametric(worker, parameters, mesh, nprocs=None, result_shape=None, retries=1, verbose=True, mp_context="spawn"):
+	"""
+	Call worker(model, params) for every params in parameters, in a pool of nprocs processes
+	(default, one per cpu). Each process has its own opensees domain, wiped (along with
+	the node registry of this library) before every run, so worker builds the model from
+	scratch: add nodes, add elements, fix, analyze, and returns its results (anything
+	numpy can turn into an array of result_shape, which defaults to the shape of the first
+	result). worker must be a module-level function, so it can be sent to the processes.
+
+	mesh is an MshModel, a live gmsh model or an MSH file name. It is extracted once into
+	shared memory (multiprocessing.shared_memory), and every process sees it as an MshModel
+	built on top of the shared arrays, so no process reads or copies the mesh.
+
+		def worker(model, E):
+			ops.model("basicBuilder","-ndm",3,"-ndf",3)
+			...
+			return g2o.get_displacements_at_nodes(tip_nodes)
+
+		results, status = g2o.run_parametric(worker, [100e9, 200e9, 300e9], "example2.msh")
+
+	Returns results, an (Nruns, *result_shape) array (NaN for failed runs), and status, a dict
+	of arrays: "ok" (run succeeded), "time" (seconds spent in worker), "attempts", and "error"
+	(list with the traceback of each failed run, None otherwise).
+
+	A run that raises fails alone. A process that dies (say, a crash inside opensees) takes
+	down the runs in flight in the pool. Those that had started are run again, each alone in
+	its own process, so the crash is pinned on the run that causes it, which is tried at most
+	retries more times; the others are sent to the pool again. "attempts" counts the times
+	each run actually started.
+	mp_context "spawn" gives processes with fresh opensees state, "fork" starts faster.
+	"""
+	parameters = list(parameters)
+	Nruns = len(parameters)
+
+	if isinstance(mesh, str):
+		mesh = read_msh(mesh)
+	elif not isinstance(mesh, MshModel):
+		mesh = copy_gmsh_model(mesh)
+
+	arrays, index = mesh_to_arrays(mesh)
+
+	results = None
+	status = {
+		"ok" : zeros(Nruns, dtype=bool),
+		"time" : full(Nruns, nan),
+		"attempts" : zeros(Nruns, dtype=int),
+		"error" : [None] * Nruns,
+	}
+
+	shared, specs = _share_arrays(arrays)
+	started = None
+	try:
+		#One flag per run, set by the worker process when the run starts
+		started_shm = shared_memory.SharedMemory(create=True, size=max(Nruns, 1))
+		shared.append(started_shm)
+		started = ndarray(Nruns, dtype=uint8, buffer=started_shm.buf)
+
+		from gmsh2opensees.g2o_backend import get_backend_name
+		initargs = (specs, index, get_backend_name(), started_shm.name, Nruns)
+		context = multiprocessing.get_context(mp_context)
+
+		def run_pool(runs, max_workers):
+			#Run runs in a new pool. Returns {run: (result, error, elapsed)} for the runs that
+			#finished, and the runs taken down by a dead process
+			started[runs] = 0
+			finished = {}
+			died = []
+			with ProcessPoolExecutor(max_workers, mp_context=context, initializer=_init_worker, initargs=initargs) as executor:
+				futures = {executor.submit(_run_one, worker, parameters[i], i) : i for i in runs}
+				for future in as_completed(futures):
+					try:
+						finished[futures[future]] = future.result()
+					except BrokenProcessPool:
+						died.append(futures[future])
+			status["attempts"][runs] += started[runs]
+			return finished, died
+
+		#Runs go to a shared pool. When a process dies, the runs it took down that had started
+		#are suspects: each one is run again alone, so a run that always crashes only takes
+		#itself down. Runs that had not started yet go back to the shared pool.
+		queue = list(range(Nruns))
+		suspects = []
+		crashes = zeros(Nruns, dtype=int)
+		while len(queue) > 0 or len(suspects) > 0:
+			if len(queue) > 0:
+				finished, died = run_pool(queue, nprocs)
+				suspect = started[died].astype(bool) if any(started[died]) else ones(len(died), dtype=bool)
+				queue = [i for i, s in zip(died, suspect) if not s]
+				suspects += [i for i, s in zip(died, suspect) if s]
+				if verbose and len(died) > 0:
+					print(f"run_parametric: a worker process died, running {sum(suspect)} runs again one by one")
+			else:
+				i = suspects.pop(0)
+				finished, died = run_pool([i], 1)
+				if len(died) > 0:
+					crashes[i] += 1
+					if crashes[i] <= retries:
+						suspects.append(i)
+					else:
+						finished[i] = (None, "worker process died", nan)
+
+			for i, (result, error, elapsed) in finished.items():
+				if error is None:
+					result = asarray(result, dtype=double)
+					if results is None:
+						results = full((Nruns,) + (result.shape if result_shape is None else tuple(result_shape)), nan)
+					if result.shape != results.shape[1:]:
+						error = f"result has shape {result.shape}, expected {results.shape[1:]}"
+
+				status["time"][i] = elapsed
+				if error is None:
+					results[i] = result
+					status["ok"][i] = True
+				else:
+					status["error"][i] = error
+					if verbose:
+						print(f"run_parametric: run {i} failed:\n{error}")
+	finally:
+		started = None
+		for shm in shared:
+			shm.close()
+			shm.unlink()
+
+	if results is None:
+		results = full((Nruns,) + (() if result_shape is None else tuple(result_shape)), nan)
+
+	if verbose:
+		ok = status["ok"]
+		print(f"run_parametric: {ok.sum()} of {Nruns} runs ok, "
+			f"{status['time'][ok].mean() if ok.any() else nan:.3f} s per run on average")
+
+	return results, status
+
+
+
+
+def _share_arrays(arrays):
+	#Copy arrays to shared memory. Returns the SharedMemory objects and (name, shm name, shape, dtype) of each
+	shared = []
+	specs = []
+	try:
+		for name, values in arrays.items():
+			values = asarray(values)
+			shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+			shared.append(shm)
+			ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[...] = values
+			specs.append((name, shm.name, values.shape, values.dtype.str))
+	except Exception:
+		for shm in shared:
+			shm.close()
+			shm.unlink()
+		raise
+	return shared, specs
+
+
+
+
+def _init_worker(specs, index, backend_name, started_name, Nruns):
+	#Runs once in each worker process: attach to the shared mesh and run flags, and pick the same opensees backend
+	global _worker_model, _worker_started
+	from gmsh2opensees.g2o_backend import set_backend
+
+	if backend_name is not None:
+		set_backend(backend_name)
+
+	arrays = {}
+	for name, shm_name, shape, dtype in specs:
+		shm = shared_memory.SharedMemory(name=shm_name)
+		_worker_shared_memory.append(shm)
+		arrays[name] = ndarray(shape, dtype=dtype, buffer=shm.buf)
+		arrays[name].flags.writeable = False
+
+	_worker_model = mesh_from_arrays(arrays, index)
+
+	shm = shared_memory.SharedMemory(name=started_name)
+	_worker_shared_memory.append(shm)
+	_worker_started = ndarray(Nruns, dtype=uint8, buffer=shm.buf)
+
+
+
+
+def _run_one(worker, params, i):
+	#Run number i in a worker process, returns (result, error, elapsed time)
+	from gmsh2opensees.g2o_backend import ops
+	from gmsh2opensees.g2o_nodes_functions import reset_node_registry
+	from gmsh2opensees.g2o_utils import set_node_numbering, set_local_partition
+
+	_worker_started[i] = 1
+	t0 = time.perf_counter()
+	try:
+		ops.wipe()
+		reset_node_registry()
+		set_node_numbering(None)
+		set_local_partition(None, None)
+		result = worker(_worker_model, params)
+		error = None
+	except Exception:
+		result, error = None, traceback.format_exc()
+
+	return result, error, time.perf_counter() - t0
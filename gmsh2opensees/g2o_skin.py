@@ -0,0 +1,173 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Boundary skin of solid meshes: the faces that belong to a single element, and their nodes
+
+import weakref
+
+from numpy import asarray, int64, zeros, repeat, concatenate, unique, argsort, lexsort, sort, diff, flatnonzero, \
+	intersect1d, iinfo
+
+from gmsh2opensees.g2o_elements_functions import get_element_blocks_in_physical_group
+
+
+#Faces of each solid gmsh element type: (gmsh type of the faces, number of corners, faces).
+#Faces are listed with outward normals, corners first (gmsh ordering of the face type)
+solid_element_faces = {
+	#4-node tetrahedron -> 3-node triangles
+	4  : (2, 3, [(0,2,1), (0,1,3), (0,3,2), (1,2,3)]),
+	#10-node tetrahedron -> 6-node triangles
+	11 : (9, 3, [(0,2,1,6,5,4), (0,1,3,4,9,7), (0,3,2,7,8,6), (1,2,3,5,8,9)]),
+	#8-node hexahedron -> 4-node quadrangles
+	5  : (3, 4, [(0,3,2,1), (0,1,5,4), (0,4,7,3), (1,2,6,5), (2,3,7,6), (4,5,6,7)]),
+	#20-node hexahedron -> 8-node quadrangles
+	17 : (16, 4, [(0,3,2,1,9,13,11,8), (0,1,5,4,8,12,16,10), (0,4,7,3,10,17,15,9),
+		(1,2,6,5,11,14,18,12), (2,3,7,6,13,15,19,14), (4,5,6,7,16,18,19,17)]),
+	#27-node hexahedron -> 9-node quadrangles
+	12 : (10, 4, [(0,3,2,1,9,13,11,8,20), (0,1,5,4,8,12,16,10,21), (0,4,7,3,10,17,15,9,22),
+		(1,2,6,5,11,14,18,12,23), (2,3,7,6,13,15,19,14,24), (4,5,6,7,16,18,19,17,25)]),
+}
+
+
+
+
+def extract_skin(blocks):
+	"""
+	Boundary skin of solid elements, given as blocks {elementType: (elementTags, connectivity)}
+	(see get_element_blocks_in_physical_group). Element types are tets and hexes, linear or
+	quadratic (see solid_element_faces). A face is on the boundary when no other element has
+	the same corner nodes: faces are keyed by their sorted corners, sorted, and the keys seen
+	only once are kept, all in numpy.
+
+	Returns nodeTags, the sorted nodes of the boundary faces, and faces, blocks of the boundary
+	faces in the same format, {face elementType: (parent elementTags, face connectivity)},
+	oriented outwards. The faces can be passed as blocks to write_vtu or VtuSeriesWriter to
+	export only the surface.
+	"""
+	#Faces grouped by number of corners (triangles and quadrangles), so tets and hexes of
+	#different orders share faces
+	faces_by_corners = {}
+	for elementType, (elementTags, connectivity) in blocks.items():
+		if elementType not in solid_element_faces:
+			raise ValueError(f"extract_skin: gmsh element type {elementType} not supported (solid elements only, "
+				f"{list(solid_element_faces)})")
+		faceType, ncorners, faces = solid_element_faces[elementType]
+		elementTags = asarray(elementTags, dtype=int64).reshape(-1)
+		connectivity = asarray(connectivity, dtype=int64).reshape((len(elementTags), -1))
+
+		face_connectivity = connectivity[:, faces].reshape((-1, len(faces[0])))
+		parents = repeat(elementTags, len(faces))
+		faces_by_corners.setdefault(ncorners, []).append((faceType, parents, face_connectivity))
+
+	skin = {}
+	for ncorners, groups in faces_by_corners.items():
+		keys = sort(concatenate([face_connectivity[:,:ncorners] for faceType, parents, face_connectivity in groups]), axis=1)
+		boundary = _unique_rows_mask(keys)
+
+		start = 0
+		for faceType, parents, face_connectivity in groups:
+			on_boundary = boundary[start:start + len(parents)]
+			start += len(parents)
+			if on_boundary.any():
+				skin.setdefault(faceType, []).append((parents[on_boundary], face_connectivity[on_boundary]))
+
+	faces = {faceType: (concatenate([parents for parents, face_connectivity in block]),
+		concatenate([face_connectivity for parents, face_connectivity in block])) for faceType, block in skin.items()}
+
+	if len(faces) > 0:
+		nodeTags = unique(concatenate([face_connectivity.reshape(-1) for parents, face_connectivity in faces.values()]))
+	else:
+		nodeTags = zeros(0, dtype=int64)
+
+	return nodeTags, faces
+
+
+
+
+def _unique_rows_mask(keys):
+	#True for the rows of keys (integers >= 0) that appear only once. The columns are packed
+	#into as few int64 words as fit, and the rows sorted by them
+	Nrows, ncols = keys.shape
+	if Nrows == 0:
+		return zeros(0, dtype=bool)
+
+	radix = int(keys.max()) + 1
+	per_word = 1
+	while per_word < ncols and radix**(per_word + 1) < iinfo(int64).max:
+		per_word += 1
+
+	words = []
+	for first in range(0, ncols, per_word):
+		packed = keys[:,first].astype(int64)
+		for j in range(first + 1, min(first + per_word, ncols)):
+			packed = packed*radix + keys[:,j]
+		words.append(packed)
+
+	if len(words) == 1:
+		order = argsort(words[0])
+		new_group = diff(words[0][order]) != 0
+	else:
+		order = lexsort(words[::-1])
+		new_group = diff(words[0][order]) != 0
+		for word in words[1:]:
+			new_group |= diff(word[order]) != 0
+
+	#Start and size of each group of equal rows, in sorted order
+	starts = concatenate(([0], flatnonzero(new_group) + 1))
+	sizes = diff(concatenate((starts, [Nrows])))
+
+	mask = zeros(Nrows, dtype=bool)
+	mask[order[starts[sizes == 1]]] = True
+	return mask
+
+
+
+
+#Skins per model and physical group (None for all 3D elements). See get_skin
+_skin_cache = weakref.WeakKeyDictionary()
+
+
+def get_skin(gmshmodel, groupname=None):
+	"""
+	extract_skin of the elements of a physical group, or of all the 3D elements in gmshmodel if
+	groupname is None. Cached until the mesh changes (see g2o_cache.model_cached: re-meshed);
+	the skin only depends on the connectivity, so moving nodes keeps it. Returns nodeTags, faces.
+	"""
+	from gmsh2opensees.g2o_cache import model_cached
+
+	def build():
+		if groupname is None:
+			elementTypes, elementTags, nodeTags = gmshmodel.mesh.getElements(3, -1)
+			blocks = {elementType: (asarray(tags, dtype=int64), asarray(nodes, dtype=int64).reshape((len(tags), -1)))
+				for elementType, tags, nodes in zip(elementTypes, elementTags, nodeTags)}
+		else:
+			blocks = get_element_blocks_in_physical_group(groupname, gmshmodel)
+		return extract_skin(blocks)
+
+	return model_cached(_skin_cache, gmshmodel, groupname, build, coordinates=False)
+
+
+
+
+def skin_node_tags(gmshmodel, surface_only=True, nodeTags=None):
+	"""
+	Resolve the surface_only option of the visualization and export functions: surface_only is
+	True (skin of all the 3D elements) or a physical group name (skin of its elements). Returns
+	the sorted skin nodes, only those in nodeTags if given.
+	"""
+	skin_nodes, faces = get_skin(gmshmodel, None if surface_only is True else surface_only)
+	if nodeTags is None or len(nodeTags) == 0:
+		return skin_nodes
+	return intersect1d(skin_nodes, asarray(nodeTags, dtype=int64).reshape(-1))
+
+
+
+
+def invalidate_skin_cache():
+	"""
+	Forget the cached skins (see get_skin)
+	"""
+	_skin_cache.clear()
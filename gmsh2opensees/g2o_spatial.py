@@ -0,0 +1,328 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Spatial searches over node coordinates: close pairs on a uniform grid, and location queries
+
+import weakref
+
+from numpy import asarray, int64, double, zeros, arange, floor, repeat, cumsum, concatenate, argsort, searchsorted, sqrt, minimum, maximum, unique, \
+	sort, full, inf, abs
+
+
+
+
+def model_scale(coords):
+	"""
+	Size of the model, the diagonal of the bounding box of coords. Use it to turn relative
+	tolerances into absolute ones.
+	"""
+	coords = asarray(coords, dtype=double).reshape((-1,3))
+	if len(coords) == 0:
+		return 0.
+	extent = coords.max(axis=0) - coords.min(axis=0)
+	return float(sqrt((extent**2).sum()))
+
+
+
+
+def find_close_pairs(coords_a, coords_b, tol):
+	"""
+	Find all pairs of points, one from coords_a and one from coords_b, closer than tol.
+	Returns two index arrays (ia, ib), so that |coords_a[ia] - coords_b[ib]| <= tol.
+
+	Points are binned into a uniform grid with cells of size tol (or larger, for very 
+	small tolerances), then each point of coords_a is checked only against the points 
+	of coords_b in the 27 cells around it. Runs in O(N log N) time and O(N) memory as 
+	long as there are not many points within one cell of each other.
+	"""
+	coords_a = asarray(coords_a, dtype=double).reshape((-1,3))
+	coords_b = asarray(coords_b, dtype=double).reshape((-1,3))
+
+	if tol <= 0:
+		raise ValueError(f"find_close_pairs: tolerance should be positive, got {tol=}")
+	if len(coords_a) == 0 or len(coords_b) == 0:
+		return zeros(0, dtype=int64), zeros(0, dtype=int64)
+
+	#Cell indices, with a margin of one cell so neighbors are never negative. Cells 
+	#can't be too small, or the linear cell numbering would overflow 
+	lower = minimum(coords_a.min(axis=0), coords_b.min(axis=0))
+	upper = maximum(coords_a.max(axis=0), coords_b.max(axis=0))
+	cellsize = max(tol, (upper - lower).max() / 2**20)
+	ncells = floor((upper - lower) / cellsize).astype(int64) + 3
+
+	keys_a = _cell_keys(coords_a, lower, cellsize, ncells)
+	keys_b = _cell_keys(coords_b, lower, cellsize, ncells)
+
+	#Keys grow with the cell index, so shifting all sorted keys_a by the same neighbor
+	#offset keeps them sorted, which makes searchsorted fast
+	order_a = argsort(keys_a, kind="stable")
+	order_b = argsort(keys_b, kind="stable")
+	sorted_keys_a = keys_a[order_a]
+
+	#Occupied cells of coords_b, with the range of (sorted) points in each
+	cells_b, first_b, count_b = unique(keys_b[order_b], return_index=True, return_counts=True)
+
+	all_ia = []
+	all_ib = []
+	for dx in (-1, 0, 1):
+		for dy in (-1, 0, 1):
+			for dz in (-1, 0, 1):
+				shift = (dx*ncells[1] + dy)*ncells[2] + dz
+				cell = searchsorted(cells_b, sorted_keys_a + shift)
+				cell[cell == len(cells_b)] = 0
+				occupied = cells_b[cell] == sorted_keys_a + shift
+				first = first_b[cell]
+				last = first + count_b[cell]*occupied
+				ia, ib = _expand_ranges(first, last)
+				ia, ib = order_a[ia], order_b[ib]
+
+				close = ((coords_a[ia] - coords_b[ib])**2).sum(axis=1) <= tol**2
+				all_ia.append(ia[close])
+				all_ib.append(ib[close])
+
+	return concatenate(all_ia), concatenate(all_ib)
+
+
+
+
+def merge_coincident_nodes(nodeTags, coords, tol=None, rtol=1e-6):
+	"""
+	Geometric node merging. Finds groups of nodes closer than tol to each other (default
+	rtol times the model size) and picks the smallest tag of each group as its representative.
+	Returns merged_tags, same length and order as nodeTags, giving the tag each node should 
+	be replaced with. Nodes with no close neighbors keep their own tag. 
+
+	Apply it to element connectivity with apply_node_merge (or g2o_utils.remap_tags) before 
+	adding nodes and elements to opensees; the merged-away nodes then simply never get added.
+	Chains of close nodes (a near b near c) end up in the same group.
+	"""
+	nodeTags = asarray(nodeTags, dtype=int64).reshape(-1)
+	coords = asarray(coords, dtype=double).reshape((-1,3))
+
+	if tol is None:
+		tol = rtol * model_scale(coords)
+	if len(nodeTags) == 0 or tol <= 0:
+		return nodeTags.copy()
+
+	#Work with nodes sorted by tag, so the smallest label is the smallest tag
+	order = argsort(nodeTags, kind="stable")
+	sorted_tags = nodeTags[order]
+	ia, ib = find_close_pairs(coords[order], coords[order], tol)
+
+	#Connected groups by label propagation with pointer jumping
+	labels = arange(len(sorted_tags))
+	while True:
+		new_labels = labels.copy()
+		minimum.at(new_labels, ia, labels[ib])
+		new_labels = new_labels[new_labels]
+		if (new_labels == labels).all():
+			break
+		labels = new_labels
+
+	merged_tags = zeros(len(nodeTags), dtype=int64)
+	merged_tags[order] = sorted_tags[labels]
+
+	return merged_tags
+
+
+
+
+def apply_node_merge(blocks, nodeTags, merged_tags):
+	"""
+	Replace node tags in element blocks (as returned by get_element_blocks_in_physical_group) 
+	according to merge_coincident_nodes. Returns new blocks. 
+	"""
+	from gmsh2opensees.g2o_utils import remap_tags
+	return {elementType: (elementTags, remap_tags(connectivity, nodeTags, merged_tags)) 
+		for elementType, (elementTags, connectivity) in blocks.items()}
+
+
+
+
+class SpatialIndex:
+	"""
+	Index of points (nodes, or element centroids) to select them by location, in bulk. Built
+	once from tags and their (N,3) coords, every query returns tags (gmsh tags), ready for
+	fix_nodes, add_nodes_to_ops or ops.load:
+
+		index = g2o.get_node_index(gmsh.model)
+		loaded_node = index.nearest([2., 0., 1.])[0]
+		base = index.near_plane([0, 0, 0], [0, 0, 1], tol=1e-6)
+		g2o.fix_nodes(base, "XYZ")
+
+	nearest, knn and sphere queries use a kd-tree (scipy.spatial.cKDTree, built on first use).
+	Box and plane queries use the points sorted by x, so only the slab of points within the
+	query's x range is looked at. Only nearest and knn need scipy, sphere queries fall back
+	to the x slab without it.
+	"""
+
+	def __init__(self, tags, coords):
+		self.tags = asarray(tags, dtype=int64).reshape(-1)
+		self.coords = asarray(coords, dtype=double).reshape((-1,3))
+		self.size = model_scale(self.coords)
+		self._tree = None
+
+		self._order = argsort(self.coords[:,0], kind="stable")
+		self._sorted_x = self.coords[self._order,0]
+
+	def __len__(self):
+		return len(self.tags)
+
+	def _kdtree(self):
+		if self._tree is None:
+			try:
+				from scipy.spatial import cKDTree
+			except ImportError:
+				raise ImportError("SpatialIndex.nearest and knn need scipy. Try: pip install scipy")
+			self._tree = cKDTree(self.coords)
+		return self._tree
+
+	def nearest(self, points, return_distance=False):
+		"""
+		Tag of the point closest to each of points (M,3). Returns an (M,) array, and the
+		distances too if return_distance.
+		"""
+		points = asarray(points, dtype=double).reshape((-1,3))
+		distances, rows = self._kdtree().query(points)
+		if return_distance:
+			return self.tags[rows], distances
+		return self.tags[rows]
+
+	def knn(self, points, k, return_distance=False):
+		"""
+		Tags of the k points closest to each of points (M,3), closest first. Returns an (M, k)
+		array, and the (M, k) distances too if return_distance.
+		"""
+		points = asarray(points, dtype=double).reshape((-1,3))
+		k = min(int(k), len(self.tags))
+		distances, rows = self._kdtree().query(points, k)
+		rows = rows.reshape((len(points), k))
+		if return_distance:
+			return self.tags[rows], distances.reshape((len(points), k))
+		return self.tags[rows]
+
+	def in_box(self, lower, upper):
+		"""
+		Sorted tags of the points with lower <= x <= upper (componentwise)
+		"""
+		lower = asarray(lower, dtype=double).reshape(3)
+		upper = asarray(upper, dtype=double).reshape(3)
+		rows = self._slab(lower[0], upper[0])
+		x = self.coords[rows]
+		inside = ((x >= lower) & (x <= upper)).all(axis=1)
+		return sort(self.tags[rows[inside]])
+
+	def in_sphere(self, centers, radius):
+		"""
+		Sorted tags of the points within radius of any of centers (one (3,) point or (M,3))
+		"""
+		centers = asarray(centers, dtype=double).reshape((-1,3))
+		found = [zeros(0, dtype=int64)]
+		try:
+			for rows in self._kdtree().query_ball_point(centers, radius):
+				found.append(self.tags[rows])
+		except ImportError:
+			for center in centers:
+				rows = self._slab(center[0] - radius, center[0] + radius)
+				inside = ((self.coords[rows] - center)**2).sum(axis=1) <= radius**2
+				found.append(self.tags[rows[inside]])
+		return unique(concatenate(found))
+
+	def near_plane(self, point, normal, tol=None, rtol=1e-6):
+		"""
+		Sorted tags of the points at most tol (default rtol times the model size) from the
+		plane through point with the given normal. Planes normal to x, y or z are box queries,
+		any other plane is one pass over all the points.
+		"""
+		point = asarray(point, dtype=double).reshape(3)
+		normal = asarray(normal, dtype=double).reshape(3)
+		normal = normal / sqrt((normal**2).sum())
+		if tol is None:
+			tol = rtol * self.size
+
+		axis = abs(normal).argmax()
+		if abs(normal[axis]) == 1:
+			lower = full(3, -inf)
+			upper = full(3, inf)
+			lower[axis] = point[axis] - tol
+			upper[axis] = point[axis] + tol
+			return self.in_box(lower, upper)
+
+		close = abs((self.coords - point) @ normal) <= tol
+		return sort(self.tags[close])
+
+	def _slab(self, xmin, xmax):
+		#Rows of the points with xmin <= x <= xmax
+		first = searchsorted(self._sorted_x, xmin, side="left")
+		last = searchsorted(self._sorted_x, xmax, side="right")
+		return self._order[first:last]
+
+
+
+
+#Spatial indexes per model (None for nodes or a physical group for element centroids), see g2o_cache.model_cached
+_spatial_index_cache = weakref.WeakKeyDictionary()
+
+
+def get_node_index(gmshmodel):
+	"""
+	SpatialIndex of all the nodes of gmshmodel (see get_all_nodes), built once and kept until
+	the mesh changes (see g2o_cache.model_cached: re-meshed, or g2o_cache.mesh_changed after
+	moving nodes).
+	"""
+	return _cached_index(gmshmodel, None)
+
+
+def get_element_index(gmshmodel, groupname):
+	"""
+	SpatialIndex of the centroids (average of the element nodes) of the elements of a physical
+	group, queries return element tags. Cached like get_node_index.
+	"""
+	return _cached_index(gmshmodel, groupname)
+
+
+def invalidate_spatial_indexes():
+	"""
+	Forget the cached spatial indexes (see get_node_index and get_element_index)
+	"""
+	_spatial_index_cache.clear()
+
+
+def _cached_index(gmshmodel, groupname):
+	from gmsh2opensees.g2o_cache import model_cached
+	from gmsh2opensees.g2o_nodes_functions import get_all_nodes, get_node_coordinates
+	from gmsh2opensees.g2o_elements_functions import get_element_blocks_in_physical_group
+
+	def build():
+		if groupname is None:
+			tags, coords = get_all_nodes(gmshmodel)
+		else:
+			blocks = get_element_blocks_in_physical_group(groupname, gmshmodel)
+			tags = concatenate([elementTags for elementTags, connectivity in blocks.values()])
+			coords = concatenate([get_node_coordinates(connectivity, gmshmodel).reshape((len(elementTags), -1, 3)).mean(axis=1)
+				for elementTags, connectivity in blocks.values()])
+		return SpatialIndex(tags, coords)
+
+	return model_cached(_spatial_index_cache, gmshmodel, groupname, build)
+
+
+
+
+def _cell_keys(coords, lower, cellsize, ncells):
+	#Linear number of the grid cell of each point
+	cells = floor((coords - lower) / cellsize).astype(int64) + 1
+	return (cells[:,0]*ncells[1] + cells[:,1])*ncells[2] + cells[:,2]
+
+
+def _expand_ranges(first, last):
+	#For each i, all the j in range(first[i], last[i]). Returns (i, j) index arrays
+	counts = last - first
+	total = counts.sum()
+	i = repeat(arange(len(first)), counts)
+	offsets = arange(total) - repeat(cumsum(counts) - counts, counts)
+	j = repeat(first, counts) + offsets
+	return i, j
+
@@ -4,34 +4,445 @@
 #
 # 2022 - Jose A. Abell M. - www.joseabell.com
 
-import os
 
-if os.name == 'nt':
-	import openseespy.opensees as ops
-else:   #not checked in mac
-	import opensees as ops
 
+import weakref
 
-
-from numpy import array, int32, double, concatenate, unique, setdiff1d, zeros
+from numpy import array, asarray, int32, int64, double, concatenate, unique, setdiff1d, zeros, ones, flatnonzero, argsort, searchsorted, arange, union1d
 from numpy.linalg import norm
 
 
 
 
 
+#Cached physical group index, one per model. See get_physical_groups_index
+_physical_groups_cache = weakref.WeakKeyDictionary()
+
+
+def get_physical_groups_index(gmshmodel):
+	"""
+	Return the cached physical group index of the current gmsh model. This is a dict with:
+
+		"groups"   : group name -> (dim, tag) of the physical group
+		"entities" : group name -> entities in the group (filled on demand)
+		"blocks"   : (dim, entity) -> element types, tags and nodes, as given by 
+		             mesh.getElements (filled on demand)
+
+	The index belongs to the model object and is rebuilt when the mesh (largest tags, node
+	and element counts) or the list of physical groups change (see g2o_cache.mesh_version). Use
+	invalidate_physical_groups_cache or g2o_cache.mesh_changed to force a rebuild.
+	"""
+	from gmsh2opensees.g2o_cache import model_cached
+
+	physical_groups = tuple((dim, tag) for dim, tag in gmshmodel.getPhysicalGroups())
+
+	def build():
+		groups = {}
+		for dim, tag in physical_groups:
+			name = gmshmodel.getPhysicalName(dim, tag)
+			groups[name] = (dim, tag)
+		return {
+			"groups"   : groups,
+			"entities" : {},
+			"blocks"   : {},
+		}
+
+	return model_cached(_physical_groups_cache, gmshmodel, "physical groups", build, version=physical_groups)
+
+
+def invalidate_physical_groups_cache(gmshmodel=None):
+	"""
+	Drop the cached physical group index of gmshmodel, or of all models if gmshmodel is
+	not given
+	"""
+	if gmshmodel is None:
+		_physical_groups_cache.clear()
+	else:
+		_physical_groups_cache.pop(gmshmodel, None)
+
+
 def get_physical_groups_map(gmshmodel):
 	"""
 	Given the gmsh model, return a map of all defined physical groups and their names.
 	The map will return the dimension and rag of the physical group if indexed by name
 	"""
-	pg = gmshmodel.getPhysicalGroups()
-	the_physical_groups_map = {}
-	for dim, tag in pg:
-		name = gmshmodel.getPhysicalName(dim, tag)
-		the_physical_groups_map[name] = (dim, tag)
+	return get_physical_groups_index(gmshmodel)["groups"]
+
+
+def get_entities_for_physical_group(groupname, gmshmodel):
+	"""
+	Return the dimension and the list of entities of a physical group, given its name.
+	Cached, see get_physical_groups_index.
+	"""
+	index = get_physical_groups_index(gmshmodel)
+	dim, tag = index["groups"][groupname]
+
+	if groupname not in index["entities"]:
+		index["entities"][groupname] = gmshmodel.getEntitiesForPhysicalGroup(dim, tag)
+
+	return dim, index["entities"][groupname]
+
+
+def get_entity_elements(dim, entity, gmshmodel):
+	"""
+	Return element types, element tags and node tags of one gmsh entity (same output 
+	as mesh.getElements). Cached, see get_physical_groups_index.
+	"""
+	blocks = get_physical_groups_index(gmshmodel)["blocks"]
+
+	if (dim, entity) not in blocks:
+		blocks[(dim, entity)] = gmshmodel.mesh.getElements(dim, entity)
+
+	return blocks[(dim, entity)]
+
+
+
+
+
+def remap_tags(tags, from_tags, to_tags):
+	"""
+	Replace every tag found in from_tags by the corresponding entry of to_tags. Tags that are 
+	not in from_tags are left as they are. Works on arrays of any shape (say, connectivity) 
+	with a sorted lookup, no dicts involved. Returns a new int64 array. 
+	"""
+	tags = array(tags, dtype=int64)
+	from_tags = array(from_tags, dtype=int64).reshape(-1)
+	to_tags = array(to_tags, dtype=int64).reshape(-1)
+
+	if len(from_tags) == 0:
+		return tags
+
+	order = argsort(from_tags, kind="stable")
+	found, rows = _sorted_lookup(from_tags[order], tags)
+	tags[found] = to_tags[order][rows[found]]
+
+	return tags
+
+
+def _sorted_lookup(sorted_keys, tags):
+	#Position of each of tags in sorted_keys, and whether it is there at all
+	rows = searchsorted(sorted_keys, tags)
+	rows[rows == len(sorted_keys)] = 0
+	found = sorted_keys[rows] == tags if len(sorted_keys) > 0 else zeros(rows.shape, dtype=bool)
+	return found, rows
+
+
+
+
+
+class TagMap:
+	"""
+	One-to-one map between two sets of integer tags, for example gmsh node tags and the
+	opensees node tags used for them. Stored as sorted int64 arrays in both directions and 
+	looked up with searchsorted, so memory is predictable whatever the size of the tags.
+	"""
+
+	def __init__(self, from_tags, to_tags):
+		from_tags = array(from_tags, dtype=int64).reshape(-1)
+		to_tags = array(to_tags, dtype=int64).reshape(-1)
+		if len(from_tags) != len(to_tags):
+			raise ValueError(f"TagMap: got {len(from_tags)} tags to map to {len(to_tags)} tags")
+
+		order = argsort(from_tags, kind="stable")
+		self.from_tags, self.from_tags_image = from_tags[order], to_tags[order]
+		order = argsort(to_tags, kind="stable")
+		self.to_tags, self.to_tags_preimage = to_tags[order], from_tags[order]
+
+	def forward(self, tags):
+		"""
+		Map tags (array of any shape) from_tags -> to_tags. Raises KeyError for unknown tags
+		"""
+		return self._lookup(self.from_tags, self.from_tags_image, tags)
+
+	def inverse(self, tags):
+		"""
+		Map tags (array of any shape) to_tags -> from_tags. Raises KeyError for unknown tags
+		"""
+		return self._lookup(self.to_tags, self.to_tags_preimage, tags)
+
+	def __len__(self):
+		return len(self.from_tags)
+
+	@staticmethod
+	def _lookup(keys, values, tags):
+		tags = asarray(tags, dtype=int64)
+		found, rows = _sorted_lookup(keys, tags)
+		if not found.all():
+			raise KeyError(f"TagMap: unknown tags {tags[~found][:10].tolist()}")
+		return values[rows]
+
+
+
+
+
+#Active gmsh -> opensees node numbering (a TagMap). None means opensees node tags are the gmsh ones
+_node_numbering = None
+
+
+def set_node_numbering(tagmap):
+	"""
+	Use tagmap (a TagMap from gmsh node tags to opensees node tags, see 
+	g2o_renumbering.renumber_nodes) whenever nodes go to or come from opensees. Pass 
+	None to go back to using gmsh tags in opensees. 
+	"""
+	global _node_numbering
+	_node_numbering = tagmap
+
+
+def get_node_numbering():
+	"""
+	Return the active node numbering (a TagMap), or None
+	"""
+	return _node_numbering
+
+
+def gmsh_to_ops_node_tags(nodeTags):
+	"""
+	The opensees tags of gmsh nodes, according to the active node numbering
+	"""
+	nodeTags = asarray(nodeTags, dtype=int64)
+	return nodeTags if _node_numbering is None else _node_numbering.forward(nodeTags)
+
+
+def ops_to_gmsh_node_tags(nodeTags):
+	"""
+	The gmsh tags of opensees nodes, according to the active node numbering
+	"""
+	nodeTags = asarray(nodeTags, dtype=int64)
+	return nodeTags if _node_numbering is None else _node_numbering.inverse(nodeTags)
+
+
+
+
+#Nodes and elements of this process when building a partitioned model, see g2o_parallel
+_local_partition = None
+
+
+def set_local_partition(nodeTags, elementTags, partitioned_nodeTags=None, partitioned_elementTags=None, keep_others=False,
+		partition=None, rank=None):
+	"""
+	Only build the nodes and elements of this process (gmsh tags nodeTags and elementTags):
+	add_nodes_to_ops, add_elements_to_ops and fix_nodes skip the rest of the partitioned
+	ones (partitioned_nodeTags and partitioned_elementTags, default all). Nodes and elements
+	that are not in any partition are built only if keep_others is True (the process with
+	rank 0). Used for parallel builds, see g2o_parallel.MeshPartition.activate, which also
+	passes the MeshPartition and rank of this process for local_pair_mask.
+
+	Pass None as nodeTags to build everything again.
+	"""
+	global _local_partition
+	if nodeTags is None:
+		_local_partition = None
+		return
+
+	def sorted_tags(tags):
+		return None if tags is None else unique(asarray(tags, dtype=int64))
+
+	_local_partition = {
+		"nodes" : sorted_tags(nodeTags),
+		"elements" : sorted_tags(elementTags),
+		"partitioned_nodes" : sorted_tags(partitioned_nodeTags),
+		"partitioned_elements" : sorted_tags(partitioned_elementTags),
+		"keep_others" : keep_others,
+		"partition" : partition,
+		"rank" : rank,
+	}
+
+
+def get_local_partition():
+	"""
+	Return the active local partition (a dict, see set_local_partition), or None
+	"""
+	return _local_partition
+
+
+def local_node_mask(nodeTags):
+	"""
+	Which of nodeTags (gmsh tags) are built by this process. All of them if there is no
+	active local partition.
+	"""
+	return _local_mask(nodeTags, "nodes")
+
+
+def local_element_mask(elementTags):
+	"""
+	Which of elementTags are built by this process, see local_node_mask
+	"""
+	return _local_mask(elementTags, "elements")
+
+
+def local_pair_mask(nodeTags_a, nodeTags_b):
+	"""
+	Which of the pairs of nodes (nodeTags_a[i], nodeTags_b[i]), gmsh tags, are built by this
+	process: constraints and two-node links such as equalDOF, rigidLink or the penalty beams
+	of couple_beams_to_solid. All of them if there is no active local partition.
+
+	With a MeshPartition active, each pair goes to the lowest partition holding both of its
+	nodes, so it is built exactly once (see MeshPartition.pair_partition). A pair with no such
+	partition can't be built by any process, and a ValueError is raised: partition the groups
+	it connects together. Without a MeshPartition (set_local_partition called by hand) a pair
+	is built by every process that has both nodes.
+	"""
+	nodeTags_a = asarray(nodeTags_a, dtype=int64).reshape(-1)
+	nodeTags_b = asarray(nodeTags_b, dtype=int64).reshape(-1)
+	if _local_partition is None:
+		return ones(len(nodeTags_a), dtype=bool)
+
+	partition = _local_partition["partition"]
+	if partition is None:
+		return local_node_mask(nodeTags_a) & local_node_mask(nodeTags_b)
+
+	parts = partition.pair_partition(nodeTags_a, nodeTags_b)
+	if (parts < 0).any():
+		missing = [(int(a), int(b)) for a, b in zip(nodeTags_a[parts < 0][:10], nodeTags_b[parts < 0][:10])]
+		raise ValueError(f"local_pair_mask: no partition holds both nodes of the pairs {missing}, "
+			"partition the groups they connect together (see partition_mesh)")
+	return parts == _local_partition["rank"]
+
+
+def _local_mask(tags, kind):
+	tags = asarray(tags, dtype=int64)
+	if _local_partition is None:
+		return ones(tags.shape, dtype=bool)
+
+	local = _sorted_lookup(_local_partition[kind], tags)[0]
+	partitioned = _local_partition["partitioned_" + kind]
+	if partitioned is None or not _local_partition["keep_others"]:
+		return local
+	return local | ~_sorted_lookup(partitioned, tags)[0]
+
+
+
+
+
+class TagAllocator:
+	"""
+	Hands out dense ranges of opensees tags, separately for each kind of object 
+	("node", "element", or anything else you want to number: "transformation", ...). 
+	Tags defined elsewhere are declared with reserve, so allocated tags never collide 
+	with them. Tags are int64 throughout. 
+	"""
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.next_tag = {}
+
+	def reserve(self, kind, tags):
+		"""
+		Declare tags as used, the next allocations of this kind start after them
+		"""
+		tags = asarray(tags, dtype=int64).reshape(-1)
+		if len(tags) > 0:
+			self.next_tag[kind] = max(self.next_tag.get(kind, 1), int(tags.max()) + 1)
+
+	def allocate(self, kind, n):
+		"""
+		Return an array with n new consecutive tags of the given kind
+		"""
+		start = self.next_tag.get(kind, 1)
+		self.next_tag[kind] = start + n
+		return arange(start, start + n, dtype=int64)
+
+
+#Allocator used by the functions in this library. See allocate_tags and reserve_tags
+tag_allocator = TagAllocator()
+
+
+def allocate_tags(kind, n):
+	"""
+	Get n new, unused, consecutive opensees tags for objects of kind ("node", "element", ...)
+	"""
+	return tag_allocator.allocate(kind, n)
+
+
+def reserve_tags(kind, tags):
+	"""
+	Tell the tag allocator that these tags of objects of kind ("node", "element", ...) are in use
+	"""
+	tag_allocator.reserve(kind, tags)
+
+
+
+
+
+class TagRegistry:
+	"""
+	A set of (positive) integer tags, kept as a boolean bitmap indexed by tag. 
+	Used to remember which nodes have already been sent to opensees without asking 
+	opensees for the full list every time. 
+
+	Membership tests and insertions are vectorized and cost O(len(tags)), no matter
+	how many tags are already registered. The bitmap grows (doubling) when larger
+	tags come in. Tags above max_bitmap_tag go to a sorted int64 array instead, so 
+	a few huge tags don't blow up memory.
+	"""
+
+	max_bitmap_tag = 2**27
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.bitmap = zeros(0, dtype=bool)
+		self.large_tags = zeros(0, dtype=int64)
+		self.count = 0
+
+	def contains(self, tags):
+		"""
+		Return a boolean array telling which of tags are in the registry
+		"""
+		tags = _registry_tags(tags)
+		isin = zeros(len(tags), dtype=bool)
+		inrange = tags < len(self.bitmap)
+		isin[inrange] = self.bitmap[tags[inrange]]
+		large = tags >= self.max_bitmap_tag
+		if large.any():
+			isin[large], _ = _sorted_lookup(self.large_tags, tags[large])
+		return isin
+
+	def add(self, tags):
+		"""
+		Add tags to the registry (repeated tags are fine)
+		"""
+		tags = _registry_tags(tags)
+		tags = tags[~self.contains(tags)]
+		if len(tags) == 0:
+			return
+
+		large = tags >= self.max_bitmap_tag
+		if large.any():
+			newtags = unique(tags[large])
+			self.large_tags = union1d(self.large_tags, newtags)
+			self.count += len(newtags)
+			tags = tags[~large]
+			if len(tags) == 0:
+				return
+
+		maxtag = tags.max()
+		if maxtag >= len(self.bitmap):
+			newsize = min(max(maxtag + 1, 2*len(self.bitmap)), self.max_bitmap_tag)
+			bitmap = zeros(newsize, dtype=bool)
+			bitmap[:len(self.bitmap)] = self.bitmap
+			self.bitmap = bitmap
+		newtags = unique(tags)
+		self.bitmap[newtags] = True
+		self.count += len(newtags)
 
-	return the_physical_groups_map
+	def tags(self):
+		"""
+		Sorted array of registered tags
+		"""
+		return concatenate((flatnonzero(self.bitmap), self.large_tags))
 
+	def __len__(self):
+		return self.count
 
 
+def _registry_tags(tags):
+	#Tags as an int64 array. Negative tags would index the bitmap from its end
+	tags = array(tags, dtype=int64).reshape(-1)
+	if len(tags) > 0 and tags.min() < 0:
+		raise ValueError(f"TagRegistry: tags should not be negative, got {tags[tags < 0][:10].tolist()}")
+	return tags
@@ -5,20 +5,22 @@
 # 2022 - Jose A. Abell M. - www.joseabell.com
 
 import os
+import weakref
+import warnings
 
-if os.name == 'nt':
-    import openseespy.opensees as ops
-else:   #not checked in mac
-    import opensees as ops
+from gmsh2opensees.g2o_backend import ops, add_ops_hook
 
 
 
-from numpy import array, int32, double, concatenate, unique, setdiff1d, zeros, cos, sin, pi, sqrt
+from numpy import array, asarray, int32, double, concatenate, unique, setdiff1d, zeros, cos, sin, pi, isin
 from numpy.linalg import norm
-from gmsh2opensees.g2o_nodes_functions import get_all_nodes, get_displacements_at_nodes, get_eigenvector_at_nodes
+from gmsh2opensees.g2o_nodes_functions import get_all_nodes, get_displacements_at_nodes, unique_node_tags, get_nodal_responses, \
+    get_modal_data, _output_buffer
+from gmsh2opensees.g2o_writers import write_msh_header, write_msh_node_data
+from gmsh2opensees.g2o_skin import skin_node_tags
 
 
-def visualize_displacements_in_gmsh(gmshmodel, nodeTags=[], viewnum=-1,step=0,time=0.,new_view_name="Displacements", component=-1):
+def visualize_displacements_in_gmsh(gmshmodel, nodeTags=[], viewnum=-1,step=0,time=0.,new_view_name="Displacements", component=-1, data=None, surface_only=False):
     """
     Visualize displacement field in gmsh, only for defined nodes.
     If view-number is not supplied, will create a new view. 
@@ -30,6 +32,13 @@ def visualize_displacements_in_gmsh(gmshmodel, nodeTags=[], viewnum=-1,step=0,ti
     Call once per time-step.
 
     You can also change the default name of the view 
+
+    Pass data, an (Nnodes, ndf) array for the sorted nodeTags (say, one step of
+    ModalModel.nodal_response), to show it instead of the opensees displacements.
+
+    With surface_only=True only the nodes on the boundary of the 3D elements are shown
+    (or on the boundary of a physical group, if surface_only is its name), see g2o_skin.
+    Interior nodes can't be seen anyway, and are most of the data.
     """
     import gmsh
 
@@ -37,7 +46,19 @@ def visualize_displacements_in_gmsh(gmshmodel, nodeTags=[], viewnum=-1,step=0,ti
         allGmshNodeTags, _ = get_all_nodes(gmshmodel)    
     else:
         allGmshNodeTags = nodeTags
-    displacement_data = get_displacements_at_nodes(allGmshNodeTags, component)
+    #Data comes out sorted by tag
+    allGmshNodeTags = unique_node_tags(allGmshNodeTags)
+    if data is not None:
+        data = asarray(data, dtype=double).reshape((len(allGmshNodeTags), -1))
+    if surface_only:
+        on_surface = isin(allGmshNodeTags, skin_node_tags(gmshmodel, surface_only))
+        allGmshNodeTags = allGmshNodeTags[on_surface]
+        if data is not None:
+            data = data[on_surface]
+    if data is None:
+        displacement_data = get_displacements_at_nodes(allGmshNodeTags, component)
+    else:
+        displacement_data = data
 
     if viewnum==-1:
         viewnum = gmsh.view.add(new_view_name)
@@ -57,6 +78,188 @@ def visualize_displacements_in_gmsh(gmshmodel, nodeTags=[], viewnum=-1,step=0,ti
 
 
 
+#Default gmsh view names for each nodal field
+nodal_response_view_names = {
+    "disp"        : "Displacements",
+    "vel"         : "Velocities",
+    "accel"       : "Accelerations",
+    "reaction"    : "Reactions",
+    "eigenvector" : "Eigenvector",
+}
+
+
+def visualize_nodal_responses_in_gmsh(gmshmodel, fields=("disp", "vel", "accel"), nodeTags=[], viewnums=[], step=0, time=0., ndf=3, mode=1, surface_only=False):
+    """
+    Same as visualize_displacements_in_gmsh, but for several nodal fields at once (see 
+    get_nodal_responses). The fields are extracted in a single pass over the nodes and 
+    one view per field is created (or updated, if viewnums is given). 
+
+    Call once per time-step. Returns the view numbers, in the same order as fields.
+    """
+    import gmsh
+
+    if surface_only:
+        allGmshNodeTags = skin_node_tags(gmshmodel, surface_only, nodeTags)
+    elif len(nodeTags) == 0:
+        allGmshNodeTags, _ = get_all_nodes(gmshmodel)    
+    else:
+        allGmshNodeTags = nodeTags
+    allGmshNodeTags = unique_node_tags(allGmshNodeTags)
+    nodal_data = get_nodal_responses(allGmshNodeTags, fields, ndf=ndf, mode=mode)
+
+    if len(viewnums)==0:
+        viewnums = [gmsh.view.add(nodal_response_view_names[field]) for field in fields]
+
+    for i in range(len(fields)):
+        gmsh.view.addHomogeneousModelData(
+            tag=viewnums[i], 
+            step=step,
+            time=time, 
+            modelName=gmsh.model.getCurrent(),
+            dataType="NodeData",
+            numComponents=-1,
+            tags=allGmshNodeTags,
+            data=nodal_data[:,i,:].reshape((-1))
+        )
+
+    return viewnums
+
+
+
+class DisplacementsRecorder:
+    """
+    Streaming version of visualize_displacements_in_gmsh for long analyses. Call record()
+    once per analysis step (inside the analysis loop). Every `every` steps the nodal 
+    displacements are stored in a fixed, preallocated buffer, and every `flush_every` stored
+    steps the buffer is written to disk as $NodeData blocks, so the history is never 
+    kept in memory (or in gmsh). Use it as a context manager, so the last steps are
+    written when the loop ends (or raises):
+
+        with g2o.DisplacementsRecorder("displacements.msh", gmsh.model, every=10) as recorder:
+            for step in range(Nsteps):
+                ops.analyze(1, dt)
+                recorder.record()
+
+    or call close() at the end. Steps still buffered are also written if the recorder is
+    garbage collected or the interpreter exits without either.
+
+    The output is an MSH file with only data, open it in gmsh together with the mesh: 
+
+        gmsh example2.msh displacements.msh
+
+    With split_files=True each stored step goes to its own file instead (filename with 
+    the step number appended before the extension). binary=True writes binary MSH, which
+    is faster and smaller (see g2o_writers.write_msh_node_data).
+
+    If nodeTags is not given, all the nodes in gmshmodel are recorded. surface_only=True (or
+    a physical group name) keeps only the nodes on the boundary, as in 
+    visualize_displacements_in_gmsh.
+    """
+
+    def __init__(self, filename, gmshmodel=None, nodeTags=[], every=1, flush_every=100, name="Displacements", ndf=3, split_files=False, binary=False, surface_only=False):
+        if surface_only:
+            nodeTags = skin_node_tags(gmshmodel, surface_only, nodeTags)
+        elif len(nodeTags) == 0:
+            nodeTags, _ = get_all_nodes(gmshmodel)
+        self.nodeTags = unique_node_tags(nodeTags)
+        self.filename = filename
+        self.every = every
+        self.name = name
+        self.split_files = split_files
+        self.binary = binary
+
+        #Buffered steps live apart from the recorder, so the finalizer can write them
+        #without keeping the recorder alive
+        self._buffer = _RecorderBuffer(filename, name, self.nodeTags, flush_every, ndf, split_files, binary)
+        self._finalizer = weakref.finalize(self, self._buffer.flush)
+
+        self.ncalls = 0
+        self.nstored = 0
+
+        if not split_files:
+            with open(filename, "w" + self._buffer.mode) as f:
+                write_msh_header(f, binary)
+
+    @property
+    def nbuffered(self):
+        return self._buffer.nbuffered
+
+    def record(self, time=None):
+        """
+        Call once per analysis step. time defaults to ops.getTime()
+        """
+        self.ncalls += 1
+        if (self.ncalls - 1) % self.every != 0:
+            return
+
+        if time is None:
+            time = ops.getTime()
+
+        buffer = self._buffer
+        i = buffer.nbuffered
+        get_displacements_at_nodes(self.nodeTags, ndf=buffer.values.shape[2], out=buffer.values[i])
+        buffer.times[i] = time
+        buffer.steps[i] = self.nstored
+        buffer.nbuffered += 1
+        self.nstored += 1
+
+        if buffer.nbuffered == len(buffer.values):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered steps to disk
+        """
+        self._buffer.flush()
+
+    def close(self):
+        """
+        Write the buffered steps to disk. Steps recorded afterwards are only written by flush().
+        """
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+
+
+class _RecorderBuffer:
+    #Steps of a DisplacementsRecorder not yet written to disk
+
+    def __init__(self, filename, name, nodeTags, flush_every, ndf, split_files, binary):
+        self.filename = filename
+        self.name = name
+        self.nodeTags = nodeTags
+        self.split_files = split_files
+        self.binary = binary
+        self.mode = "b" if binary else ""
+
+        self.values = zeros((flush_every, len(nodeTags), ndf))
+        self.times = zeros(flush_every)
+        self.steps = zeros(flush_every, dtype=int)
+        self.nbuffered = 0
+
+    def flush(self):
+        if self.nbuffered == 0:
+            return
+        if self.split_files:
+            root, ext = os.path.splitext(self.filename)
+            for i in range(self.nbuffered):
+                with open(f"{root}_{self.steps[i]}{ext}", "w" + self.mode) as f:
+                    write_msh_header(f, self.binary)
+                    write_msh_node_data(f, self.name, self.nodeTags, self.values[i], step=self.steps[i], time=self.times[i], binary=self.binary)
+        else:
+            with open(self.filename, "a" + self.mode) as f:
+                for i in range(self.nbuffered):
+                    write_msh_node_data(f, self.name, self.nodeTags, self.values[i], step=self.steps[i], time=self.times[i], binary=self.binary)
+        self.nbuffered = 0
+
+
+
 def visualize_eigenmode_in_gmsh(gmshmodel, mode=1, f=0, viewnum=-1,step=0,time=0.,new_view_name="Mode",animate=False,normalize=True, nsteps=10, factor=0.):
     """
     Visualize eigenvector displacement field in gmsh, only for defined nodes.
@@ -69,11 +272,19 @@ def visualize_eigenmode_in_gmsh(gmshmodel, mode=1, f=0, viewnum=-1,step=0,time=0
     Call once per time-step.
 
     You can also change the default name of the view 
+
+    The eigenvectors come from the cached modal data (see get_modal_data), so plotting
+    modes one after the other does not read the nodes or eigenvectors again. 
+    
+    animate=True (deprecated) stores nsteps copies of the mode scaled by cos(2 pi step/nsteps)
+    as steps of the view, as before. Rather play the view with animate_eigenmodes_in_gmsh, 
+    which keeps this view as it is and uses gmsh's own animation. For several modes use 
+    visualize_eigenmodes_in_gmsh. 
     """
     import gmsh
 
-    allGmshNodeTags, coords = get_all_nodes(gmshmodel)
-    eigenvector_data = get_eigenvector_at_nodes(allGmshNodeTags, mode)
+    modal_data = get_modal_data(gmshmodel, [mode])
+    eigenvector_data = modal_data["matrix"][0]
 
     if viewnum==-1:
         viewnum = gmsh.view.add(new_view_name + f" {mode} {f=}")
@@ -83,16 +294,19 @@ def visualize_eigenmode_in_gmsh(gmshmodel, mode=1, f=0, viewnum=-1,step=0,time=0
         gmsh.view.addHomogeneousModelData(
             tag=viewnum, 
             step=step,
-            time=time, 
+            time=float(time), 
             modelName=gmsh.model.getCurrent(),
             dataType="NodeData",
             numComponents=-1,
-            tags=allGmshNodeTags,
+            tags=modal_data["nodeTags"],
             data=eigenvector_data.reshape((-1))
         )
 
     else:
 
+        warnings.warn("visualize_eigenmode_in_gmsh: animate=True is deprecated, use animate_eigenmodes_in_gmsh on the view",
+            DeprecationWarning, stacklevel=2)
+
         for step in range(nsteps):
             gmsh.view.addHomogeneousModelData(
                 tag=viewnum, 
@@ -101,26 +315,119 @@ def visualize_eigenmode_in_gmsh(gmshmodel, mode=1, f=0, viewnum=-1,step=0,time=0
                 modelName=gmsh.model.getCurrent(),
                 dataType="NodeData",
                 numComponents=-1,
-                tags=allGmshNodeTags,
+                tags=modal_data["nodeTags"],
                 data=(eigenvector_data*cos(step/nsteps*2*pi)).reshape((-1))
             )
 
     gmsh.view.option.setNumber(viewnum, "VectorType", 5)
 
-
     if factor == 0:
-        dx = coords[:,0].max() - coords[:,0].min()
-        dy = coords[:,1].max() - coords[:,1].min()
-        dz = coords[:,2].max() - coords[:,2].min()
         eigenmax = abs(eigenvector_data).max()
-        factor = 0.1 * sqrt(dx**2 + dy**2 + dz**2) / eigenmax
+        factor = 0.1 * modal_data["size"] / eigenmax
+
+    gmsh.view.option.setNumber(viewnum, "DisplacementFactor", factor)
+
+    return viewnum
+
+
+
+def visualize_eigenmodes_in_gmsh(gmshmodel, modes=(1,2,3), frequencies=None, viewnum=-1, new_view_name="Modes", normalize=True, factor=0., ndf=3):
+    """
+    Several eigenmodes in a single gmsh view, one time step per mode (step i is modes[i], 
+    its time is the frequency of the mode if frequencies are given, else the mode number). 
+    Pick the mode with the time step slider, and play it with animate_eigenmodes_in_gmsh.
+
+    All modes are read from opensees in one pass, and cached (see get_modal_data). With 
+    normalize=True every mode is scaled to a largest component of 1, so the same
+    DisplacementFactor (factor, default 10% of the model size) suits all of them.
+
+    Returns the view number.
+    """
+    import gmsh
+
+    modal_data = get_modal_data(gmshmodel, modes, ndf)
+    matrix = modal_data["matrix"]
+
+    if normalize:
+        amplitudes = abs(matrix).reshape((len(modes), -1)).max(axis=1)
+        amplitudes[amplitudes == 0] = 1.
+        matrix = matrix / amplitudes[:,None,None]
+
+    if viewnum==-1:
+        viewnum = gmsh.view.add(new_view_name)
+
+    for step, mode in enumerate(modes):
+        gmsh.view.addHomogeneousModelData(
+            tag=viewnum, 
+            step=step,
+            time=float(mode if frequencies is None else frequencies[step]), 
+            modelName=gmsh.model.getCurrent(),
+            dataType="NodeData",
+            numComponents=-1,
+            tags=modal_data["nodeTags"],
+            data=matrix[step].reshape((-1))
+        )
+
+    gmsh.view.option.setNumber(viewnum, "VectorType", 5)
+
+    if factor == 0:
+        factor = 0.1 * modal_data["size"] / max(abs(matrix).max(), 1e-300)
 
     gmsh.view.option.setNumber(viewnum, "DisplacementFactor", factor)
 
     return viewnum
 
 
-def visualize_eleResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step=0,time=0.,new_view_name=f"eleResponse"):
+
+def animate_eigenmodes_in_gmsh(viewnum, factor=None, period=1., nframes=16, new_view_name=None):
+    """
+    Set up gmsh to play the mode shown in view viewnum (the current time step, for views made
+    with visualize_eigenmodes_in_gmsh) as a harmonic oscillation. A new view gets nframes
+    time steps, the mode scaled by cos(2 pi t / period), and gmsh's own animation plays
+    them (General.AnimationCycle = 0 and General.AnimationDelay = period/nframes). viewnum
+    is hidden and left as it is, the other modes stay in it.
+
+    The call returns at once, so it works in scripts: press play in the gmsh window (after
+    gmsh.fltk.run()), or step through the frames with View.TimeStep. factor defaults to the
+    DisplacementFactor of viewnum.
+
+    Only the mode being played is copied, nframes times. Returns the new view number.
+    """
+    import gmsh
+
+    if factor is None:
+        factor = gmsh.view.option.getNumber(viewnum, "DisplacementFactor")
+    step = int(gmsh.view.option.getNumber(viewnum, "TimeStep"))
+    dataType, tags, data, time, numComponents = gmsh.view.getHomogeneousModelData(viewnum, step)
+    data = asarray(data, dtype=double)
+
+    if new_view_name is None:
+        new_view_name = gmsh.view.option.getString(viewnum, "Name") + f" (step {step} animated)"
+    animation = gmsh.view.add(new_view_name)
+    for frame in range(nframes):
+        gmsh.view.addHomogeneousModelData(
+            tag=animation, 
+            step=frame,
+            time=period*frame/nframes, 
+            modelName=gmsh.model.getCurrent(),
+            dataType=dataType,
+            numComponents=numComponents,
+            tags=tags,
+            data=data*cos(2*pi*frame/nframes)
+        )
+
+    gmsh.view.option.setNumber(animation, "VectorType", 5)
+    gmsh.view.option.setNumber(animation, "DisplacementFactor", factor)
+    gmsh.view.option.setNumber(animation, "TimeStep", 0)
+    gmsh.view.option.setNumber(viewnum, "Visible", 0)
+    gmsh.option.setNumber("General.AnimationCycle", 0)
+    gmsh.option.setNumber("General.AnimationDelay", period/nframes)
+
+    return animation
+
+
+
+def visualize_eleResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step=0,time=0.,new_view_name=f"eleResponse", data=None, verbose=0, out=None):
     """
     Visualize a per-element field in gmsh, only for defined elements.
     If the eleResponse is a vector, will add as many views as vector
@@ -135,28 +442,25 @@ def visualize_eleResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step=0,t
     Call once per time-step.
 
     You can also change the default name of the view 
+
+    Instead of asking opensees, the data (Nelements x Ncomponents) can be passed directly,
+    for example read from an element recorder file with read_element_recorder. Otherwise
+    pass a preallocated array as out to reuse it every step (see get_eleResponse_at_elements).
     """
     import gmsh
 
+    if len(eleTags) == 0:
+        return viewnums
 
-    one_eleResponse_data = ops.eleResponse(eleTags[0], args)
-
-    print(f"eleResponse({args=}) for {eleTags[0]=} = {one_eleResponse_data}")
-
-    Ncomponents = len(one_eleResponse_data)
-    Nelements = len(eleTags)
-
-    eleResponse_data = zeros((Nelements, Ncomponents))
+    if data is None:
+        eleResponse_data = get_eleResponse_at_elements(eleTags, args, out=out, verbose=verbose)
+    else:
+        eleResponse_data = asarray(data).reshape((len(eleTags), -1))
 
-    for i, eleTag in enumerate(eleTags):
-        eleResponse_data[i,:] = ops.eleResponse(eleTag, args)
+    Ncomponents = eleResponse_data.shape[1]
 
     if len(viewnums)==0:
-        for i in range(Ncomponents):
-            viewnums.append(gmsh.view.add(new_view_name + f" {i}"))
-
-    #print(f"{eleTags=}")
-    #print(f"{eleResponse_data=}")
+        viewnums = [gmsh.view.add(new_view_name + f" {i}") for i in range(Ncomponents)]
 
     for i in range(Ncomponents):
         gmsh.view.addHomogeneousModelData(
@@ -172,7 +476,7 @@ def visualize_eleResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step=0,t
 
     return viewnums
 
-def visualize_eleNodeResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step=0,time=0.,new_view_name=f"eleResponse"):
+def visualize_eleNodeResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step=0,time=0.,new_view_name=f"eleResponse", data=None, verbose=0, out=None):
     """
     Visualize a per-element field in gmsh, only for defined elements.
     If the eleResponse is a vector, will add as many views as vector
@@ -187,41 +491,36 @@ def visualize_eleNodeResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step
     Call once per time-step.
 
     You can also change the default name of the view 
+
+    Instead of asking opensees, the data (Nelements x (numnodes*Ncomponents)) can be passed 
+    directly, for example read from an element recorder file with read_element_recorder.
+    Otherwise pass a preallocated array as out to reuse it every step (see 
+    get_eleResponse_at_elements).
     """
     import gmsh
 
+    if len(eleTags) == 0:
+        return viewnums
 
-    one_eleResponse_data = ops.eleResponse(eleTags[0], args)
-    one_eleNodes_data = ops.eleNodes(eleTags[0], args)
-    numnodes = len(one_eleNodes_data)
-
-    print(f"eleResponse({args=}) for {eleTags[0]=} {one_eleResponse_data=} {one_eleNodes_data=}")
+    numnodes = get_eleResponse_shape(eleTags[0], args)[1]
 
-    Ncomponents = len(one_eleResponse_data)//numnodes
-    Nelements = len(eleTags)
-
-    print(f"{numnodes=}")
-    print(f"{Ncomponents=}")
-    print(f"{Nelements=}")
+    if data is None:
+        eleResponse_data = get_eleResponse_at_elements(eleTags, args, out=out, verbose=verbose)
+    else:
+        eleResponse_data = asarray(data).reshape((len(eleTags), -1))
 
-    eleResponse_data = zeros((Nelements, len(one_eleResponse_data)))
+    Ncomponents = eleResponse_data.shape[1]//numnodes
 
-    for i, eleTag in enumerate(eleTags):
-        eleResponse_data[i,:] = ops.eleResponse(eleTag, args)
+    if verbose > 0:
+        print(f"{numnodes=}")
+        print(f"{Ncomponents=}")
+        print(f"Nelements={len(eleTags)}")
 
     if len(viewnums)==0:
-        for i in range(Ncomponents):
-            viewnums.append(gmsh.view.add(new_view_name + f" {i}"))
-
-    #print(f"{eleTags=}")
-    #print(f"{eleResponse_data=}")
+        viewnums = [gmsh.view.add(new_view_name + f" {i}") for i in range(Ncomponents)]
 
     for i in range(Ncomponents):
-        # thisdata=eleResponse_data[:,i::Ncomponents]
         thisdata=eleResponse_data[:,i::Ncomponents]
-        # aux = thisdata[:,9]
-        # thisdata[:,9] = thisdata[:,8]
-        # thisdata[:,8] = aux
         gmsh.view.addHomogeneousModelData(
             tag=viewnums[i], 
             step=step,
@@ -235,3 +534,132 @@ def visualize_eleNodeResponse_in_gmsh(gmshmodel, eleTags, args, viewnums=[],step
 
     return viewnums
 
+
+
+def visualize_nodal_average_in_gmsh(gmshmodel, elements, args, viewnums=[], step=0, time=0., new_view_name="Nodal average", data=None, npoints=1, at_nodes=False, weights="measure", surface_only=False, verbose=0, out=None):
+    """
+    Smoothed version of visualize_eleResponse_in_gmsh and visualize_eleNodeResponse_in_gmsh: the
+    element responses are averaged at the nodes, weighted by element volume (see NodalAverager),
+    and shown as NodeData, one view per component. Much less data for gmsh than ElementNodeData
+    (one value per node instead of one per element node) and a continuous field.
+
+    elements is a physical group name (its averager is cached, see get_nodal_averager) or a
+    NodalAverager. The responses are ops.eleResponse(eleTag, args) for its elementTags, unless
+    data (Nelements x values per element) is given. Each element gives npoints*Ncomponents values
+    (Gauss points, averaged over the element), or nnodes*Ncomponents with at_nodes=True.
+
+    surface_only works as in visualize_displacements_in_gmsh. out is passed to
+    get_eleResponse_at_elements, to reuse the same array every step.
+
+    Call once per time-step, returns the view numbers.
+    """
+    import gmsh
+    from gmsh2opensees.g2o_fields import get_nodal_averager
+
+    if isinstance(elements, str):
+        averager = get_nodal_averager(elements, gmshmodel, weights)
+    else:
+        averager = elements
+
+    if len(averager.elementTags) == 0:
+        return viewnums
+
+    if data is None:
+        data = get_eleResponse_at_elements(averager.elementTags, args, out=out, verbose=verbose)
+
+    nodal_data = averager.average(data, npoints=npoints, at_nodes=at_nodes)
+    Ncomponents = nodal_data.shape[1]
+
+    nodeTags = averager.nodeTags
+    if surface_only:
+        on_surface = isin(nodeTags, skin_node_tags(gmshmodel, surface_only))
+        nodeTags, nodal_data = nodeTags[on_surface], nodal_data[on_surface]
+
+    if len(viewnums)==0:
+        viewnums = [gmsh.view.add(new_view_name + f" {i}") for i in range(Ncomponents)]
+
+    for i in range(Ncomponents):
+        gmsh.view.addHomogeneousModelData(
+            tag=viewnums[i], 
+            step=step,
+            time=time, 
+            modelName=gmsh.model.getCurrent(),
+            dataType="NodeData",
+            numComponents=1,
+            tags=nodeTags,
+            data=nodal_data[:,i].copy()
+        )
+
+    return viewnums
+
+
+
+#Size of eleResponse and number of element nodes, per (element tag, response args). Cleared
+#on ops.wipe, as the same tag may then be another kind of element
+_eleResponse_shape_cache = {}
+
+add_ops_hook("wipe", _eleResponse_shape_cache.clear)
+
+
+def get_eleResponse_shape(eleTag, args):
+    """
+    Return the length of ops.eleResponse(eleTag, args) and the number of nodes of the 
+    element. Cached per element tag and response args, so it only probes opensees the 
+    first time. get_eleResponse_at_elements asks for the first element of the list, so 
+    calling it every step for the same elements costs a dict lookup.
+    """
+    key = _eleResponse_key(eleTag, args)
+    if key not in _eleResponse_shape_cache:
+        _eleResponse_shape_cache[key] = (len(ops.eleResponse(eleTag, args)), len(ops.eleNodes(eleTag)))
+    return _eleResponse_shape_cache[key]
+
+
+def get_eleResponse_at_elements(eleTags, args, out=None, verbose=0):
+    """
+    Return an (Nelements x Ncomponents) array with ops.eleResponse(eleTag, args) for all the 
+    elements in eleTags (which should all be of the same type). Pass a preallocated array 
+    as out to have it filled instead of allocating a new one (useful when calling this 
+    every time-step).
+    """
+    if len(eleTags) == 0:
+        raise ValueError("get_eleResponse_at_elements: eleTags is empty")
+
+    Ncomponents, numnodes = get_eleResponse_shape(eleTags[0], args)
+    Nelements = len(eleTags)
+
+    out = _output_buffer(out, (Nelements, Ncomponents))
+
+    eleResponse = ops.eleResponse
+    out[:,:] = [eleResponse(eleTag, args) for eleTag in asarray(eleTags).tolist()]
+
+    if verbose > 0:
+        print(f"eleResponse({args=}) for {eleTags[0]=} = {out[0]}")
+
+    return out
+
+
+def _eleResponse_key(eleTag, args):
+    if not isinstance(args, str):
+        args = tuple(args)
+    return (int(eleTag), args)
+
+
+def read_element_recorder(filename, Nelements, with_time=False):
+    """
+    Read an opensees element recorder file (say one created with 
+    ops.recorder('Element', '-file', filename, '-time', '-ele', *eleTags, 'stresses'))
+    one step at a time. Yields (time, data) for each step, with data an array of shape 
+    (Nelements, values per element) that can be passed to visualize_eleResponse_in_gmsh.
+    time is None unless the recorder was created with '-time' (then use with_time=True).
+
+    Only one line of the file is held in memory at a time. 
+    """
+    with open(filename, "r") as f:
+        for line in f:
+            values = array(line.split(), dtype=double)
+            if len(values) == 0:
+                continue
+            time = None
+            if with_time:
+                time, values = values[0], values[1:]
+            yield time, values.reshape((Nelements, -1))
@@ -0,0 +1,297 @@
+# Set of helper functions to interface gmsh with opensees
+#
+# Questions to jaabell@uandes.cl
+#
+# 2022 - Jose A. Abell M. - www.joseabell.com
+#
+# Writers for results, straight to files (no gmsh session needed)
+
+import os
+import xml.sax.saxutils
+
+from numpy import array, asarray, int32, int64, uint8, double, zeros, empty, column_stack, savetxt, \
+	concatenate, cumsum, full, argsort, searchsorted, ascontiguousarray
+
+
+
+
+def write_msh_header(f, binary=False):
+	"""
+	Write the $MeshFormat header of an MSH 4.1 file. A file with just the header and data
+	blocks can be merged in gmsh on top of the mesh it refers to. With binary=True, f must
+	be opened in binary mode ("wb") and the data blocks written with binary=True too.
+	"""
+	if binary:
+		f.write(b"$MeshFormat\n4.1 1 8\n")
+		f.write(array([1], dtype=int32).tobytes())
+		f.write(b"\n$EndMeshFormat\n")
+	else:
+		f.write("$MeshFormat\n4.1 0 8\n$EndMeshFormat\n")
+
+
+
+
+def write_msh_node_data(f, name, nodeTags, data, step=0, time=0., binary=False):
+	"""
+	Write one $NodeData block (MSH 4.1) to the open file f. data is an (Nnodes,) or
+	(Nnodes, ncomponents) array, in the same order as nodeTags. gmsh only takes 1, 3 (vector)
+	or 9 (tensor) components, 2-component data is padded with zeros to 3. Call it once per
+	time step (with different step and time) to have all steps in one file.
+
+	binary=True writes the values as raw bytes (one buffer write per block, much faster
+	and smaller than text), see write_msh_header.
+	"""
+	_write_msh_data_block(f, "NodeData", name, nodeTags, data, step, time, binary)
+
+
+
+
+def write_msh_element_data(f, name, elementTags, data, step=0, time=0., binary=False):
+	"""
+	Same as write_msh_node_data, but writes an $ElementData block: one value (or vector,
+	or tensor) per element, in the same order as elementTags.
+	"""
+	_write_msh_data_block(f, "ElementData", name, elementTags, data, step, time, binary)
+
+
+
+
+def _write_msh_data_block(f, blockname, name, tags, data, step, time, binary=False):
+	tags = asarray(tags, dtype=int64).reshape(-1)
+	data = asarray(data, dtype=double).reshape((len(tags),-1))
+
+	ncomponents = data.shape[1]
+	if ncomponents == 2:
+		data = column_stack((data, zeros(len(tags))))
+		ncomponents = 3
+	if ncomponents not in (1, 3, 9):
+		raise ValueError(f"{blockname} {name!r}: gmsh only supports 1, 3 or 9 components, got {ncomponents}")
+
+	header = (f"${blockname}\n"
+		f"1\n\"{name}\"\n"
+		f"1\n{float(time)!r}\n"
+		f"3\n{int(step)}\n{ncomponents}\n{len(tags)}\n")
+
+	if binary:
+		#Tags are ints (4 bytes) in MSH 4.1 data blocks, followed by the values of each entity
+		records = empty(len(tags), dtype=[("tag", int32), ("values", double, (ncomponents,))])
+		records["tag"] = tags
+		records["values"] = data
+		f.write(header.encode())
+		f.write(records.tobytes())
+		f.write(f"\n$End{blockname}\n".encode())
+	else:
+		f.write(header)
+		savetxt(f, column_stack((tags, data)), fmt="%d" + " %.17g"*ncomponents)
+		f.write(f"$End{blockname}\n")
+
+
+
+
+#gmsh element type -> (VTK cell type, order of the gmsh nodes in the VTK cell, None if the same)
+vtk_cell_types = {
+	1  : (3,  None),   # line
+	2  : (5,  None),   # triangle
+	3  : (9,  None),   # quadrangle
+	4  : (10, None),   # tetrahedron
+	5  : (12, None),   # hexahedron
+	6  : (13, None),   # prism (wedge)
+	7  : (14, None),   # pyramid
+	8  : (21, None),   # 3-node line
+	9  : (22, None),   # 6-node triangle
+	10 : (28, None),   # 9-node quadrangle
+	11 : (24, [0, 1, 2, 3, 4, 5, 6, 7, 9, 8]),   # 10-node tetrahedron, last two edge nodes swapped
+	12 : (29, [0, 1, 2, 3, 4, 5, 6, 7, 8, 11, 13, 9, 16, 18, 19, 17, 10, 12, 14, 15, 22, 23, 21, 24, 20, 25, 26]),   # 27-node hexahedron
+	15 : (1,  None),   # point
+	16 : (23, None),   # 8-node quadrangle
+	17 : (25, [0, 1, 2, 3, 4, 5, 6, 7, 8, 11, 13, 9, 16, 18, 19, 17, 10, 12, 14, 15]),   # 20-node hexahedron
+}
+
+
+
+
+def write_vtu(filename, nodeTags, coords, blocks, point_data={}, cell_data={}):
+	"""
+	Write an unstructured grid to a VTK XML file (.vtu, opens in paraview), with all arrays
+	in one appended raw binary section, written straight from the numpy buffers.
+
+		nodeTags, coords: the nodes, (Nnodes,) and (Nnodes, 3), say from get_all_nodes
+		blocks: the cells, as returned by get_element_blocks_in_physical_group (a dict
+		        elementType -> (elementTags, connectivity)), or a list of such dicts
+		point_data: dict name -> (Nnodes,) or (Nnodes, ncomponents) array, same order as nodeTags
+		cell_data: dict name -> (Ncells,) or (Ncells, ncomponents) array, cells in the order of
+		           blocks (concatenated elementTags of each block)
+
+	The gmsh tags are also written, as point data "gmsh_node_tag" and cell data
+	"gmsh_element_tag". Node ordering of second order cells is translated to VTK's.
+	"""
+	nodeTags = asarray(nodeTags, dtype=int64).reshape(-1)
+	coords = asarray(coords, dtype=double).reshape((-1,3))
+
+	_write_vtu_file(filename, nodeTags, coords, _vtu_cells(nodeTags, blocks), point_data, cell_data)
+
+
+
+
+def _vtu_cells(nodeTags, blocks):
+	#Element tags, connectivity (as point indices), offsets and VTK types of the cells in blocks
+	if isinstance(blocks, dict):
+		blocks = [blocks]
+
+	#Connectivity as point indices, cell by cell
+	order = argsort(nodeTags, kind="stable")
+	sorted_tags = nodeTags[order]
+	element_tags = []
+	connectivity = []
+	offsets = []
+	types = []
+	for block in blocks:
+		for elementType, (elementTags, conn) in block.items():
+			if elementType not in vtk_cell_types:
+				raise ValueError(f"write_vtu: no VTK cell for gmsh {elementType=}")
+			cell_type, node_order = vtk_cell_types[elementType]
+			conn = asarray(conn, dtype=int64).reshape((len(elementTags), -1))
+			if node_order is not None:
+				conn = conn[:, node_order]
+			rows = searchsorted(sorted_tags, conn)
+			rows[rows == len(sorted_tags)] = 0
+			if len(sorted_tags) == 0 or (sorted_tags[rows] != conn).any():
+				raise KeyError(f"write_vtu: cells of gmsh {elementType=} have nodes not in nodeTags")
+			element_tags.append(asarray(elementTags, dtype=int64))
+			connectivity.append(order[rows].reshape(-1))
+			offsets.append(full(len(conn), conn.shape[1], dtype=int64))
+			types.append(full(len(conn), cell_type, dtype=uint8))
+
+	element_tags = concatenate(element_tags) if len(element_tags) > 0 else zeros(0, dtype=int64)
+	connectivity = concatenate(connectivity) if len(connectivity) > 0 else zeros(0, dtype=int64)
+	offsets = cumsum(concatenate(offsets)) if len(offsets) > 0 else zeros(0, dtype=int64)
+	types = concatenate(types) if len(types) > 0 else zeros(0, dtype=uint8)
+
+	return element_tags, connectivity, offsets, types
+
+
+
+
+def _write_vtu_file(filename, nodeTags, coords, cells, point_data, cell_data):
+	element_tags, connectivity, offsets, types = cells
+
+	point_arrays = [("gmsh_node_tag", nodeTags)] + [(name, _data_rows(name, values, len(nodeTags))) for name, values in point_data.items()]
+	cell_arrays = [("gmsh_element_tag", element_tags)] + [(name, _data_rows(name, values, len(element_tags))) for name, values in cell_data.items()]
+
+	appended = []
+	offset = 0
+	def data_array(name, values, ncomponents=None):
+		#XML tag for one array, its data goes to the appended section
+		nonlocal offset
+		values = asarray(values)
+		if ncomponents is None:
+			ncomponents = 1 if values.ndim == 1 else values.shape[1]
+		appended.append(values)
+		tag = (f'<DataArray type="{_vtk_types[values.dtype.str[1:]]}" Name={xml.sax.saxutils.quoteattr(name)} '
+			f'NumberOfComponents="{ncomponents}" format="appended" offset="{offset}"/>\n')
+		offset += 8 + values.nbytes
+		return tag
+
+	xml_text = ['<?xml version="1.0"?>\n'
+		'<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+		'<UnstructuredGrid>\n'
+		f'<Piece NumberOfPoints="{len(nodeTags)}" NumberOfCells="{len(element_tags)}">\n']
+	xml_text.append('<PointData>\n')
+	xml_text += [data_array(name, values) for name, values in point_arrays]
+	xml_text.append('</PointData>\n<CellData>\n')
+	xml_text += [data_array(name, values) for name, values in cell_arrays]
+	xml_text.append('</CellData>\n<Points>\n')
+	xml_text.append(data_array("Points", coords, 3))
+	xml_text.append('</Points>\n<Cells>\n')
+	xml_text.append(data_array("connectivity", connectivity))
+	xml_text.append(data_array("offsets", offsets))
+	xml_text.append(data_array("types", types))
+	xml_text.append('</Cells>\n</Piece>\n</UnstructuredGrid>\n<AppendedData encoding="raw">\n_')
+
+	with open(filename, "wb") as f:
+		f.write("".join(xml_text).encode())
+		for values in appended:
+			values = ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+			array([values.nbytes], dtype="<u8").tofile(f)
+			values.tofile(f)
+		f.write(b"\n</AppendedData>\n</VTKFile>\n")
+
+
+_vtk_types = {
+	"f8" : "Float64", "f4" : "Float32",
+	"i8" : "Int64", "i4" : "Int32", "i2" : "Int16", "i1" : "Int8",
+	"u8" : "UInt64", "u4" : "UInt32", "u2" : "UInt16", "u1" : "UInt8",
+	"b1" : "UInt8",
+}
+
+
+def _data_rows(name, values, nrows):
+	#Data arrays as (nrows,) or (nrows, ncomponents)
+	values = asarray(values)
+	if values.dtype.kind not in "fiub":
+		values = values.astype(double)
+	if values.shape[:1] != (nrows,) or values.ndim > 2:
+		raise ValueError(f"write_vtu: {name!r} has shape {values.shape}, expected ({nrows},) or ({nrows}, ncomponents)")
+	return values.astype(uint8) if values.dtype.kind == "b" else values
+
+
+
+
+def write_pvd(filename, files, times):
+	"""
+	Write a paraview collection (.pvd) of the files (say, .vtu files from write_vtu), one per
+	time in times. Paths are written relative to the .pvd file.
+	"""
+	root = os.path.dirname(os.path.abspath(filename))
+	with open(filename, "w") as f:
+		f.write('<?xml version="1.0"?>\n<VTKFile type="Collection" version="1.0" byte_order="LittleEndian">\n<Collection>\n')
+		for time, file in zip(times, files):
+			path = os.path.relpath(os.path.abspath(file), root)
+			f.write(f'<DataSet timestep="{float(time)!r}" part="0" file={xml.sax.saxutils.quoteattr(path)}/>\n')
+		f.write('</Collection>\n</VTKFile>\n')
+
+
+
+
+class VtuSeriesWriter:
+	"""
+	Time history of results as a series of .vtu files (basename_0.vtu, basename_1.vtu, ...)
+	collected in basename.pvd, which paraview opens as one animated dataset. The mesh
+	(nodeTags, coords, blocks, see write_vtu) is given once, then call write once per step:
+
+		with g2o.VtuSeriesWriter("results/beam", nodeTags, coords, blocks) as writer:
+			for step in range(Nsteps):
+				ops.analyze(1)
+				writer.write(ops.getTime(), point_data={"Displacements": g2o.get_displacements_at_nodes(nodeTags)})
+
+	The .pvd file is rewritten after each step, so it can be opened while the analysis runs.
+	"""
+
+	def __init__(self, basename, nodeTags, coords, blocks):
+		self.basename = basename
+		self.nodeTags = asarray(nodeTags, dtype=int64).reshape(-1)
+		self.coords = asarray(coords, dtype=double).reshape((-1,3))
+		self.cells = _vtu_cells(self.nodeTags, blocks)
+		self.files = []
+		self.times = []
+		directory = os.path.dirname(os.path.abspath(basename))
+		os.makedirs(directory, exist_ok=True)
+
+	def write(self, time, point_data={}, cell_data={}):
+		"""
+		Write one step, and update the .pvd file
+		"""
+		filename = f"{self.basename}_{len(self.files)}.vtu"
+		_write_vtu_file(filename, self.nodeTags, self.coords, self.cells, point_data, cell_data)
+		self.files.append(filename)
+		self.times.append(time)
+		write_pvd(f"{self.basename}.pvd", self.files, self.times)
+
+	def close(self):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
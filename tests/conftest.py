@@ -0,0 +1,44 @@
+# Smoke tests of gmsh2opensees, run with python -m pytest from the root of the repository.
+#
+# They use the MSH files in examples/ (read with read_msh, no gmsh needed) and a
+# RecordingBackend instead of opensees, so they run anywhere numpy and scipy do.
+
+import os
+
+import pytest
+
+import gmsh2opensees as g2o
+from gmsh2opensees.g2o_backend import ops
+
+
+examples_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+example_meshes = ["example1.msh", "example2.msh", "example3.msh"]
+
+
+
+
+@pytest.fixture
+def backend():
+	#RecordingBackend with a wiped model, no node numbering and no local partition
+	backend = g2o.set_backend("recording")
+	ops.wipe()
+	g2o.set_node_numbering(None)
+	g2o.set_local_partition(None, None)
+	yield backend
+	g2o.set_node_numbering(None)
+	g2o.set_local_partition(None, None)
+
+
+@pytest.fixture(params=example_meshes)
+def example_path(request):
+	return os.path.join(examples_dir, request.param)
+
+
+@pytest.fixture(params=example_meshes)
+def example_model(request):
+	return g2o.read_msh(os.path.join(examples_dir, request.param))
+
+
+@pytest.fixture
+def example1():
+	return g2o.read_msh(os.path.join(examples_dir, "example1.msh"))
@@ -0,0 +1,66 @@
+# Nodal averages of element fields
+
+import pytest
+from numpy import zeros, ones, tile, repeat
+from numpy.random import default_rng
+from numpy.testing import assert_allclose, assert_array_equal
+
+import gmsh2opensees as g2o
+
+
+
+
+def loop_average(averager, blocks, values):
+	#Reference: sum_e w_e v_e / sum_e w_e at each node, one element at a time
+	sums = {}
+	weights = {}
+	row = 0
+	for elementType, (elementTags, connectivity) in blocks.items():
+		for nodes in connectivity:
+			for node in nodes:
+				sums[node] = sums.get(node, 0.) + averager.weights[row] * values[row]
+				weights[node] = weights.get(node, 0.) + averager.weights[row]
+			row += 1
+	return [sums[node] / weights[node] for node in averager.nodeTags]
+
+
+@pytest.mark.parametrize("weights", ["measure", "count"])
+def test_average_matches_loop(example_model, weights):
+	blocks = g2o.get_element_blocks_in_physical_group("Solid", example_model)
+	averager = g2o.NodalAverager(blocks, example_model, weights)
+	assert_array_equal(averager.elementTags, blocks[4][0])
+	assert (averager.weights > 0).all()
+	if weights == "count":
+		assert (averager.weights == 1).all()
+
+	values = default_rng(0).standard_normal((len(averager.elementTags), 6))
+	assert_allclose(averager.average(values), loop_average(averager, blocks, values))
+
+
+def test_constant_fields(example1):
+	averager = g2o.NodalAverager("Solid", example1)
+	Nelements, Nnodes = len(averager.elementTags), len(averager.nodeTags)
+
+	#Gauss point values (4 points, 3 components) of a constant field
+	values = tile([1., 2., 3.], (Nelements, 4))
+	assert_allclose(averager.average(values, npoints=4), tile([1., 2., 3.], (Nnodes, 1)))
+
+	#Values at the element nodes that only depend on the node come back as they are
+	connectivity = g2o.get_element_blocks_in_physical_group("Solid", example1)[4][1]
+	at_nodes = repeat(connectivity.reshape((-1, 1)), 2, axis=1) * [1., -1.]
+	averages = averager.average(at_nodes.reshape((Nelements, -1)), at_nodes=True)
+	assert_allclose(averages[:,0], averager.nodeTags)
+	assert_allclose(averages[:,1], -averager.nodeTags)
+
+
+def test_out_and_cache(example1):
+	averager = g2o.get_nodal_averager("Solid", example1)
+	assert g2o.get_nodal_averager("Solid", example1) is averager
+
+	out = zeros((len(averager.nodeTags), 1))
+	result = averager.average(ones(len(averager.elementTags)), out=out)
+	assert result is out
+	assert_allclose(out, 1.)
+
+	with pytest.raises(ValueError):
+		g2o.NodalAverager("Solid", example1, weights="mass")
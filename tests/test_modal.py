@@ -0,0 +1,105 @@
+# Modal superposition: the lfilter recurrence against the time step loop and exact solutions
+
+import sys
+
+import pytest
+from numpy import array, arange, ones, zeros, sqrt, exp, sin, cos, pi, einsum
+from numpy.random import default_rng
+from numpy.testing import assert_allclose
+
+import gmsh2opensees as g2o
+from gmsh2opensees.g2o_backend import RecordingBackend
+from gmsh2opensees.g2o_modal import _nigam_jennings_coefficients
+
+
+frequencies = array([1., 3., 7.])
+damping = array([0.02, 0.05, 0.1])
+
+
+
+
+class ModalBackend(RecordingBackend):
+	#Eigenvectors and nodal masses for a RecordingBackend, made up from the node tags
+	def nodeEigenvector(self, tag, mode, *args):
+		return [sin(0.1*tag*mode), cos(0.1*tag*mode), 0.01*mode]
+
+	def nodeMass(self, tag, *args):
+		return [2., 2., 2.]
+
+
+@pytest.fixture
+def modal(example1):
+	g2o.set_backend(ModalBackend())
+	g2o.ops.wipe()
+	nodeTags, coords = g2o.get_all_nodes(example1)
+	g2o.add_nodes_to_ops(nodeTags[nodeTags > 10], example1)
+	yield g2o.ModalModel(example1, (2*pi*frequencies)**2, damping=damping)
+	g2o.set_backend("recording")
+
+
+def loop_response(modal, p, dt):
+	#Time step loop of the Nigam-Jennings recurrence, mode by mode
+	A, B, C, D, Ap, Bp, Cp, Dp = _nigam_jennings_coefficients(modal.omega, modal.damping, dt)
+	q = zeros(p.shape)
+	qdot = zeros(p.shape)
+	for i in range(len(p) - 1):
+		q[i+1] = A*q[i] + B*qdot[i] + C*p[i] + D*p[i+1]
+		qdot[i+1] = Ap*q[i] + Bp*qdot[i] + Cp*p[i] + Dp*p[i+1]
+	return q, qdot
+
+
+
+
+def test_modal_model(modal, example1):
+	nodeTags = g2o.get_all_nodes(example1)[0]
+	assert (modal.nodeTags == sorted(nodeTags[nodeTags > 10])).all()
+	assert modal.matrix.shape == (3, len(modal.nodeTags), 3)
+	assert_allclose(modal.frequencies, frequencies)
+	assert_allclose(modal.total_masses, 2*len(modal.nodeTags))
+	assert_allclose(modal.generalized_masses, einsum("mnd,mnd->m", modal.matrix, modal.matrix)*2)
+
+	subset = g2o.ModalModel(example1, (2*pi*frequencies)**2, nodeTags=[11, 12, 13])
+	assert list(subset.nodeTags) == [11, 12, 13]
+
+
+def test_modal_response_matches_loop(modal):
+	dt = 0.005
+	p = default_rng(0).standard_normal((2000, 3))
+	q, qdot, qddot = modal.modal_response(p, dt)
+	q_loop, qdot_loop = loop_response(modal, p, dt)
+
+	scale = abs(q_loop).max(axis=0)
+	assert_allclose(q / scale, q_loop / scale, atol=1e-10)
+	assert_allclose(qdot / abs(qdot_loop).max(axis=0), qdot_loop / abs(qdot_loop).max(axis=0), atol=1e-10)
+	assert_allclose(qddot, p - 2*modal.damping*modal.omega*qdot - modal.omega**2*q)
+
+
+def test_modal_response_without_scipy(modal, monkeypatch):
+	p = default_rng(1).standard_normal((300, 3))
+	q, qdot, qddot = modal.modal_response(p, 0.01)
+	monkeypatch.setitem(sys.modules, "scipy.signal", None)
+	q_loop, qdot_loop, qddot_loop = modal.modal_response(p, 0.01)
+	assert_allclose(q, q_loop, rtol=1e-9, atol=1e-12)
+	assert_allclose(qdot, qdot_loop, rtol=1e-9, atol=1e-12)
+
+
+def test_step_load_is_exact(modal):
+	#Unit step load from rest: the closed form solution, whatever the time step
+	w, z = modal.omega, modal.damping
+	wd = w*sqrt(1 - z**2)
+	for dt in (0.001, 0.02):
+		t = arange(0, 2, dt)[:,None]
+		q, qdot, qddot = modal.modal_response(ones((len(t), 3)), dt)
+		exact = (1 - exp(-z*w*t)*(cos(wd*t) + z/sqrt(1 - z**2)*sin(wd*t))) / w**2
+		assert_allclose(q, exact, atol=1e-12)
+
+	assert modal.modal_response(zeros((0, 3)), dt)[0].shape == (0, 3)
+
+
+def test_nodal_response(modal):
+	q = default_rng(2).standard_normal((5, 3))
+	u = modal.nodal_response(q, nodeTags=modal.nodeTags[:4])
+	assert u.shape == (5, 4, 3)
+	assert_allclose(u[2], einsum("m,mnd->nd", q[2], modal.matrix[:,:4]))
+	with pytest.raises(KeyError):
+		modal.nodal_response(q, nodeTags=[1])
@@ -0,0 +1,139 @@
+# read_msh: ASCII and binary MSH 4.1 files give the same mesh, and build the same model
+
+import pytest
+from numpy import array, asarray, int32, uint64, double, zeros, column_stack
+from numpy.testing import assert_array_equal
+
+import gmsh2opensees as g2o
+
+
+
+
+def write_binary_msh(model, filename):
+	#Binary MSH 4.1 copy of an MshModel: physical names, entities (with their physical tags
+	#and empty bounding boxes), nodes and elements
+	physical_tags = {}
+	for (dim, tag), entities in model.physical_entities.items():
+		for entity in entities:
+			physical_tags.setdefault((dim, int(entity)), []).append(tag)
+	entities = sorted(set(model.node_blocks) | set(model.element_blocks) | set(physical_tags))
+
+	element_blocks = [(dim, entity, block) for (dim, entity), blocks in model.element_blocks.items() for block in blocks]
+	elementTags = [asarray(tags) for dim, entity, (elementType, tags, nodeTags) in element_blocks]
+	allNodeTags = model.mesh.all_node_tags
+
+	def write(values, dtype):
+		f.write(array(values, dtype=dtype).tobytes())
+
+	with open(filename, "wb") as f:
+		f.write(b"$MeshFormat\n4.1 1 8\n")
+		write([1], int32)
+		f.write(b"\n$EndMeshFormat\n")
+
+		f.write(f"$PhysicalNames\n{len(model.physical_names)}\n".encode())
+		for (dim, tag), name in model.physical_names.items():
+			f.write(f'{dim} {tag} "{name}"\n'.encode())
+		f.write(b"$EndPhysicalNames\n")
+
+		f.write(b"$Entities\n")
+		write([sum(d == dim for d, entity in entities) for dim in range(4)], uint64)
+		for dim, entity in entities:
+			tags = physical_tags.get((dim, entity), [])
+			write([entity], int32)
+			write(zeros(3 if dim == 0 else 6), double)
+			write([len(tags)], uint64)
+			write(tags, int32)
+			if dim > 0:
+				write([0], uint64)
+		f.write(b"\n$EndEntities\n")
+
+		f.write(b"$Nodes\n")
+		write([len(model.node_blocks), len(allNodeTags), allNodeTags.min(), allNodeTags.max()], uint64)
+		for (dim, entity), (tags, coords) in model.node_blocks.items():
+			write([dim, entity, 0], int32)
+			write([len(tags)], uint64)
+			write(tags, uint64)
+			write(coords, double)
+		f.write(b"\n$EndNodes\n")
+
+		f.write(b"$Elements\n")
+		write([len(element_blocks), sum(len(tags) for tags in elementTags),
+			min(tags.min() for tags in elementTags), max(tags.max() for tags in elementTags)], uint64)
+		for dim, entity, (elementType, tags, nodeTags) in element_blocks:
+			write([dim, entity, elementType], int32)
+			write([len(tags)], uint64)
+			write(column_stack((tags, asarray(nodeTags).reshape((len(tags), -1)))), uint64)
+		f.write(b"\n$EndElements\n")
+
+
+
+
+def assert_same_mesh(a, b):
+	assert a.physical_names == b.physical_names
+	assert {key: sorted(entities) for key, entities in a.physical_entities.items()} == \
+		{key: sorted(entities) for key, entities in b.physical_entities.items()}
+
+	assert a.node_blocks.keys() == b.node_blocks.keys()
+	for key, (tags, coords) in a.node_blocks.items():
+		assert_array_equal(tags, b.node_blocks[key][0])
+		assert_array_equal(coords, b.node_blocks[key][1])
+
+	assert a.element_blocks.keys() == b.element_blocks.keys()
+	for key, blocks in a.element_blocks.items():
+		assert len(blocks) == len(b.element_blocks[key])
+		for (elementType, tags, nodeTags), (other_type, other_tags, other_nodeTags) in zip(blocks, b.element_blocks[key]):
+			assert elementType == other_type
+			assert_array_equal(tags, other_tags)
+			assert_array_equal(nodeTags, other_nodeTags)
+
+
+
+
+def test_ascii_example(example_model):
+	groups = g2o.get_physical_groups_map(example_model)
+	assert "Solid" in groups and "Fixed" in groups
+
+	nodeTags, coords = g2o.get_all_nodes(example_model)
+	assert coords.shape == (len(nodeTags), 3)
+	assert len(nodeTags) == example_model.mesh.getMaxNodeTag()
+
+	elementTags, connectivity, element_name, element_nnodes = g2o.get_elements_and_nodes_in_physical_group("Solid", example_model)
+	assert len(elementTags) > 0
+	assert asarray(connectivity).reshape((len(elementTags), -1)).shape[1] == element_nnodes
+	assert set(asarray(connectivity).reshape(-1)) <= set(nodeTags)
+
+
+def test_binary_same_as_ascii(example_path, tmp_path):
+	ascii_model = g2o.read_msh(example_path)
+	binary_path = tmp_path / "binary.msh"
+	write_binary_msh(ascii_model, binary_path)
+
+	binary_model = g2o.read_msh(str(binary_path))
+	assert_same_mesh(ascii_model, binary_model)
+	assert_array_equal(g2o.get_all_nodes(ascii_model)[0], g2o.get_all_nodes(binary_model)[0])
+	assert ascii_model.mesh.getMaxElementTag() == binary_model.mesh.getMaxElementTag()
+
+
+def test_binary_builds_same_model(example_path, tmp_path, backend):
+	ascii_model = g2o.read_msh(example_path)
+	write_binary_msh(ascii_model, tmp_path / "binary.msh")
+	binary_model = g2o.read_msh(str(tmp_path / "binary.msh"))
+
+	calls = []
+	for model in (ascii_model, binary_model):
+		g2o.ops.wipe()
+		backend.clear()
+		nodeTags, coords = g2o.get_all_nodes(model)
+		g2o.add_nodes_to_ops(nodeTags, model)
+		g2o.add_elements_to_ops("Solid", model, {4: "FourNodeTetrahedron"}, 1)
+		calls.append(list(backend.calls))
+
+	assert calls[0] == calls[1]
+	assert sum(name == "node" for name, args in calls[0]) == len(g2o.get_all_nodes(ascii_model)[0])
+
+
+def test_unsupported_version(tmp_path):
+	path = tmp_path / "old.msh"
+	path.write_text("$MeshFormat\n2.2 0 8\n$EndMeshFormat\n")
+	with pytest.raises(ValueError, match="only 4.1"):
+		g2o.read_msh(str(path))
@@ -0,0 +1,65 @@
+# Boundary skin of solid meshes
+
+import pytest
+from numpy import array, cross, sort, unique, concatenate
+from numpy.testing import assert_allclose, assert_array_equal
+
+import gmsh2opensees as g2o
+from gmsh2opensees.g2o_fields import element_measures
+
+
+
+
+def test_skin_of_examples_is_closed_and_outward(example_model):
+	blocks = g2o.get_element_blocks_in_physical_group("Solid", example_model)
+	nodeTags, faces = g2o.extract_skin(blocks)
+	assert list(faces) == [2]
+	parents, triangles = faces[2]
+
+	#A closed surface: every edge is shared by exactly two boundary triangles
+	edges = sort(concatenate([triangles[:,[0,1]], triangles[:,[1,2]], triangles[:,[2,0]]]), axis=1)
+	edges, counts = unique(edges, axis=0, return_counts=True)
+	assert (counts == 2).all()
+	assert_array_equal(nodeTags, unique(triangles))
+
+	#Outward normals: the divergence theorem gives back the volume of the elements
+	x = g2o.get_node_coordinates(triangles, example_model).reshape((-1, 3, 3))
+	volume = (x[:,0] * cross(x[:,1], x[:,2])).sum() / 6
+	assert_allclose(volume, element_measures(4, blocks[4][1], example_model).sum())
+
+	#Each face belongs to its parent element
+	elementTags, connectivity = blocks[4]
+	rows = {int(tag): row for row, tag in enumerate(elementTags)}
+	for parent, triangle in zip(parents[:50], triangles[:50]):
+		assert set(triangle) <= set(connectivity[rows[int(parent)]])
+
+
+def test_fixed_faces_are_on_the_skin(example_model):
+	nodeTags, faces = g2o.get_skin(example_model, "Solid")
+	skin = {tuple(triangle) for triangle in sort(faces[2][1], axis=1)}
+	fixed = g2o.get_element_blocks_in_physical_group("Fixed", example_model)[2][1]
+	assert all(tuple(triangle) in skin for triangle in sort(fixed, axis=1))
+
+	#All the 3D elements (the default) is the Solid group here, and cached
+	assert g2o.get_skin(example_model) is g2o.get_skin(example_model)
+	assert_array_equal(g2o.get_skin(example_model)[0], nodeTags)
+	assert_array_equal(g2o.skin_node_tags(example_model, True, nodeTags[:5]), nodeTags[:5])
+
+
+def test_two_hexes():
+	#Two unit cubes side by side along x: 10 outer quadrangles, the middle one is gone
+	connectivity = array([[1, 2, 5, 4, 7, 8, 11, 10], [2, 3, 6, 5, 8, 9, 12, 11]])
+	nodeTags, faces = g2o.extract_skin({5: (array([1, 2]), connectivity)})
+	assert list(faces) == [3]
+	parents, quadrangles = faces[3]
+	assert len(quadrangles) == 10
+	assert_array_equal(nodeTags, range(1, 13))
+	assert not any(set(quadrangle) == {2, 5, 8, 11} for quadrangle in quadrangles)
+	assert_array_equal(sorted(parents), [1]*5 + [2]*5)
+
+
+def test_unsupported_element_type():
+	with pytest.raises(ValueError, match="not supported"):
+		g2o.extract_skin({2: (array([1]), array([[1, 2, 3]]))})
+	nodeTags, faces = g2o.extract_skin({})
+	assert len(nodeTags) == 0 and faces == {}
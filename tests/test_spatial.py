@@ -0,0 +1,83 @@
+# Grid search of close points, node merging and the beam to solid coupling built on them
+
+import pytest
+from numpy import int64, sqrt, zeros, concatenate
+from numpy.random import default_rng
+from numpy.testing import assert_array_equal
+
+import gmsh2opensees as g2o
+
+
+
+
+def brute_force_pairs(coords_a, coords_b, tol):
+	distances = sqrt(((coords_a[:,None,:] - coords_b[None,:,:])**2).sum(axis=2))
+	return {(int(i), int(j)) for i, j in zip(*(distances <= tol).nonzero())}
+
+
+@pytest.mark.parametrize("tol", [1e-3, 0.05, 0.3])
+def test_find_close_pairs_matches_brute_force(tol):
+	rng = default_rng(0)
+	coords_a = rng.random((300, 3))
+	coords_b = rng.random((200, 3))
+	coords_b[:20] = coords_a[:20] + 1e-4
+
+	ia, ib = g2o.find_close_pairs(coords_a, coords_b, tol)
+	pairs = set(zip(ia.tolist(), ib.tolist()))
+	assert len(pairs) == len(ia)
+	assert pairs == brute_force_pairs(coords_a, coords_b, tol)
+
+
+def test_find_close_pairs_edge_cases():
+	ia, ib = g2o.find_close_pairs(zeros((0,3)), [[0., 0., 0.]], 1.)
+	assert len(ia) == len(ib) == 0 and ia.dtype == int64
+	with pytest.raises(ValueError):
+		g2o.find_close_pairs([[0., 0., 0.]], [[0., 0., 0.]], 0.)
+
+	#Spread out points with a tiny tolerance: the cells are capped, not overflowing
+	ia, ib = g2o.find_close_pairs([[0., 0., 0.], [1e6, 1e6, 1e6]], [[1e6, 1e6, 1e6]], 1e-9)
+	assert_array_equal(ia, [1])
+	assert_array_equal(ib, [0])
+
+
+def test_couple_beams_to_solid(example1, backend):
+	model = example1
+	nodeTags, coords = g2o.get_all_nodes(model)
+	g2o.add_nodes_to_ops(nodeTags, model)
+
+	#Beam node 1 linked to three solid nodes, one of them node 1 itself (skipped)
+	duplicates, beams = g2o.couple_beams_to_solid([1, 2], [[1, 3, 4], [5]], model, None, None, 1, 1e9)
+	assert len(duplicates) == len(beams) == 3
+	assert duplicates.min() > nodeTags.max()
+
+	calls = backend.calls
+	assert sorted(args[:2] for name, args in calls if name == "equalDOF") == \
+		sorted(zip([3, 4, 5], duplicates.tolist()))
+	assert [args[2:4] for name, args in calls if name == "element"] == list(zip([1, 1, 2], duplicates.tolist()))
+
+	empty = g2o.couple_beams_to_solid([], [], model, None, None, 1, 1e9)
+	assert [len(tags) for tags in empty] == [0, 0]
+
+
+
+
+def test_merge_coincident_nodes():
+	#Nodes 5 and 2 on top of each other, 9 close to 2 (a chain), 7 alone
+	nodeTags = [5, 7, 2, 9]
+	coords = [[0., 0., 0.], [1., 1., 1.], [0., 0., 0.], [1e-7, 0., 0.]]
+	assert_array_equal(g2o.merge_coincident_nodes(nodeTags, coords, tol=1e-6), [2, 7, 2, 2])
+	assert_array_equal(g2o.merge_coincident_nodes(nodeTags, coords, tol=1e-8), [2, 7, 2, 9])
+	assert len(g2o.merge_coincident_nodes([], zeros((0,3)))) == 0
+
+
+def test_merge_duplicated_example_mesh(example1):
+	#Two copies of example1 with the tags of the second shifted: merging gives back the first
+	nodeTags, coords = g2o.get_all_nodes(example1)
+	shift = int(nodeTags.max())
+	merged = g2o.merge_coincident_nodes(concatenate((nodeTags, nodeTags + shift)), concatenate((coords, coords)))
+	assert_array_equal(merged, concatenate((nodeTags, nodeTags)))
+
+	blocks = g2o.get_element_blocks_in_physical_group("Solid", example1)
+	shifted = {elementType: (elementTags, connectivity + shift) for elementType, (elementTags, connectivity) in blocks.items()}
+	for elementType, (elementTags, connectivity) in g2o.apply_node_merge(shifted, nodeTags + shift, merged[len(nodeTags):]).items():
+		assert_array_equal(connectivity, blocks[elementType][1])
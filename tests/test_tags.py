@@ -0,0 +1,76 @@
+# TagMap and the tag allocator
+
+import pytest
+from numpy import array, arange, int64
+from numpy.testing import assert_array_equal
+
+import gmsh2opensees as g2o
+from gmsh2opensees.g2o_utils import TagAllocator
+
+
+
+
+def test_tagmap_sparse_huge_tags():
+	gmsh_tags = array([7, 10**12, 3, 2**40 + 5, 11], dtype=int64)
+	tagmap = g2o.TagMap(gmsh_tags, arange(1, 6))
+
+	assert len(tagmap) == 5
+	assert_array_equal(tagmap.forward(gmsh_tags), arange(1, 6))
+	assert_array_equal(tagmap.inverse([[5, 1], [2, 4]]), [[11, 7], [10**12, 2**40 + 5]])
+	assert tagmap.forward(gmsh_tags).dtype == int64
+
+
+def test_tagmap_errors():
+	with pytest.raises(ValueError):
+		g2o.TagMap([1, 2, 3], [1, 2])
+	tagmap = g2o.TagMap([1, 2, 3], [10, 20, 30])
+	with pytest.raises(KeyError):
+		tagmap.forward([1, 4])
+	with pytest.raises(KeyError):
+		tagmap.inverse([1])
+
+
+def test_allocator_kinds_and_reserve():
+	allocator = TagAllocator()
+	assert_array_equal(allocator.allocate("node", 3), [1, 2, 3])
+	assert_array_equal(allocator.allocate("element", 2), [1, 2])
+
+	allocator.reserve("node", [100, 40])
+	assert_array_equal(allocator.allocate("node", 2), [101, 102])
+
+	#Reserving below the next tag changes nothing
+	allocator.reserve("node", [5])
+	assert_array_equal(allocator.allocate("node", 1), [103])
+	assert allocator.allocate("node", 0).dtype == int64
+
+	allocator.reset()
+	assert_array_equal(allocator.allocate("node", 1), [1])
+
+
+def test_allocated_tags_clear_of_the_model(example_model, backend):
+	nodeTags, coords = g2o.get_all_nodes(example_model)
+	g2o.add_nodes_to_ops(nodeTags, example_model)
+	g2o.add_elements_to_ops("Solid", example_model, {4: "FourNodeTetrahedron"}, 1)
+
+	node_tags = g2o.allocate_tags("node", 4)
+	assert node_tags[0] > nodeTags.max()
+	assert_array_equal(node_tags, node_tags[0] + arange(4))
+	assert g2o.allocate_tags("node", 1)[0] == node_tags[-1] + 1
+
+	elementTags = g2o.get_elements_and_nodes_in_physical_group("Solid", example_model)[0]
+	assert g2o.allocate_tags("element", 1)[0] > max(elementTags)
+
+	#ops.wipe starts over
+	g2o.ops.wipe()
+	assert g2o.allocate_tags("node", 1)[0] == 1
+
+
+def test_renumbered_nodes_go_to_opensees(example_model, backend):
+	nodeTags, coords = g2o.get_all_nodes(example_model)
+	tagmap = g2o.TagMap(nodeTags, 1000 + arange(len(nodeTags)))
+	g2o.set_node_numbering(tagmap)
+	g2o.add_nodes_to_ops(nodeTags, example_model)
+
+	ops_tags = [args[0] for name, args in backend.calls if name == "node"]
+	assert sorted(ops_tags) == list(1000 + arange(len(nodeTags)))
+	assert_array_equal(g2o.ops_to_gmsh_node_tags(g2o.gmsh_to_ops_node_tags(nodeTags)), nodeTags)
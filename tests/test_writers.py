@@ -0,0 +1,135 @@
+# MSH data blocks and VTU files written by g2o_writers, read back
+
+import re
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+from numpy import arange, frombuffer, int32, uint64, double, loadtxt, column_stack, zeros
+from numpy.random import default_rng
+from numpy.testing import assert_array_equal
+
+import gmsh2opensees as g2o
+
+
+
+
+def read_msh_data_blocks(filename):
+	#$NodeData and $ElementData blocks of an MSH 4.1 file, ASCII or binary, as a list of
+	#(block name, view name, step, time, tags, values)
+	blocks = []
+	binary = False
+	with open(filename, "rb") as f:
+		for line in iter(f.readline, b""):
+			if line.startswith(b"$MeshFormat"):
+				binary = f.readline().split()[1] == b"1"
+				if binary:
+					f.read(4)
+			elif line.startswith((b"$NodeData", b"$ElementData")):
+				header = [f.readline().strip() for i in range(8)]
+				name, time, step, ncomponents, n = header[1].decode().strip('"'), float(header[3]), int(header[5]), int(header[6]), int(header[7])
+				if binary:
+					records = frombuffer(f.read(n*(4 + 8*ncomponents)), dtype=[("tag", int32), ("values", double, (ncomponents,))])
+					tags, values = records["tag"], records["values"]
+				else:
+					rows = loadtxt([f.readline() for i in range(n)], ndmin=2)
+					tags, values = rows[:,0].astype(int), rows[:,1:]
+				blocks.append((line.strip()[1:].decode(), name, step, time, tags, values))
+	return blocks
+
+
+def read_vtu(filename):
+	#Arrays of a .vtu file written with appended raw data: {(section, name): array}
+	types = {"Float64": "<f8", "Int64": "<i8", "UInt64": "<u8", "Int32": "<i4", "UInt8": "u1"}
+	with open(filename, "rb") as f:
+		content = f.read()
+	head, appended = content.split(b'<AppendedData encoding="raw">\n_', 1)
+	root = ElementTree.fromstring(head + b"</VTKFile>")
+	arrays = {}
+	for section in ("PointData", "CellData", "Points", "Cells"):
+		for element in root.find(f"UnstructuredGrid/Piece/{section}"):
+			offset = int(element.get("offset"))
+			nbytes = int(frombuffer(appended[offset:offset+8], dtype=uint64)[0])
+			values = frombuffer(appended[offset+8:offset+8+nbytes], dtype=types[element.get("type")])
+			ncomponents = int(element.get("NumberOfComponents"))
+			arrays[(section, element.get("Name"))] = values.reshape((-1, ncomponents)) if ncomponents > 1 else values
+	return arrays
+
+
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_msh_data_round_trip(example1, tmp_path, binary):
+	nodeTags, coords = g2o.get_all_nodes(example1)
+	elementTags = g2o.get_elements_and_nodes_in_physical_group("Solid", example1)[0]
+	rng = default_rng(0)
+	displacements = [rng.standard_normal((len(nodeTags), 3)) for step in range(3)]
+	stresses = rng.standard_normal((len(elementTags), 9))
+	pressure = rng.standard_normal(len(nodeTags))
+
+	filename = tmp_path / "results.msh"
+	with open(filename, "wb" if binary else "w") as f:
+		g2o.write_msh_header(f, binary)
+		for step, values in enumerate(displacements):
+			g2o.write_msh_node_data(f, "Displacements", nodeTags, values, step=step, time=0.1*step, binary=binary)
+		g2o.write_msh_element_data(f, "Stress", elementTags, stresses, binary=binary)
+		g2o.write_msh_node_data(f, "Pressure", nodeTags, pressure, binary=binary)
+
+	blocks = read_msh_data_blocks(filename)
+	assert [(block, name, step) for block, name, step, time, tags, values in blocks] == \
+		[("NodeData", "Displacements", 0), ("NodeData", "Displacements", 1), ("NodeData", "Displacements", 2),
+		("ElementData", "Stress", 0), ("NodeData", "Pressure", 0)]
+
+	#%.17g in ASCII and raw bytes in binary are both exact
+	for step in range(3):
+		block, name, step, time, tags, values = blocks[step]
+		assert time == 0.1*step
+		assert_array_equal(tags, nodeTags)
+		assert_array_equal(values, displacements[step])
+	assert_array_equal(blocks[3][4], elementTags)
+	assert_array_equal(blocks[3][5], stresses)
+	assert_array_equal(blocks[4][5][:,0], pressure)
+
+
+def test_msh_data_components(tmp_path):
+	with open(tmp_path / "data.msh", "w") as f:
+		g2o.write_msh_header(f)
+		g2o.write_msh_node_data(f, "In plane", [1, 2], [[1., 2.], [3., 4.]])
+		with pytest.raises(ValueError, match="1, 3 or 9"):
+			g2o.write_msh_node_data(f, "Bad", [1, 2], zeros((2, 4)))
+	values = read_msh_data_blocks(tmp_path / "data.msh")[0][5]
+	assert_array_equal(values, [[1., 2., 0.], [3., 4., 0.]])
+
+
+def test_vtu_round_trip(example1, tmp_path):
+	nodeTags, coords = g2o.get_all_nodes(example1)
+	blocks = g2o.get_element_blocks_in_physical_group("Solid", example1)
+	elementTags, connectivity = blocks[4]
+	displacements = default_rng(0).standard_normal((len(nodeTags), 3))
+
+	g2o.write_vtu(tmp_path / "mesh.vtu", nodeTags, coords, blocks,
+		point_data={"Displacements": displacements}, cell_data={"Volume": arange(len(elementTags), dtype=double)})
+	arrays = read_vtu(tmp_path / "mesh.vtu")
+
+	assert_array_equal(arrays[("Points", "Points")], coords)
+	assert_array_equal(arrays[("PointData", "gmsh_node_tag")], nodeTags)
+	assert_array_equal(arrays[("PointData", "Displacements")], displacements)
+	assert_array_equal(arrays[("CellData", "gmsh_element_tag")], elementTags)
+	assert_array_equal(arrays[("CellData", "Volume")], arange(len(elementTags)))
+
+	#Point indices back to gmsh tags give the connectivity
+	assert_array_equal(nodeTags[arrays[("Cells", "connectivity")]].reshape(connectivity.shape), connectivity)
+	assert_array_equal(arrays[("Cells", "offsets")], 4*arange(1, len(elementTags) + 1))
+	assert (arrays[("Cells", "types")] == 10).all()
+
+
+def test_vtu_series(example1, tmp_path):
+	nodeTags, coords = g2o.get_all_nodes(example1)
+	blocks = g2o.get_element_blocks_in_physical_group("Solid", example1)
+	with g2o.VtuSeriesWriter(str(tmp_path / "series" / "beam"), nodeTags, coords, blocks) as writer:
+		for step in range(3):
+			writer.write(0.5*step, point_data={"Step": column_stack([zeros(len(nodeTags)) + step]*3)})
+
+	pvd = (tmp_path / "series" / "beam.pvd").read_text()
+	assert re.findall(r'timestep="([^"]+)" part="0" file="([^"]+)"', pvd) == \
+		[("0.0", "beam_0.vtu"), ("0.5", "beam_1.vtu"), ("1.0", "beam_2.vtu")]
+	assert (read_vtu(tmp_path / "series" / "beam_2.vtu")[("PointData", "Step")] == 2).all()